@@ -2,197 +2,2714 @@
 
 import os
 import sys
-import argparse
+import errno
+import hashlib
+import hmac
+import io
+import json
+import math
+import mmap
 import secrets
+import signal
+import stat
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional
-import shutil
+from typing import (TYPE_CHECKING, BinaryIO, Callable, Generator, Iterable, Iterator, List,
+                    NamedTuple, Optional, Tuple, Union)
 
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.exceptions import InvalidTag
-from tqdm import tqdm
+# cryptography (which loads its native bindings), tqdm, argparse, ctypes,
+# sqlite3 (journal and index) and lzma (one codec) are imported where they
+# are used, so importing this module -- as the GUI does on start-up -- and
+# CLI calls that fail argument checks stay cheap.
+# `python -m solacecrypt.startup` guards this.
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+CONFIG_DIR = Path.home() / '.config' / 'solacecrypt'
+
+class KDFParams(NamedTuple):
+    """
+    Key derivation settings as stored in the file header.
+    
+    PBKDF2: cost = iterations. scrypt: cost = N, memory = r, parallelism = p.
+    Argon2id: cost = iterations, memory = KiB, parallelism = lanes.
+    """
+    kdf_id: int
+    cost: int
+    memory: int = 0
+    parallelism: int = 0
+
+class FileHeader(NamedTuple):
+    """Parsed header of a segmented (version 2) encrypted file."""
+    version: int
+    flags: int
+    kdf_id: int
+    kdf_cost: int
+    kdf_memory: int
+    kdf_parallelism: int
+    salt: bytes
+    nonce_prefix: bytes
+    segment_size: int
+    subkey_salt: bytes
+    compression: int
+    raw: bytes
+    
+    @property
+    def kdf(self) -> KDFParams:
+        return KDFParams(self.kdf_id, self.kdf_cost, self.kdf_memory, self.kdf_parallelism)
+
+class BatchResult(NamedTuple):
+    """Outcome of one file processed by SecureFileEncryptor.process_batch."""
+    input_path: str
+    output_path: str
+    ok: bool
+    error: Optional[str]
+    size: int
+    seconds: float
+    checksum: Optional[str] = None  # SHA-256 of the output, if requested
+    skipped: bool = False  # Source unchanged since its last encryption
+
+class SourceSnapshot(NamedTuple):
+    """A source as ContentIndex.snapshot found it before encryption."""
+    stat: os.stat_result
+    digest: 'hashlib._Hash'  # Passed to encrypt_file as source_digest
+
+class ProgressInfo(NamedTuple):
+    """Snapshot passed to progress callbacks."""
+    bytes_done: int
+    total_bytes: Optional[int]
+    bytes_per_second: float
+    eta_seconds: Optional[float]
+    
+    @property
+    def percent(self) -> Optional[int]:
+        if not self.total_bytes:
+            return None
+        return min(100, self.bytes_done * 100 // self.total_bytes)
+
+ProgressCallback = Callable[[ProgressInfo], None]
+
+class ProgressTracker:
+    """
+    Accumulate processed bytes and forward them to a callback at most once
+    per interval (plus once when the operation completes), so per-segment
+    updates stay cheap however fast segments are processed.
+    """
+    
+    def __init__(self, callback: ProgressCallback, total_bytes: Optional[int],
+                 interval: float = 0.1):
+        self.callback = callback
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.bytes_done = 0
+        self._start = time.monotonic()
+        self._next_report = self._start + interval
+    
+    def advance(self, nbytes: int) -> None:
+        """Record nbytes more input processed."""
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            self._report(now)
+    
+    def finish(self) -> None:
+        """Report the final state unconditionally."""
+        self._report(time.monotonic())
+    
+    def _report(self, now: float) -> None:
+        elapsed = now - self._start
+        rate = self.bytes_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total_bytes is not None and rate > 0:
+            eta = max(0.0, (self.total_bytes - self.bytes_done) / rate)
+        self.callback(ProgressInfo(self.bytes_done, self.total_bytes, rate, eta))
+
+class OperationCancelled(Exception):
+    """Raised by CancellationToken.check once the operation was cancelled."""
+
+class CancellationToken:
+    """
+    Lets another thread cancel, pause and resume a running operation.
+    
+    The encryptor calls check() between segments. It raises
+    OperationCancelled once cancel() has been called, and blocks while the
+    token is paused: a paused operation keeps its open files, key and
+    finished segments and carries on where it stopped when resumed.
+    """
+    
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+    
+    def cancel(self) -> None:
+        """Stop the operation at its next check, waking it if paused."""
+        self._cancelled.set()
+        self._running.set()
+    
+    def pause(self) -> None:
+        """Hold the operation at its next check until resume() or cancel()."""
+        if not self.cancelled:
+            self._running.clear()
+    
+    def resume(self) -> None:
+        self._running.set()
+    
+    def check(self) -> None:
+        """Block while paused; raise OperationCancelled if cancelled."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise OperationCancelled("Operation cancelled")
+
+class DerivedKeyCache:
+    """
+    Bounded, expiring in-memory cache of passphrase-derived keys.
+    
+    Entries are looked up by (passphrase, salt, KDF parameters). The
+    passphrase itself is never stored: it is replaced by an HMAC under a
+    random per-cache secret. Keys are held in bytearrays and zeroed when
+    they are evicted, expire or the cache is cleared. Threads missing the
+    same entry at once share one derivation (get_or_derive).
+    """
+    
+    def __init__(self, max_entries: int = 64, ttl: float = 300.0):
+        """
+        Args:
+            max_entries: Keys kept before the least recently used is evicted
+            ttl: Seconds a key stays usable after it was derived
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._pending = {}  # cache key -> Event set when its derivation ends
+        self._lock = threading.Lock()
+    
+    def _cache_key(self, passphrase: str, salt: bytes, params: tuple) -> tuple:
+        fingerprint = hmac.new(self._secret, passphrase.encode(), hashlib.sha256).digest()
+        return fingerprint, bytes(salt), params
+    
+    @staticmethod
+    def _zeroize(key: bytearray) -> None:
+        for i in range(len(key)):
+            key[i] = 0
+    
+    def get(self, passphrase: str, salt: bytes, params: tuple) -> Optional[bytearray]:
+        """Return a copy of the cached key for the caller to zero, or None."""
+        cache_key = self._cache_key(passphrase, salt, params)
+        with self._lock:
+            return self._lookup(cache_key)
+    
+    def put(self, passphrase: str, salt: bytes, params: tuple, key: bytes) -> None:
+        """Store a derived key, evicting the least recently used entries."""
+        cache_key = self._cache_key(passphrase, salt, params)
+        with self._lock:
+            self._store(cache_key, key)
+    
+    def get_or_derive(self, passphrase: str, salt: bytes, params: tuple,
+                      derive: Callable[[], bytearray]) -> bytearray:
+        """
+        Return a copy of the cached key, calling derive() and caching its
+        result on a miss. While one thread derives a key, others asking for
+        the same one wait for it rather than running the KDF again.
+        """
+        cache_key = self._cache_key(passphrase, salt, params)
+        while True:
+            with self._lock:
+                key = self._lookup(cache_key)
+                if key is not None:
+                    return key
+                pending = self._pending.get(cache_key)
+                if pending is None:
+                    pending = self._pending[cache_key] = threading.Event()
+                    break
+            # If the derivation fails (or nothing is cached), try ourselves
+            pending.wait()
+        try:
+            key = derive()
+            with self._lock:
+                self._store(cache_key, key)
+            return key
+        finally:
+            with self._lock:
+                del self._pending[cache_key]
+            pending.set()
+    
+    def _lookup(self, cache_key: tuple) -> Optional[bytearray]:
+        """Copy of an unexpired entry, or None. Called with the lock held."""
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        key, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[cache_key]
+            self._zeroize(key)
+            return None
+        self._entries.move_to_end(cache_key)
+        return bytearray(key)
+    
+    def _store(self, cache_key: tuple, key: bytes) -> None:
+        """Insert a copy of key and evict. Called with the lock held."""
+        if self.max_entries <= 0:
+            return
+        old = self._entries.pop(cache_key, None)
+        if old is not None:
+            self._zeroize(old[0])
+        self._entries[cache_key] = (bytearray(key), time.monotonic() + self.ttl)
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._zeroize(evicted)
+    
+    def clear(self) -> None:
+        """Zero and drop every cached key."""
+        with self._lock:
+            for key, _ in self._entries.values():
+                self._zeroize(key)
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SecureDeleter:
+    """
+    Overwrite files in place before unlinking them.
+    
+    Data is written through one reusable buffer, so memory use does not
+    depend on the file size. Random passes fill the buffer with an AES-CTR
+    keystream under a fresh random key, which is far cheaper than asking
+    the OS CSPRNG for every byte. Each pass is fsynced once.
+    """
+    
+    RANDOM = 'random'
+    # Pass schemes: each pass is either a fill byte or RANDOM
+    SCHEMES = {
+        'zero': [b'\x00'],
+        'random': [RANDOM],
+        'default': [RANDOM, RANDOM, RANDOM],
+        'dod': [b'\x00', b'\xff', RANDOM],  # DoD 5220.22-M style
+    }
+    BUFFER_SIZE = 1024 * 1024
+    
+    FALLOC_FL_KEEP_SIZE = 0x01
+    FALLOC_FL_PUNCH_HOLE = 0x02
+    
+    def __init__(self, scheme: Union[str, List] = 'default', punch_holes: bool = False):
+        """
+        Args:
+            scheme: Name from SCHEMES or an explicit list of passes
+            punch_holes: After overwriting, deallocate the file's blocks with
+                fallocate(PUNCH_HOLE) so filesystems mounted with discard
+                pass a TRIM down to the device (ignored where unsupported)
+        """
+        if isinstance(scheme, str):
+            if scheme not in self.SCHEMES:
+                raise ValueError(f"Unknown wipe scheme: {scheme}")
+            scheme = self.SCHEMES[scheme]
+        self.passes = list(scheme)
+        self.punch_holes = punch_holes
+    
+    def _fill(self, buffer: memoryview, pattern) -> Callable[[], None]:
+        """Prepare buffer for a pass; returns a refill function for the next block."""
+        if pattern != self.RANDOM:
+            buffer[:] = pattern * len(buffer)
+            return lambda: None
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        keystream = Cipher(algorithms.AES(secrets.token_bytes(32)),
+                           modes.CTR(secrets.token_bytes(16))).encryptor()
+        # update_into needs block_size - 1 bytes of slack past the output
+        zeros = bytes(len(buffer))
+        scratch = bytearray(len(buffer) + 15)
+        
+        def refill() -> None:
+            keystream.update_into(zeros, scratch)
+            buffer[:] = memoryview(scratch)[:len(buffer)]
+        refill()
+        return refill
+    
+    def _punch_hole(self, fd: int, length: int) -> None:
+        import ctypes
+        import ctypes.util
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name or length == 0:
+            return
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'fallocate'):
+            return
+        libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong,
+                                   ctypes.c_longlong]
+        mode = self.FALLOC_FL_PUNCH_HOLE | self.FALLOC_FL_KEEP_SIZE
+        if libc.fallocate(fd, mode, 0, length) != 0:
+            err = ctypes.get_errno()
+            if err not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise OSError(err, os.strerror(err))
+    
+    def wipe(self, file_path: str) -> None:
+        """Overwrite a file in place with every pass of the scheme."""
+        # r+b: opening with 'wb' would truncate first and overwrite new blocks
+        with open(file_path, 'r+b', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            buffer = memoryview(bytearray(min(size, self.BUFFER_SIZE)))
+            for pattern in self.passes:
+                refill = self._fill(buffer, pattern)
+                f.seek(0)
+                remaining = size
+                while remaining > 0:
+                    written = f.write(buffer[:min(remaining, len(buffer))])
+                    remaining -= written
+                    if remaining > 0:
+                        refill()
+                os.fsync(f.fileno())
+            if self.punch_holes:
+                self._punch_hole(f.fileno(), size)
+                os.fsync(f.fileno())
+    
+    def delete(self, file_path: str) -> None:
+        """Wipe a file, then remove it."""
+        self.wipe(file_path)
+        os.remove(file_path)
+
+class BatchJournal:
+    """
+    Persistent record of batch runs, kept in SQLite so a run that dies part
+    way can be resumed.
+    
+    A batch is identified by its mode, source selection and output
+    directory. For each finished file the journal stores the state, the
+    input size and mtime, the output size and a SHA-256 of the output.
+    Writes are committed in groups to keep the per-file overhead small;
+    outputs themselves are only ever renamed into place once complete, so
+    a file the journal has not seen is simply processed again.
+    """
+    
+    COMMIT_EVERY = 256
+    COMMIT_INTERVAL = 2.0
+    
+    def __init__(self, path: Optional[Path] = None):
+        import sqlite3
+        self.path = Path(path) if path else CONFIG_DIR / 'jobs.sqlite'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                mode TEXT NOT NULL,
+                created REAL NOT NULL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                batch_id INTEGER NOT NULL REFERENCES batches(id),
+                input_path TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                state TEXT NOT NULL,
+                input_size INTEGER,
+                input_mtime_ns INTEGER,
+                output_size INTEGER,
+                checksum TEXT,
+                error TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (batch_id, input_path)
+            );
+        """)
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        self.batch_id = None
+        
+    @staticmethod
+    def batch_key(mode: str, source: str, output_dir: Optional[str]) -> str:
+        """Stable identifier for a batch selection."""
+        spec = json.dumps([mode, source, os.path.abspath(output_dir) if output_dir else None])
+        return hashlib.sha256(spec.encode()).hexdigest()
+    
+    def start(self, key: str, mode: str, resume: bool = False) -> bool:
+        """
+        Select the batch to record into.
+        
+        With resume=True an existing batch with the same key is continued;
+        otherwise its history is discarded. Returns True if a previous batch
+        is being resumed.
+        """
+        row = self._db.execute('SELECT id FROM batches WHERE key = ?', (key,)).fetchone()
+        if row and resume:
+            self.batch_id = row[0]
+            self._db.execute('UPDATE batches SET finished = NULL WHERE id = ?', (self.batch_id,))
+            self._db.commit()
+            return True
+        if row:
+            self._db.execute('DELETE FROM files WHERE batch_id = ?', (row[0],))
+            self._db.execute('DELETE FROM batches WHERE id = ?', (row[0],))
+        cursor = self._db.execute(
+            'INSERT INTO batches (key, mode, created) VALUES (?, ?, ?)',
+            (key, mode, time.time()))
+        self.batch_id = cursor.lastrowid
+        self._db.commit()
+        return False
+    
+    def is_done(self, input_path: str, output_path: str) -> bool:
+        """
+        True if the file was completed by this batch and neither the input
+        nor the output has changed since (by size and mtime / size). An
+        input that is gone, e.g. after --delete, only needs its output.
+        """
+        row = self._db.execute(
+            'SELECT output_path, input_size, input_mtime_ns, output_size FROM files '
+            'WHERE batch_id = ? AND input_path = ? AND state = ?',
+            (self.batch_id, os.path.abspath(input_path), 'done')).fetchone()
+        if row is None or row[0] != os.path.abspath(output_path):
+            return False
+        try:
+            if os.path.getsize(output_path) != row[3]:
+                return False
+        except OSError:
+            return False
+        try:
+            source = os.stat(input_path)
+        except FileNotFoundError:
+            return True
+        return (source.st_size, source.st_mtime_ns) == row[1:3]
+    
+    def record(self, result: BatchResult, input_stat: Optional[os.stat_result] = None) -> None:
+        """
+        Store the outcome of one file.
+        
+        input_stat should be taken before the file was processed, so an
+        input modified during the run is not mistaken for a finished one.
+        """
+        output_size = None
+        if result.ok:
+            try:
+                output_size = os.path.getsize(result.output_path)
+            except OSError:
+                pass
+        self._db.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.batch_id, os.path.abspath(result.input_path),
+             os.path.abspath(result.output_path),
+             'done' if result.ok else 'failed',
+             input_stat.st_size if input_stat else None,
+             input_stat.st_mtime_ns if input_stat else None,
+             output_size, result.checksum, result.error, time.time()))
+        self._uncommitted += 1
+        if (self._uncommitted >= self.COMMIT_EVERY or
+                time.monotonic() - self._last_commit >= self.COMMIT_INTERVAL):
+            self.commit()
+            
+    def commit(self) -> None:
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        
+    def finish(self) -> None:
+        """Mark the current batch as having run to the end."""
+        self._db.execute('UPDATE batches SET finished = ? WHERE id = ?',
+                         (time.time(), self.batch_id))
+        self.commit()
+        
+    def close(self) -> None:
+        self.commit()
+        self._db.close()
+        
+    def __enter__(self) -> 'BatchJournal':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class ContentIndex:
+    """
+    Maps each source file to the state it was in when last encrypted and to
+    the artifact that encryption produced, so unchanged files can be
+    skipped on the next sweep.
+    
+    Metadata (size, mtime, device and inode) is compared first. Only when
+    the size matches but the rest does not -- a touched, copied or restored
+    file -- is the content hashed and compared with the recorded SHA-256;
+    a match refreshes the stored metadata so the next check is cheap again.
+    The hash of a file that is encrypted is taken from the plaintext as
+    encryption reads it (snapshot / encrypt_file's source_digest), so the
+    source is read once.
+    
+    Safe to share between threads. Note that a skipped file keeps the
+    passphrase and KDF of the run that produced its artifact.
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        import sqlite3
+        self.path = Path(path) if path else CONFIG_DIR / 'index.sqlite'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                artifact TEXT NOT NULL,
+                artifact_size INTEGER NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        
+    def artifact_for(self, source_path: str) -> Optional[str]:
+        """Path of the artifact source_path was last encrypted to, if any."""
+        with self._lock:
+            row = self._db.execute('SELECT artifact FROM sources WHERE path = ?',
+                                   (os.path.abspath(source_path),)).fetchone()
+        return row[0] if row else None
+    
+    def is_unchanged(self, source_path: str, artifact_path: str) -> bool:
+        """
+        True if source_path was encrypted to artifact_path, the artifact is
+        still there and the source content has not changed since.
+        """
+        source = os.path.abspath(source_path)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size, mtime_ns, device, inode, content_hash, artifact, artifact_size '
+                'FROM sources WHERE path = ?', (source,)).fetchone()
+        if row is None or row[5] != os.path.abspath(artifact_path):
+            return False
+        try:
+            st = os.stat(source_path)
+            if os.path.getsize(artifact_path) != row[6]:
+                return False
+        except OSError:
+            return False
+        if st.st_size != row[0]:
+            return False
+        if (st.st_mtime_ns, st.st_dev, st.st_ino) == row[1:4]:
+            return True
+        # Same size, different metadata: only the content can tell
+        if _file_sha256(source_path) != row[4]:
+            return False
+        with self._lock:
+            self._db.execute(
+                'UPDATE sources SET mtime_ns = ?, device = ?, inode = ?, updated = ? '
+                'WHERE path = ?', (st.st_mtime_ns, st.st_dev, st.st_ino, time.time(), source))
+            self._db.commit()
+        return True
+    
+    @staticmethod
+    def snapshot(source_path: str) -> SourceSnapshot:
+        """
+        Stat a source before it is encrypted, with a digest for encrypt_file
+        to hash it into, for update().
+        """
+        return SourceSnapshot(os.stat(source_path), hashlib.sha256())
+    
+    def update(self, source_path: str, artifact_path: str, snapshot: SourceSnapshot) -> None:
+        """
+        Record that source_path, in the state captured by snapshot(), was
+        encrypted to artifact_path. Nothing is recorded if the source was
+        modified while it was being encrypted.
+        """
+        st, content_hash = snapshot.stat, snapshot.digest.hexdigest()
+        try:
+            current = os.stat(source_path)
+            if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                return
+        except FileNotFoundError:
+            pass  # Removed after encryption, e.g. by delete_original
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (os.path.abspath(source_path), st.st_size, st.st_mtime_ns, st.st_dev,
+                 st.st_ino, content_hash, os.path.abspath(artifact_path),
+                 os.path.getsize(artifact_path), time.time()))
+            self._db.commit()
+            
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+            
+    def __enter__(self) -> 'ContentIndex':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
 
 class SecureFileEncryptor:
     SALT_SIZE = 16
     NONCE_SIZE = 12
     CHUNK_SIZE = 64 * 1024  # 64KB chunks for reading large files
     
-    def __init__(self):
+    # Segmented container format (version 2):
+    #   header | segment 0 | segment 1 | ... | segment N (final)
+    # Every segment is SEGMENT_SIZE bytes of plaintext sealed with AES-256-GCM
+    # (only the final one may be shorter). The nonce is nonce_prefix || index
+    # || final flag and the AAD binds the whole header plus index and flag, so
+    # segments cannot be reordered, dropped, truncated or moved between files.
+    MAGIC = b'SLCRYPT\x00'
+    FORMAT_VERSION = 2
+    HEADER = struct.Struct('>8sBBBIII16s7sI')
+    NONCE_PREFIX_SIZE = 7
+    TAG_SIZE = 16
+    SEGMENT_SIZE = 1024 * 1024  # 1MB of plaintext per segment
+    # Largest segment accepted, here and from headers: a segment sizes the
+    # read buffers, mmap slices and decompression limit
+    MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+    MAX_SEGMENTS = 2 ** 32
+    
+    # Header flags. FLAG_SUBKEY: a SUBKEY_SALT_SIZE salt follows the fixed
+    # header and the file key is HKDF(passphrase key, subkey salt).
+    # FLAG_COMPRESSED: a one-byte codec id follows (after the subkey salt),
+    # every sealed segment is prefixed with its length (RECORD) and its
+    # plaintext starts with SEGMENT_STORED or SEGMENT_COMPRESSED.
+    FLAG_SUBKEY = 0x01
+    FLAG_COMPRESSED = 0x02
+    SUPPORTED_FLAGS = FLAG_SUBKEY | FLAG_COMPRESSED
+    SUBKEY_SALT_SIZE = 16
+    
+    COMPRESS_ZLIB = 1
+    COMPRESS_LZMA = 2
+    COMPRESS_ZSTD = 3
+    COMPRESSION_NAMES = {'zlib': COMPRESS_ZLIB, 'lzma': COMPRESS_LZMA, 'zstd': COMPRESS_ZSTD}
+    SEGMENT_STORED = 0
+    SEGMENT_COMPRESSED = 1
+    RECORD = struct.Struct('>I')
+    # Segments whose leading sample has more entropy than this (bits per
+    # byte) are stored as is: JPEGs, archives and ciphertext will not shrink
+    ENTROPY_THRESHOLD = 7.5
+    ENTROPY_SAMPLE = 8 * 1024
+    
+    IO_MODES = ('stream', 'mmap')
+    # Plaintext handed to a native segment cipher (see file_encryptor_backends)
+    # per call when segments are small, so each segment does not cost a call
+    NATIVE_RUN_SIZE = 1024 * 1024
+    PROGRESS_INTERVAL = 0.1  # Minimum seconds between progress callbacks
+    
+    KDF_PBKDF2 = 1
+    KDF_SCRYPT = 2
+    KDF_ARGON2ID = 3
+    KDF_NAMES = {'pbkdf2': KDF_PBKDF2, 'scrypt': KDF_SCRYPT, 'argon2id': KDF_ARGON2ID}
+    PBKDF2_ITERATIONS = 100000
+    DEFAULT_KDF = KDFParams(KDF_PBKDF2, PBKDF2_ITERATIONS)
+    LEGACY_KDF = DEFAULT_KDF  # Fixed by the single-blob format
+    KDF_DEFAULTS = {
+        KDF_PBKDF2: DEFAULT_KDF,
+        KDF_SCRYPT: KDFParams(KDF_SCRYPT, 2 ** 17, 8, 1),
+        KDF_ARGON2ID: KDFParams(KDF_ARGON2ID, 3, 64 * 1024, 4),
+    }
+    # Upper bounds on KDF work accepted from a file header, so a crafted
+    # file cannot stall a decryption for hours before it is authenticated.
+    # scrypt's time is bounded by its memory (128 * N * r * p bytes);
+    # Argon2id's by iterations and by iterations * memory.
+    MAX_KDF_MEMORY = 4 * 1024 * 1024 * 1024
+    MAX_PBKDF2_ITERATIONS = 50_000_000
+    MAX_ARGON2_ITERATIONS = 1000
+    MAX_ARGON2_WORK = 16 * MAX_KDF_MEMORY  # iterations * memory, in bytes
+    
+    def __init__(self, segment_size: int = SEGMENT_SIZE, workers: Optional[int] = None,
+                 batch: bool = False, key_cache: Optional[DerivedKeyCache] = None,
+                 io_mode: str = 'stream', kdf: Optional[KDFParams] = None,
+                 deleter: Optional[SecureDeleter] = None,
+                 compression: Optional[str] = None,
+                 compression_level: Optional[int] = None):
+        """
+        Args:
+            segment_size: Plaintext bytes per authenticated segment
+            workers: Threads used to seal/open segments (default: CPU count)
+            batch: Reuse one salt and master key for every file this instance
+                encrypts, giving each file its own HKDF subkey, so a run over
+                many files pays for the KDF once instead of once per file
+            key_cache: Cache of derived keys shared across operations; files
+                with the same salt then skip the KDF (created if batch is set)
+            io_mode: 'stream' reads and writes segment-sized buffers; 'mmap'
+                maps input and pre-sized output files and seals segments
+                directly between the two mappings
+            kdf: Key derivation for new files (default: PBKDF2, 100000
+                iterations); see calibrate_kdf
+            deleter: How originals are wiped when delete_original is set
+                (default: three random passes)
+            compression: Compress segments of new files with 'zlib', 'lzma'
+                or 'zstd' (needs the zstandard package before Python 3.14);
+                segments that look incompressible are stored as is.
+                Compressed files are always streamed, never mapped.
+            compression_level: Codec level (default: the codec's own)
+        """
+        self.kdf = kdf if kdf is not None else self.DEFAULT_KDF
+        self.deleter = deleter if deleter is not None else SecureDeleter()
+        self._check_kdf(self.kdf)
+        if not 0 < segment_size <= self.MAX_SEGMENT_SIZE:
+            raise ValueError(f"Segment size must be between 1 and {self.MAX_SEGMENT_SIZE}")
+        if io_mode not in self.IO_MODES:
+            raise ValueError(f"Unknown I/O mode: {io_mode}")
+        if compression is not None and compression not in self.COMPRESSION_NAMES:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.io_mode = io_mode
+        self.segment_size = segment_size
+        self.compression = self.COMPRESSION_NAMES[compression] if compression else 0
+        self._compress = (self._codec(self.compression, compression_level)[0]
+                          if self.compression else None)
+        self.workers = max(1, workers if workers is not None else (os.cpu_count() or 1))
+        self.batch = batch
         self.salt = None
         self.key = None
+        self.key_cache = key_cache if key_cache is not None else (
+            DerivedKeyCache() if batch else None)
+        self._batch_salt = None
+        self._batch_lock = threading.Lock()
+        
+    def _new_salt(self) -> bytes:
+        """Return the salt for a new file (shared by all files in batch mode)."""
+        if not self.batch:
+            return secrets.token_bytes(self.SALT_SIZE)
+        with self._batch_lock:
+            if self._batch_salt is None:
+                self._batch_salt = secrets.token_bytes(self.SALT_SIZE)
+            return self._batch_salt
         
-    def _derive_key(self, passphrase: str, salt: Optional[bytes] = None) -> bytes:
-        """Derive encryption key from passphrase using PBKDF2."""
+    def _derive_key(self, passphrase: str, salt: Optional[bytes] = None,
+                    params: Optional[KDFParams] = None) -> bytearray:
+        """
+        Derive encryption key from passphrase using the configured KDF.
+        
+        The key is a new bytearray owned by the caller, who zeroes it with
+        _secure_wipe once the segment cipher has been created.
+        """
         if salt is None:
-            salt = secrets.token_bytes(self.SALT_SIZE)
+            salt = self._new_salt()
+        if params is None:
+            params = self.kdf
         self.salt = salt
         
-        kdf = PBKDF2HMAC(
+        def derive() -> bytearray:
+            return _derive_into(self._make_kdf(params, salt), passphrase.encode())
+        
+        if self.key_cache is not None:
+            return self.key_cache.get_or_derive(passphrase, salt, params, derive)
+        return derive()
+    
+    @classmethod
+    def _make_kdf(cls, params: KDFParams, salt: bytes):
+        """Instantiate the cryptography KDF described by params."""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+        if params.kdf_id == cls.KDF_PBKDF2:
+            return PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,  # 256-bit key
+                salt=salt,
+                iterations=params.cost,
+            )
+        if params.kdf_id == cls.KDF_SCRYPT:
+            return Scrypt(salt=salt, length=32, n=params.cost, r=params.memory,
+                          p=params.parallelism)
+        if params.kdf_id == cls.KDF_ARGON2ID:
+            try:
+                from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+            except ImportError:
+                raise ValueError("Argon2id requires cryptography 44.0 or newer")
+            return Argon2id(salt=salt, length=32, iterations=params.cost,
+                            lanes=params.parallelism, memory_cost=params.memory)
+        raise ValueError(f"Unsupported key derivation function: {params.kdf_id}")
+    
+    @classmethod
+    def _check_kdf(cls, params: KDFParams) -> None:
+        """
+        Validate KDF parameters, including ones read from untrusted headers.
+        
+        Raises:
+            ValueError: If the KDF is unknown or the parameters are out of range
+        """
+        if params.kdf_id == cls.KDF_PBKDF2:
+            valid = params.cost >= 1000
+            memory = 0
+            if params.cost > cls.MAX_PBKDF2_ITERATIONS:
+                raise ValueError(f"Key derivation needs too many iterations: {params.cost} "
+                                 f"(at most {cls.MAX_PBKDF2_ITERATIONS})")
+        elif params.kdf_id == cls.KDF_SCRYPT:
+            valid = (params.cost > 1 and params.cost & (params.cost - 1) == 0
+                     and params.memory >= 1 and params.parallelism >= 1)
+            memory = 128 * params.cost * params.memory * params.parallelism
+        elif params.kdf_id == cls.KDF_ARGON2ID:
+            valid = (params.cost >= 1 and 1 <= params.parallelism < 2 ** 24
+                     and params.memory >= 8 * params.parallelism)
+            memory = params.memory * 1024
+            if (params.cost > cls.MAX_ARGON2_ITERATIONS
+                    or params.cost * memory > cls.MAX_ARGON2_WORK):
+                raise ValueError(f"Key derivation needs too many iterations: {params.cost} "
+                                 f"at {params.memory} KiB")
+        else:
+            raise ValueError(f"Unsupported key derivation function: {params.kdf_id}")
+        if not valid:
+            raise ValueError(f"Invalid key derivation parameters: {tuple(params)}")
+        if memory > cls.MAX_KDF_MEMORY:
+            raise ValueError("Key derivation parameters need too much memory")
+    
+    @classmethod
+    def calibrate_kdf(cls, name: str = 'argon2id', target_seconds: float = 0.25) -> KDFParams:
+        """
+        Pick parameters so one derivation takes about target_seconds here.
+        
+        PBKDF2 and Argon2id scale their iteration count; scrypt doubles N
+        (keeping r=8, p=1). Memory for Argon2id stays at the default 64MB.
+        Results are capped at what _check_kdf accepts from a file header.
+        
+        Raises:
+            ValueError: If the KDF name is unknown or unsupported
+        """
+        if name not in cls.KDF_NAMES:
+            raise ValueError(f"Unknown key derivation function: {name}")
+        base = cls.KDF_DEFAULTS[cls.KDF_NAMES[name]]
+        salt = secrets.token_bytes(cls.SALT_SIZE)
+        
+        def measure(params: KDFParams) -> float:
+            start = time.perf_counter()
+            cls._make_kdf(params, salt).derive(b'calibration')
+            return time.perf_counter() - start
+        
+        if base.kdf_id == cls.KDF_SCRYPT:
+            params = base._replace(cost=2 ** 14)
+            while True:
+                bigger = params._replace(cost=params.cost * 2)
+                try:
+                    cls._check_kdf(bigger)
+                except ValueError:
+                    return params
+                # Each doubling of N doubles the cost
+                if measure(params) * 2 > target_seconds * 1.5:
+                    return params
+                params = bigger
+        
+        probe = base._replace(cost=10000) if base.kdf_id == cls.KDF_PBKDF2 \
+            else base._replace(cost=1)
+        elapsed = min(measure(probe) for _ in range(3))
+        if base.kdf_id == cls.KDF_PBKDF2:
+            minimum, maximum = 1000, cls.MAX_PBKDF2_ITERATIONS
+        else:
+            minimum = 1
+            maximum = min(cls.MAX_ARGON2_ITERATIONS,
+                          cls.MAX_ARGON2_WORK // (base.memory * 1024))
+        cost = round(probe.cost * target_seconds / elapsed)
+        return probe._replace(cost=min(maximum, max(minimum, cost)))
+    
+    @classmethod
+    def _codec(cls, compression: int, level: Optional[int] = None
+               ) -> Tuple[Callable[[bytes], bytes], Callable[[bytes, int], bytes]]:
+        """
+        Return (compress, decompress) for a codec id. decompress(data, limit)
+        never produces more than limit + 1 bytes, so an oversized segment is
+        caught without inflating all of it.
+        
+        Raises:
+            ValueError: If the codec is unknown or its module is missing
+        """
+        corrupt = "Invalid encrypted file: bad compressed segment"
+        if compression == cls.COMPRESS_ZLIB:
+            def decompress(data: bytes, limit: int) -> bytes:
+                decompressor = zlib.decompressobj()
+                try:
+                    out = decompressor.decompress(data, limit + 1)
+                except zlib.error:
+                    raise ValueError(corrupt) from None
+                if len(out) <= limit and not decompressor.eof:
+                    raise ValueError(corrupt)
+                return out
+            return (lambda data: zlib.compress(data, -1 if level is None else level),
+                    decompress)
+        
+        if compression == cls.COMPRESS_LZMA:
+            import lzma
+            # The segment is authenticated already; skip the xz checksum
+            def decompress(data: bytes, limit: int) -> bytes:
+                decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+                try:
+                    out = decompressor.decompress(data, limit + 1)
+                except lzma.LZMAError:
+                    raise ValueError(corrupt) from None
+                if len(out) <= limit and not decompressor.eof:
+                    raise ValueError(corrupt)
+                return out
+            return (lambda data: lzma.compress(data, format=lzma.FORMAT_XZ,
+                                               check=lzma.CHECK_NONE, preset=level),
+                    decompress)
+        
+        if compression == cls.COMPRESS_ZSTD:
+            try:
+                from compression import zstd  # Python 3.14+
+            except ImportError:
+                zstd = None
+            if zstd is not None:
+                def decompress(data: bytes, limit: int) -> bytes:
+                    decompressor = zstd.ZstdDecompressor()
+                    try:
+                        out = decompressor.decompress(data, limit + 1)
+                    except zstd.ZstdError:
+                        raise ValueError(corrupt) from None
+                    if len(out) <= limit and not decompressor.eof:
+                        raise ValueError(corrupt)
+                    return out
+                return lambda data: zstd.compress(data, level=level), decompress
+            
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression requires the zstandard package")
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            
+            def decompress(data: bytes, limit: int) -> bytes:
+                try:
+                    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                        return _read_full(reader, limit + 1)
+                except zstandard.ZstdError:
+                    raise ValueError(corrupt) from None
+            return compressor.compress, decompress
+        
+        raise ValueError(f"Unsupported compression: {compression}")
+    
+    def _file_key(self, master_key: bytearray, header: FileHeader) -> bytearray:
+        """
+        Return the key sealing a file's segments: an HKDF subkey in a new
+        bytearray if flagged, otherwise master_key itself.
+        """
+        if not header.flags & self.FLAG_SUBKEY:
+            return master_key
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+        return _derive_into(HKDF(
             algorithm=hashes.SHA256(),
-            length=32,  # 256-bit key
-            salt=salt,
-            iterations=100000,
-        )
-        return kdf.derive(passphrase.encode())
+            length=32,
+            salt=header.subkey_salt,
+            info=b'SolaceCrypt v2 file key',
+        ), master_key)
+    
+    def _segment_cipher(self, key: bytearray, header: FileHeader, operation: str) -> 'AESGCM':
+        """Create the segment cipher of a file, then zero key and the file key."""
+        try:
+            file_key = self._file_key(key, header)
+            try:
+                from file_encryptor_backends import segment_cipher
+                return segment_cipher(file_key, operation)
+            finally:
+                self._secure_wipe(file_key)
+        finally:
+            self._secure_wipe(key)
     
     def _secure_wipe(self, *args):
-        """Securely wipe sensitive data from memory."""
+        """
+        Zero the bytearrays among args in place. bytes and str cannot be
+        changed, which is why keys are only ever held in bytearrays; the
+        cipher objects keep their own copy of the key schedule.
+        """
         for arg in args:
-            if isinstance(arg, bytes):
-                # Create a new bytes object filled with zeros
-                # instead of trying to modify the original
-                arg = bytes(0 for _ in range(len(arg)))
-            elif isinstance(arg, str):
-                del arg
-                
+            if isinstance(arg, bytearray):
+                arg[:] = bytes(len(arg))
+    
+    def _build_header(self, salt: bytes, nonce_prefix: bytes,
+                      subkey_salt: bytes = b'') -> FileHeader:
+        """Create the header for a new segmented file."""
+        flags = self.FLAG_SUBKEY if subkey_salt else 0
+        extension = subkey_salt
+        if self.compression:
+            flags |= self.FLAG_COMPRESSED
+            extension += bytes([self.compression])
+        fields = (self.FORMAT_VERSION, flags, *self.kdf, salt, nonce_prefix,
+                  self.segment_size)
+        raw = self.HEADER.pack(self.MAGIC, *fields) + extension
+        return FileHeader(*fields, subkey_salt, self.compression, raw)
+    
+    def _read_header(self, in_file: BinaryIO) -> Optional[FileHeader]:
+        """
+        Read a segmented file header.
+        
+        Returns None (with the stream rewound) if the file does not start
+        with the format magic, i.e. it is a legacy single-blob file.
+        
+        Raises:
+            ValueError: If the header is truncated or unsupported
+        """
+        magic = in_file.read(len(self.MAGIC))
+        if magic != self.MAGIC:
+            in_file.seek(0)
+            return None
+        raw = magic + _read_full(in_file, self.HEADER.size - len(magic))
+        if len(raw) != self.HEADER.size:
+            raise ValueError("Invalid encrypted file: truncated header")
+        fields = self.HEADER.unpack(raw)[1:]
+        version, flags = fields[0], fields[1]
+        if version != self.FORMAT_VERSION:
+            raise ValueError(f"Unsupported file format version: {version}")
+        if flags & ~self.SUPPORTED_FLAGS:
+            raise ValueError(f"Unsupported file format flags: {flags:#x}")
+        extension = _read_full(in_file, self._header_extension_size(raw))
+        if len(extension) != self._header_extension_size(raw):
+            raise ValueError("Invalid encrypted file: truncated header")
+        subkey_salt = extension[:self.SUBKEY_SALT_SIZE] if flags & self.FLAG_SUBKEY else b''
+        compression = extension[-1] if flags & self.FLAG_COMPRESSED else 0
+        header = FileHeader(*fields, subkey_salt, compression, raw + extension)
+        if not 0 < header.segment_size <= self.MAX_SEGMENT_SIZE:
+            raise ValueError("Invalid encrypted file: bad segment size")
+        self._check_kdf(header.kdf)
+        if compression:
+            self._codec(compression)
+        return header
+    
+    def _header_frames(self) -> Generator:
+        """
+        Frame parser (see _segment_frames) for a header read from a stream
+        that may not be seekable. Returns (header, raw), raw being all it
+        read; header is None if raw does not start with the format magic,
+        i.e. the stream is a legacy single-blob file.
+        
+        Raises:
+            ValueError: If the header is truncated or unsupported
+        """
+        raw = yield self.HEADER.size
+        if not raw.startswith(self.MAGIC):
+            return None, raw
+        if len(raw) == self.HEADER.size:
+            raw += (yield self._header_extension_size(raw))
+        return self._read_header(io.BytesIO(raw)), raw
+    
+    def _header_extension_size(self, raw: bytes) -> int:
+        """Bytes of optional fields that follow a fixed header, per its flags."""
+        flags = self.HEADER.unpack(raw[:self.HEADER.size])[2]
+        size = self.SUBKEY_SALT_SIZE if flags & self.FLAG_SUBKEY else 0
+        if flags & self.FLAG_COMPRESSED:
+            size += 1
+        return size
+    
+    def _segment_nonce(self, header: FileHeader, index: int, final: bool) -> bytes:
+        """Derive the nonce of a segment from the file's nonce prefix."""
+        if index >= self.MAX_SEGMENTS:
+            raise ValueError("File too large for the segmented format")
+        return header.nonce_prefix + struct.pack('>IB', index, final)
+    
+    def _segment_aad(self, header: FileHeader, index: int, final: bool) -> bytes:
+        """Associated data binding a segment to its header and position."""
+        return header.raw + struct.pack('>QB', index, final)
+    
+    def _encrypt_segment(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                         data: bytes, final: bool) -> bytes:
+        """Seal one segment of plaintext."""
+        return aesgcm.encrypt(self._segment_nonce(header, index, final), data,
+                              self._segment_aad(header, index, final))
+    
+    def _decrypt_segment(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                         data: bytes, final: bool) -> bytes:
+        """
+        Open one sealed segment.
+        
+        Raises:
+            ValueError: If the segment fails authentication
+        """
+        from cryptography.exceptions import InvalidTag
+        if len(data) < self.TAG_SIZE:
+            raise ValueError("Invalid encrypted file: truncated segment")
+        try:
+            return aesgcm.decrypt(self._segment_nonce(header, index, final), data,
+                                  self._segment_aad(header, index, final))
+        except InvalidTag:
+            raise self._segment_error(index) from None
+    
+    def _seal_record(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                     data: bytes, final: bool) -> bytes:
+        """Seal a segment as it is stored in the file (length-prefixed if compressed)."""
+        if not header.flags & self.FLAG_COMPRESSED:
+            return self._encrypt_segment(aesgcm, header, index, data, final)
+        marker, body = self.SEGMENT_STORED, data
+        if _shannon_entropy(data[:self.ENTROPY_SAMPLE]) <= self.ENTROPY_THRESHOLD:
+            packed = self._compress(data)
+            if len(packed) < len(data):
+                marker, body = self.SEGMENT_COMPRESSED, packed
+        sealed = self._encrypt_segment(aesgcm, header, index, bytes([marker]) + body, final)
+        return self.RECORD.pack(len(sealed)) + sealed
+    
+    def _open_record(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                     data: bytes, final: bool) -> bytes:
+        """
+        Open a segment as stored in the file, decompressing it if needed.
+        
+        Raises:
+            ValueError: If the segment fails authentication or is malformed
+        """
+        plain = self._decrypt_segment(aesgcm, header, index, data, final)
+        if not header.flags & self.FLAG_COMPRESSED:
+            return plain
+        marker = plain[:1]
+        if marker == bytes([self.SEGMENT_STORED]):
+            plain = plain[1:]
+        elif marker == bytes([self.SEGMENT_COMPRESSED]):
+            plain = self._codec(header.compression)[1](plain[1:], header.segment_size)
+        else:
+            raise ValueError("Invalid encrypted file: bad compressed segment")
+        if len(plain) > header.segment_size or (not final and len(plain) != header.segment_size):
+            raise ValueError("Invalid encrypted file: bad segment length")
+        return plain
+    
+    def _record_frames(self, header: FileHeader) -> Generator:
+        """Frame parser (see _segment_frames) for the segments stored after header."""
+        if header.flags & self.FLAG_COMPRESSED:
+            return _length_prefixed_frames(self._max_record_size(header))
+        return _segment_frames(header.segment_size + self.TAG_SIZE)
+    
+    def _iter_records(self, stream: BinaryIO, header: FileHeader
+                      ) -> Iterator[Tuple[int, bytes, bool]]:
+        """Yield (index, sealed, final) for every segment stored after the header."""
+        return _iter_frames(stream, self._record_frames(header))
+    
+    def _segments_per_call(self, aesgcm: 'AESGCM', header: FileHeader) -> int:
+        """Segments sealed or opened per call: a run if aesgcm can take one, else 1."""
+        if header.flags & self.FLAG_COMPRESSED or not hasattr(aesgcm, 'segment_cipher'):
+            return 1
+        return max(1, self.NATIVE_RUN_SIZE // header.segment_size)
+    
+    def _sealing(self, aesgcm: 'AESGCM', header: FileHeader, stream: BinaryIO
+                 ) -> Tuple[Iterator[Tuple[int, bytes, bool]], Callable[[int, bytes, bool], bytes]]:
+        """Blocks of stream to seal and the transform that seals one, for _process_segments."""
+        per_call = self._segments_per_call(aesgcm, header)
+        if per_call == 1:
+            return (_iter_segments(stream, header.segment_size),
+                    lambda index, data, final: self._seal_record(aesgcm, header, index,
+                                                                 data, final))
+        runs = aesgcm.segment_cipher(header.raw, header.nonce_prefix, header.segment_size)
+        return (_iter_segments(stream, header.segment_size * per_call),
+                lambda index, data, final: runs.seal(index * per_call, data, final))
+    
+    def _opening(self, aesgcm: 'AESGCM', header: FileHeader, stream: BinaryIO
+                 ) -> Tuple[Iterator[Tuple[int, bytes, bool]], Callable[[int, bytes, bool], bytes]]:
+        """Blocks of stream to open and the transform that opens one, for _process_segments."""
+        per_call = self._segments_per_call(aesgcm, header)
+        if per_call == 1:
+            return (self._iter_records(stream, header),
+                    lambda index, data, final: self._open_record(aesgcm, header, index,
+                                                                 data, final))
+        from cryptography.exceptions import InvalidTag
+        runs = aesgcm.segment_cipher(header.raw, header.nonce_prefix, header.segment_size)
+        
+        def open_run(index: int, data: bytes, final: bool) -> bytes:
+            try:
+                return runs.open(index * per_call, data, final)
+            except InvalidTag as e:
+                raise self._segment_error(e.args[0] if e.args else index * per_call) from None
+        
+        sealed = header.segment_size + self.TAG_SIZE
+        return _iter_segments(stream, sealed * per_call), open_run
+    
+    def _max_record_size(self, header: FileHeader) -> int:
+        """Largest sealed segment of a compressed file (a stored full segment)."""
+        return header.segment_size + 1 + self.TAG_SIZE
+    
+    @staticmethod
+    def _segment_error(index: int) -> ValueError:
+        """Error reported when a segment fails authentication."""
+        if index == 0:
+            return ValueError("Decryption failed: Wrong password")
+        return ValueError(f"Decryption failed: segment {index} is corrupted "
+                          "or the file was truncated")
+    
+    def _seal_into(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                   data: memoryview, final: bool, out: memoryview) -> None:
+        """Seal one segment straight into out (len(data) + TAG_SIZE bytes)."""
+        nonce = self._segment_nonce(header, index, final)
+        aad = self._segment_aad(header, index, final)
+        if hasattr(aesgcm, 'encrypt_into'):
+            aesgcm.encrypt_into(nonce, data, aad, out)
+        else:
+            out[:] = aesgcm.encrypt(nonce, data, aad)
+    
+    def _open_into(self, aesgcm: 'AESGCM', header: FileHeader, index: int,
+                   data: memoryview, final: bool, out: memoryview) -> None:
+        """Open one sealed segment straight into out (len(data) - TAG_SIZE bytes)."""
+        if not hasattr(aesgcm, 'decrypt_into'):
+            out[:] = self._decrypt_segment(aesgcm, header, index, data, final)
+            return
+        from cryptography.exceptions import InvalidTag
+        try:
+            aesgcm.decrypt_into(self._segment_nonce(header, index, final), data,
+                                self._segment_aad(header, index, final), out)
+        except InvalidTag:
+            raise self._segment_error(index) from None
+    
+    def _run_indexed(self, count: int, task: Callable[[int], int],
+                     tracker: Optional[ProgressTracker] = None,
+                     cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Run task(0) .. task(count - 1), on the worker pool if there is one.
+        Each task returns the number of input bytes it consumed. cancel is
+        checked before each task is started.
+        """
+        if self.workers == 1:
+            for index in range(count):
+                if cancel:
+                    cancel.check()
+                done = task(index)
+                if tracker:
+                    tracker.advance(done)
+            return
+        
+        window = 2 * self.workers
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for index in range(count):
+                    if cancel:
+                        cancel.check()
+                    pending.append(pool.submit(task, index))
+                    if len(pending) >= window:
+                        done = pending.popleft().result()
+                        if tracker:
+                            tracker.advance(done)
+                while pending:
+                    done = pending.popleft().result()
+                    if tracker:
+                        tracker.advance(done)
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    def _tracker(self, progress: Optional[ProgressCallback],
+                 total_bytes: Optional[int]) -> Optional[ProgressTracker]:
+        if progress is None:
+            return None
+        return ProgressTracker(progress, total_bytes, self.PROGRESS_INTERVAL)
+    
+    def _can_map(self, in_file: BinaryIO, header: FileHeader, output_size: int) -> bool:
+        """
+        Whether the mmap path applies: fixed-size segments, regular input and
+        non-empty output.
+        """
+        return (self.io_mode == 'mmap' and output_size > 0
+                and not header.flags & self.FLAG_COMPRESSED
+                and stat.S_ISREG(os.fstat(in_file.fileno()).st_mode))
+    
+    def _transform_mapped(self, in_file: BinaryIO, out_file: BinaryIO, out_size: int,
+                          count: int, task: Callable[[memoryview, memoryview, int], int],
+                          tracker: Optional[ProgressTracker],
+                          cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Map in_file read-only and out_file (resized to out_size) read-write,
+        then run task(src, dst, index) for each of count segments.
+        
+        Tasks must release the slices they take (use them as context
+        managers), otherwise the mappings cannot be closed.
+        """
+        out_file.truncate(out_size)
+        with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as in_map, \
+                mmap.mmap(out_file.fileno(), out_size) as out_map:
+            if hasattr(in_map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                in_map.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(in_map) as src, memoryview(out_map) as dst:
+                self._run_indexed(count, lambda index: task(src, dst, index), tracker,
+                                  cancel)
+            out_map.flush()
+    
+    def _encrypt_mapped(self, in_file: BinaryIO, out_file: BinaryIO, aesgcm: 'AESGCM',
+                        header: FileHeader, size: int,
+                        tracker: Optional[ProgressTracker],
+                        cancel: Optional[CancellationToken] = None) -> None:
+        """Encrypt a mapped input into a pre-sized, mapped output."""
+        seg = header.segment_size
+        sealed = seg + self.TAG_SIZE
+        count = -(-size // seg)
+        base = len(header.raw)
+        # Each task seals per_call consecutive segments (one unless a native
+        # cipher takes whole runs) straight from one mapping into the other
+        per_call = self._segments_per_call(aesgcm, header)
+        runs = (aesgcm.segment_cipher(header.raw, header.nonce_prefix, seg)
+                if per_call > 1 else None)
+        
+        def seal(src: memoryview, dst: memoryview, run: int) -> int:
+            first = run * per_call
+            segments = min(per_call, count - first)
+            start = first * seg
+            length = min(seg * segments, size - start)
+            out_start = base + first * sealed
+            final = first + segments == count
+            with src[start:start + length] as data, \
+                    dst[out_start:out_start + length + segments * self.TAG_SIZE] as out:
+                if runs is None:
+                    self._seal_into(aesgcm, header, first, data, final, out)
+                else:
+                    runs.seal_into(first, data, final, out)
+            return length
+        
+        out_file.write(header.raw)
+        out_file.flush()
+        self._transform_mapped(in_file, out_file, base + size + count * self.TAG_SIZE,
+                               -(-count // per_call), seal, tracker, cancel)
+    
+    def _decrypt_mapped(self, in_file: BinaryIO, out_file: BinaryIO, aesgcm: 'AESGCM',
+                        header: FileHeader, size: int,
+                        tracker: Optional[ProgressTracker],
+                        cancel: Optional[CancellationToken] = None) -> None:
+        """Decrypt a mapped input into a pre-sized, mapped output."""
+        seg = header.segment_size
+        sealed = seg + self.TAG_SIZE
+        base = len(header.raw)
+        body = size - base
+        count = -(-body // sealed)
+        per_call = self._segments_per_call(aesgcm, header)
+        runs = (aesgcm.segment_cipher(header.raw, header.nonce_prefix, seg)
+                if per_call > 1 else None)
+        if runs is not None:
+            from cryptography.exceptions import InvalidTag
+        
+        def open_(src: memoryview, dst: memoryview, run: int) -> int:
+            first = run * per_call
+            segments = min(per_call, count - first)
+            start = base + first * sealed
+            length = min(sealed * segments, size - start)
+            if length - (segments - 1) * sealed < self.TAG_SIZE:
+                raise ValueError("Invalid encrypted file: truncated segment")
+            final = first + segments == count
+            out_start = first * seg
+            with src[start:start + length] as data, \
+                    dst[out_start:out_start + length - segments * self.TAG_SIZE] as out:
+                if runs is None:
+                    self._open_into(aesgcm, header, first, data, final, out)
+                else:
+                    try:
+                        runs.open_into(first, data, final, out)
+                    except InvalidTag as e:
+                        raise self._segment_error(e.args[0] if e.args else first) from None
+            return length
+        
+        self._transform_mapped(in_file, out_file, body - count * self.TAG_SIZE,
+                               -(-count // per_call), open_, tracker, cancel)
+    
+    def _process_segments(self, segments: Iterable[Tuple[int, bytes, bool]],
+                          transform: Callable[[int, bytes, bool], bytes],
+                          out_file: BinaryIO,
+                          tracker: Optional[ProgressTracker] = None,
+                          cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Run transform over segments and write the results in order.
+        
+        With more than one worker the AEAD calls (which release the GIL) run
+        on a thread pool. At most 2 * workers segments are in flight, so
+        memory use stays bounded regardless of the file size. cancel is
+        checked before each segment is handed out.
+        """
+        if self.workers == 1:
+            for index, data, final in segments:
+                if cancel:
+                    cancel.check()
+                out_file.write(transform(index, data, final))
+                if tracker:
+                    tracker.advance(len(data))
+            return
+        
+        window = 2 * self.workers
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for index, data, final in segments:
+                    if cancel:
+                        cancel.check()
+                    pending.append((pool.submit(transform, index, data, final), len(data)))
+                    if len(pending) >= window:
+                        future, length = pending.popleft()
+                        out_file.write(future.result())
+                        if tracker:
+                            tracker.advance(length)
+                while pending:
+                    future, length = pending.popleft()
+                    out_file.write(future.result())
+                    if tracker:
+                        tracker.advance(length)
+            finally:
+                for future, _ in pending:
+                    future.cancel()
+    
+    def _encryption_context(self, passphrase: str) -> Tuple[FileHeader, 'AESGCM']:
+        """Create the header and segment cipher for a new file."""
+        # Generate key and per-file nonce prefix
+        salt = self._new_salt()
+        # Files sharing a batch salt also share the master key, so each
+        # one is sealed under its own subkey
+        subkey_salt = secrets.token_bytes(self.SUBKEY_SALT_SIZE) if self.batch else b''
+        header = self._build_header(salt,
+                                    secrets.token_bytes(self.NONCE_PREFIX_SIZE),
+                                    subkey_salt)
+        key = self._derive_key(passphrase, salt)
+        return header, self._segment_cipher(key, header, 'encrypt')
+    
+    def _decryption_cipher(self, header: FileHeader, passphrase: str) -> 'AESGCM':
+        """Derive the segment cipher of an existing file from its header."""
+        # Derive key using the same salt
+        key = self._derive_key(passphrase, header.salt, header.kdf)
+        return self._segment_cipher(key, header, 'decrypt')
+    
     def encrypt_file(self, input_path: str, output_path: str, passphrase: str, 
-                     delete_original: bool = False) -> None:
+                     delete_original: bool = False,
+                     progress: Optional[ProgressCallback] = None,
+                     cancel: Optional[CancellationToken] = None,
+                     source_digest: Optional['hashlib._Hash'] = None) -> None:
         """
-        Encrypt a file using AES-256-GCM.
+        Encrypt a file using AES-256-GCM in the segmented container format.
+        
+        The input is processed one segment at a time, so memory use does not
+        depend on the file size.
         
         Args:
             input_path: Path to the file to encrypt
             output_path: Path where to save the encrypted file
             passphrase: Password to use for encryption
             delete_original: Whether to securely delete the original file
+            progress: Called with a ProgressInfo (bytes of input processed,
+                throughput, ETA) at most every PROGRESS_INTERVAL seconds
+            cancel: Checked between segments to pause the operation or stop
+                it with OperationCancelled; a cancelled run leaves no output
+                and does not delete the original
+            source_digest: A hashlib object updated with the plaintext as it
+                is read, e.g. for ContentIndex. The input is then read as a
+                stream even in mmap mode.
         """
         try:
-            # Generate key and nonce
-            key = self._derive_key(passphrase)
-            nonce = secrets.token_bytes(self.NONCE_SIZE)
-            aesgcm = AESGCM(key)
-            
-            # Read file in chunks to handle large files
-            chunks = []
-            total_size = os.path.getsize(input_path)
-            
-            with open(input_path, 'rb') as in_file:
-                while True:
-                    chunk = in_file.read(self.CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-            
-            # Concatenate all chunks and encrypt at once
-            data = b''.join(chunks)
-            encrypted_data = aesgcm.encrypt(nonce, data, None)
+            header, aesgcm = self._encryption_context(passphrase)
             
-            # Write encrypted data with salt and nonce
-            with open(output_path, 'wb') as out_file:
-                # Write metadata
-                out_file.write(self.salt)  # First 16 bytes: salt
-                out_file.write(nonce)      # Next 12 bytes: nonce
-                # Write encrypted data
-                out_file.write(encrypted_data)
+            # Written under a temporary name and renamed into place when complete
+            with _atomic_output(output_path) as partial, \
+                    open(input_path, 'rb') as in_file, open(partial, 'w+b') as out_file:
+                size = os.fstat(in_file.fileno()).st_size
+                tracker = self._tracker(progress, size)
+                if source_digest is None and self._can_map(in_file, header, size):
+                    self._encrypt_mapped(in_file, out_file, aesgcm, header, size, tracker,
+                                         cancel)
+                else:
+                    source = (in_file if source_digest is None
+                              else _HashingReader(in_file, source_digest))
+                    out_file.write(header.raw)
+                    self._process_segments(*self._sealing(aesgcm, header, source),
+                                           out_file, tracker, cancel)
+                if tracker:
+                    tracker.finish()
             
             if delete_original:
                 self._secure_delete_file(input_path)
                 
         finally:
-            self._secure_wipe(key, passphrase)
+            self._secure_wipe(passphrase)
             
-    def decrypt_file(self, input_path: str, output_path: str, passphrase: str) -> None:
+    def decrypt_file(self, input_path: str, output_path: str, passphrase: str,
+                     progress: Optional[ProgressCallback] = None,
+                     cancel: Optional[CancellationToken] = None) -> None:
         """
         Decrypt a file using AES-256-GCM.
         
+        Both the segmented format and the legacy single-blob format
+        (salt | nonce | ciphertext) are accepted.
+        
         Args:
             input_path: Path to the encrypted file
             output_path: Path where to save the decrypted file
             passphrase: Password used for encryption
+            progress: Called with a ProgressInfo (bytes of input processed,
+                throughput, ETA) at most every PROGRESS_INTERVAL seconds
+            cancel: As for encrypt_file
         
         Raises:
             ValueError: If password is incorrect or file is corrupted
+            OperationCancelled: If cancel was cancelled
         """
         try:
             with open(input_path, 'rb') as in_file:
-                # Read metadata
-                salt = in_file.read(self.SALT_SIZE)
-                if len(salt) != self.SALT_SIZE:
-                    raise ValueError("Invalid encrypted file: missing salt")
+                header = self._read_header(in_file)
+                if header is None:
+                    with _atomic_output(output_path) as partial:
+                        self._decrypt_legacy(in_file, partial, passphrase, progress, cancel)
+                    return
                 
-                nonce = in_file.read(self.NONCE_SIZE)
-                if len(nonce) != self.NONCE_SIZE:
-                    raise ValueError("Invalid encrypted file: missing nonce")
+                aesgcm = self._decryption_cipher(header, passphrase)
                 
-                # Read encrypted data
-                encrypted_data = in_file.read()
-                if not encrypted_data:
-                    raise ValueError("Invalid encrypted file: no encrypted data")
-                
-                # Derive key using the same salt
-                key = self._derive_key(passphrase, salt)
-                aesgcm = AESGCM(key)
+                # Partially decrypted output never appears under the final name
+                with _atomic_output(output_path) as partial:
+                    with open(partial, 'w+b') as out_file:
+                        size = os.fstat(in_file.fileno()).st_size
+                        tracker = self._tracker(progress, size - len(header.raw))
+                        plain_size = size - len(header.raw) - self.TAG_SIZE
+                        if self._can_map(in_file, header, plain_size):
+                            self._decrypt_mapped(in_file, out_file, aesgcm, header, size,
+                                                 tracker, cancel)
+                        else:
+                            self._process_segments(
+                                *self._opening(aesgcm, header, in_file),
+                                out_file, tracker, cancel)
+                        if tracker:
+                            tracker.finish()
                 
+        finally:
+            self._secure_wipe(passphrase)
+    
+    def encrypt_stream(self, in_stream: BinaryIO, out_stream: BinaryIO, passphrase: str,
+                       progress: Optional[ProgressCallback] = None,
+                       cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Encrypt everything read from in_stream into out_stream.
+        
+        Works with pipes, sockets and stdin/stdout: neither stream has to
+        be seekable, nothing touches the disk and memory use is bounded by
+        the segment size and worker count.
+        
+        Args:
+            in_stream: Binary stream to read plaintext from until EOF
+            out_stream: Binary stream to write the encrypted file to
+            passphrase: Password to use for encryption
+            progress: As for encrypt_file; total_bytes is None
+            cancel: As for encrypt_file, but what was already written to
+                out_stream stays there
+        """
+        try:
+            header, aesgcm = self._encryption_context(passphrase)
+            tracker = self._tracker(progress, None)
+            out_stream.write(header.raw)
+            self._process_segments(*self._sealing(aesgcm, header, in_stream),
+                                   out_stream, tracker, cancel)
+            if tracker:
+                tracker.finish()
+        finally:
+            self._secure_wipe(passphrase)
+    
+    def decrypt_stream(self, in_stream: BinaryIO, out_stream: BinaryIO, passphrase: str,
+                       progress: Optional[ProgressCallback] = None,
+                       cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Decrypt a segmented encrypted stream into out_stream.
+        
+        Every segment is authenticated before it is written, but if a later
+        segment fails the plaintext already written stays with the caller.
+        A legacy single-blob file has one tag at its very end, so it is read
+        into memory and checked before anything is written.
+        
+        Raises:
+            ValueError: If password is incorrect or the stream is corrupted
+        """
+        try:
+            header, raw = _read_frames(in_stream, self._header_frames())
+            if header is None:
+                data = raw + in_stream.read()
+                out_stream.write(self._decrypt_legacy_data(data, passphrase))
+                tracker = self._tracker(progress, len(data))
+                if tracker:
+                    tracker.advance(len(data))
+                    tracker.finish()
+                return
+            aesgcm = self._decryption_cipher(header, passphrase)
+            tracker = self._tracker(progress, None)
+            self._process_segments(*self._opening(aesgcm, header, in_stream),
+                                   out_stream, tracker, cancel)
+            if tracker:
+                tracker.finish()
+        finally:
+            self._secure_wipe(passphrase)
+    
+    def _decrypt_legacy_data(self, data: bytes, passphrase: str) -> bytes:
+        """Decrypt a whole legacy (salt | nonce | ciphertext | tag) file held in memory."""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.exceptions import InvalidTag
+        
+        prefix = self.SALT_SIZE + self.NONCE_SIZE
+        if len(data) < prefix + self.TAG_SIZE:
+            raise ValueError("Invalid encrypted file: no encrypted data")
+        key = self._derive_key(passphrase, data[:self.SALT_SIZE], self.LEGACY_KDF)
+        try:
+            aesgcm = AESGCM(key)
+        finally:
+            self._secure_wipe(key)
+        with memoryview(data) as view, view[prefix:] as sealed:
+            try:
+                return aesgcm.decrypt(data[self.SALT_SIZE:prefix], sealed, None)
+            except InvalidTag:
+                raise ValueError("Decryption failed: Wrong password") from None
+    
+    def _decrypt_legacy(self, in_file: BinaryIO, output_path: str, passphrase: str,
+                        progress: Optional[ProgressCallback] = None,
+                        cancel: Optional[CancellationToken] = None) -> None:
+        """
+        Decrypt a legacy (salt | nonce | ciphertext | tag) file in chunks.
+        
+        Plaintext is released before the tag is checked, so the output is
+        removed again if authentication fails.
+        """
+        # Read metadata
+        salt = in_file.read(self.SALT_SIZE)
+        if len(salt) != self.SALT_SIZE:
+            raise ValueError("Invalid encrypted file: missing salt")
+        
+        nonce = in_file.read(self.NONCE_SIZE)
+        if len(nonce) != self.NONCE_SIZE:
+            raise ValueError("Invalid encrypted file: missing nonce")
+        
+        data_size = os.fstat(in_file.fileno()).st_size - self.SALT_SIZE - self.NONCE_SIZE
+        if data_size < self.TAG_SIZE:
+            raise ValueError("Invalid encrypted file: no encrypted data")
+        
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.exceptions import InvalidTag
+        
+        # Derive key using the same salt
+        key = self._derive_key(passphrase, salt, self.LEGACY_KDF)
+        try:
+            decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).decryptor()
+        finally:
+            self._secure_wipe(key)
+        
+        remaining = data_size - self.TAG_SIZE
+        tracker = self._tracker(progress, data_size)
+        try:
+            with open(output_path, 'wb') as out_file:
+                while remaining > 0:
+                    if cancel:
+                        cancel.check()
+                    chunk = in_file.read(min(self.CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ValueError("Invalid encrypted file: truncated data")
+                    remaining -= len(chunk)
+                    out_file.write(decryptor.update(chunk))
+                    if tracker:
+                        tracker.advance(len(chunk))
+                tag = in_file.read(self.TAG_SIZE)
                 try:
-                    # Decrypt data
-                    decrypted_data = aesgcm.decrypt(nonce, encrypted_data, None)
+                    out_file.write(decryptor.finalize_with_tag(tag))
                 except InvalidTag:
-                    if os.path.exists(output_path):
-                        os.remove(output_path)
                     raise ValueError("Decryption failed: Wrong password")
-                
-                # Write decrypted data
-                with open(output_path, 'wb') as out_file:
-                    out_file.write(decrypted_data)
-                
-        finally:
-            self._secure_wipe(key, passphrase)
+                if tracker:
+                    tracker.advance(len(tag))
+                    tracker.finish()
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+            
+    def open_encrypted(self, path: str, passphrase: str,
+                       cache_segments: int = 4) -> 'EncryptedFileReader':
+        """
+        Open a segmented encrypted file for random-access reading.
+        
+        Only the segments overlapping each read are decrypted; the most
+        recently used cache_segments of them are kept in memory. For
+        compressed files the segment offsets are read once when opening.
+        
+        Raises:
+            ValueError: If the password is wrong, the file is corrupted or it
+                uses the legacy single-blob format
+        """
+        return EncryptedFileReader(self, path, passphrase, cache_segments)
+    
+    def process_batch(self, mode: str, jobs: Iterable[Tuple[str, str]], passphrase: str,
+                      delete_original: bool = False,
+                      max_jobs: int = 4, checksum: bool = False,
+                      index: Optional[ContentIndex] = None,
+                      cancel: Optional[CancellationToken] = None) -> Iterator[BatchResult]:
+        """
+        Encrypt or decrypt many files on a bounded pool of threads.
+        
+        Args:
+            mode: 'encrypt' or 'decrypt'
+            jobs: (input_path, output_path) pairs; consumed lazily
+            passphrase: Password used for every file
+            delete_original: Whether to securely delete originals after encryption
+            max_jobs: Number of files processed concurrently
+            checksum: Whether to report a SHA-256 of each finished output
+            index: When encrypting, skip sources the index reports unchanged
+                and record the ones that are encrypted
+            cancel: Pauses or cancels the whole batch. Once cancelled no
+                further files are started, and files in progress are
+                reported as failed and leave no output
+        
+        Yields:
+            A BatchResult per file, in completion order. Failures are
+            reported rather than raised so one bad file does not stop the run.
+        """
+        def run(input_path: str, output_path: str) -> BatchResult:
+            start = time.perf_counter()
+            try:
+                if cancel:
+                    cancel.check()
+                size = os.path.getsize(input_path)
+                if mode == 'encrypt' and index is not None:
+                    if index.is_unchanged(input_path, output_path):
+                        return BatchResult(input_path, output_path, True, None, 0,
+                                           time.perf_counter() - start, skipped=True)
+                    snapshot = index.snapshot(input_path)
+                    self.encrypt_file(input_path, output_path, passphrase, delete_original,
+                                      cancel=cancel, source_digest=snapshot.digest)
+                    index.update(input_path, output_path, snapshot)
+                elif mode == 'encrypt':
+                    self.encrypt_file(input_path, output_path, passphrase, delete_original,
+                                      cancel=cancel)
+                else:
+                    self.decrypt_file(input_path, output_path, passphrase, cancel=cancel)
+                digest = _file_sha256(output_path) if checksum else None
+                return BatchResult(input_path, output_path, True, None, size,
+                                   time.perf_counter() - start, digest)
+            except Exception as e:
+                return BatchResult(input_path, output_path, False, str(e), 0,
+                                   time.perf_counter() - start)
+        
+        max_jobs = max(1, max_jobs)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=max_jobs) as pool:
+            for input_path, output_path in jobs:
+                if cancel and cancel.cancelled:
+                    break
+                pending.add(pool.submit(run, input_path, output_path))
+                if len(pending) >= 2 * max_jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
             
     def _secure_delete_file(self, file_path: str) -> None:
-        """Securely delete a file by overwriting with random data before deletion."""
-        file_size = os.path.getsize(file_path)
-        with open(file_path, 'wb') as f:
-            for _ in range(3):  # Overwrite 3 times
-                f.seek(0)
-                f.write(secrets.token_bytes(file_size))
-                f.flush()
-                os.fsync(f.fileno())
-        os.remove(file_path)
+        """Securely delete a file by overwriting it before deletion."""
+        self.deleter.delete(file_path)
+
+class SegmentSealer:
+    """
+    Segment-at-a-time encryption for callers that do their own I/O, such as
+    the asyncio front end: write header, then drive frames() (see
+    _segment_frames) over the plaintext and write seal() of every record
+    it yields, in order.
+    """
+    
+    def __init__(self, encryptor: SecureFileEncryptor, passphrase: str):
+        """Runs the KDF, so it blocks."""
+        self._encryptor = encryptor
+        self._header, self._aesgcm = encryptor._encryption_context(passphrase)
+        self.header = self._header.raw
+    
+    def frames(self) -> Generator:
+        return _segment_frames(self._encryptor.segment_size)
+    
+    def seal(self, index: int, data: bytes, final: bool) -> bytes:
+        return self._encryptor._seal_record(self._aesgcm, self._header, index, data, final)
+
+class SegmentOpener:
+    """
+    Segment-at-a-time decryption, the counterpart of SegmentSealer: parse
+    the header with header_frames(), then drive frames() over the rest of
+    the file and write open() of every record it yields, in order.
+    """
+    
+    def __init__(self, encryptor: SecureFileEncryptor, header: FileHeader, passphrase: str):
+        """Runs the KDF, so it blocks."""
+        self._encryptor = encryptor
+        self._header = header
+        self._aesgcm = encryptor._decryption_cipher(header, passphrase)
+    
+    @staticmethod
+    def header_frames(encryptor: SecureFileEncryptor) -> Generator:
+        """
+        Frame parser returning (header, raw): header is None for a legacy
+        single-blob file, of which raw holds the bytes already read.
+        """
+        return encryptor._header_frames()
+    
+    def frames(self) -> Generator:
+        return self._encryptor._record_frames(self._header)
+    
+    def open(self, index: int, data: bytes, final: bool) -> bytes:
+        """
+        Raises:
+            ValueError: If the password is wrong or the record is corrupted
+        """
+        return self._encryptor._open_record(self._aesgcm, self._header, index, data, final)
+
+class EncryptedFileReader(io.BufferedIOBase):
+    """Seekable, read-only view of the plaintext of a segmented encrypted file."""
+    
+    def __init__(self, encryptor: SecureFileEncryptor, path: str, passphrase: str,
+                 cache_segments: int = 4):
+        super().__init__()
+        self.name = path
+        self._file = open(path, 'rb')
+        try:
+            header = encryptor._read_header(self._file)
+            if header is None:
+                raise ValueError("Random access requires the segmented file format")
+            self._encryptor = encryptor
+            self._header = header
+            self._aesgcm = encryptor._decryption_cipher(header, passphrase)
+            
+            self._sealed_size = header.segment_size + encryptor.TAG_SIZE
+            if header.flags & encryptor.FLAG_COMPRESSED:
+                # Segments vary in length, so locate them all up front
+                self._records = self._scan_records()
+                self._count = len(self._records)
+            else:
+                self._records = None
+                body = os.fstat(self._file.fileno()).st_size - len(header.raw)
+                self._count = max(1, -(-body // self._sealed_size))
+                if body < self._count * encryptor.TAG_SIZE:
+                    raise ValueError("Invalid encrypted file: truncated segment")
+            self._cache_segments = max(1, cache_segments)
+            self._cache = OrderedDict()
+            self._position = 0
+            # The first segment checks the password; the final one proves the
+            # file was not truncated, so size can be trusted
+            self._segment(0)
+            last = self._segment(self._count - 1)
+            self.size = (self._count - 1) * header.segment_size + len(last)
+        except BaseException:
+            self._file.close()
+            raise
+    
+    def _scan_records(self) -> List[Tuple[int, int]]:
+        """Return (offset, length) of every length-prefixed sealed segment."""
+        encryptor = self._encryptor
+        limit = encryptor._max_record_size(self._header)
+        end = os.fstat(self._file.fileno()).st_size
+        offset = len(self._header.raw)
+        records = []
+        while offset < end:
+            self._file.seek(offset)
+            prefix = _read_full(self._file, encryptor.RECORD.size)
+            if len(prefix) != encryptor.RECORD.size:
+                raise ValueError("Invalid encrypted file: truncated segment")
+            (length,) = encryptor.RECORD.unpack(prefix)
+            offset += len(prefix)
+            if length > limit or offset + length > end:
+                raise ValueError("Invalid encrypted file: truncated segment")
+            records.append((offset, length))
+            offset += length
+        if not records:
+            raise ValueError("Invalid encrypted file: truncated segment")
+        return records
+    
+    def _segment(self, index: int) -> bytes:
+        """Return the plaintext of a segment, decrypting it on a cache miss."""
+        data = self._cache.get(index)
+        if data is not None:
+            self._cache.move_to_end(index)
+            return data
+        if self._records is not None:
+            offset, length = self._records[index]
+        else:
+            offset = len(self._header.raw) + index * self._sealed_size
+            length = self._sealed_size
+        self._file.seek(offset)
+        sealed = _read_full(self._file, length)
+        data = self._encryptor._open_record(self._aesgcm, self._header, index, sealed,
+                                            index == self._count - 1)
+        self._cache[index] = data
+        if len(self._cache) > self._cache_segments:
+            self._cache.popitem(last=False)
+        return data
+    
+    def _check_open(self) -> None:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        self._check_open()
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._check_open()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+    
+    def peek(self, size: int = 0) -> bytes:
+        """Return the rest of the current segment without advancing."""
+        self._check_open()
+        if self._position >= self.size:
+            return b''
+        index, offset = divmod(self._position, self._header.segment_size)
+        return self._segment(index)[offset:]
+    
+    def read1(self, size: int = -1) -> bytes:
+        """Read up to size bytes from at most one segment."""
+        data = self.peek()
+        if size is not None and size >= 0:
+            data = data[:size]
+        self._position += len(data)
+        return data
+    
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self._check_open()
+        if size is None or size < 0:
+            size = max(0, self.size - self._position)
+        parts = []
+        while size > 0:
+            data = self.read1(size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+    
+    def readinto(self, buffer) -> int:
+        data = self.read(len(memoryview(buffer)))
+        memoryview(buffer).cast('B')[:len(data)] = data
+        return len(data)
+    
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+            self._cache.clear()
+        super().close()
+
+class _HashingReader:
+    """Read-only stream wrapper feeding everything read to a hashlib object."""
+    
+    def __init__(self, stream: BinaryIO, digest: 'hashlib._Hash'):
+        self._stream = stream
+        self._digest = digest
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._digest.update(data)
+        return data
+
+def _read_full(stream: BinaryIO, size: int) -> bytes:
+    """Read exactly size bytes unless EOF is reached first."""
+    data = stream.read(size)
+    if len(data) == size or not data:
+        return data
+    parts = [data]
+    remaining = size - len(data)
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        parts.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(parts)
+
+def _derive_into(kdf, material) -> bytearray:
+    """Run a cryptography KDF into a new bytearray (32 bytes), so it can be zeroed."""
+    key = bytearray(32)
+    if hasattr(kdf, 'derive_into'):  # cryptography 45+
+        kdf.derive_into(material, key)
+    else:
+        key[:] = kdf.derive(bytes(material))
+    return key
+
+PARTIAL_SUFFIX = '.part'
+
+def _create_partial(path: str) -> str:
+    """
+    Create an empty temporary file next to path and return its name.
+    
+    The name is unique (path's name + random part + PARTIAL_SUFFIX), so
+    two writers of one target never share a temporary file. It is created
+    readable by the owner only.
+    """
+    import tempfile
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, partial = tempfile.mkstemp(prefix=name + '.', suffix=PARTIAL_SUFFIX, dir=directory)
+    os.close(fd)
+    return partial
+
+def _is_partial(candidate: str, path: str) -> bool:
+    """True if candidate is named like a temporary file of path."""
+    directory, name = os.path.split(os.path.abspath(path))
+    cand_dir, cand_name = os.path.split(os.path.abspath(candidate))
+    return (cand_dir == directory and cand_name.startswith(name + '.')
+            and cand_name.endswith(PARTIAL_SUFFIX))
+
+@contextmanager
+def _atomic_output(path: str) -> Iterator[str]:
+    """
+    Yield a new temporary path next to path. It is renamed over path if
+    the block completes and removed if it raises, so an interrupted run
+    never leaves a truncated file under the final name. Concurrent writers
+    of one target each get their own temporary file; the last to finish
+    wins, and no output is ever a mix of both.
+    """
+    partial = _create_partial(path)
+    try:
+        yield partial
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+def _file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in CHUNK_SIZE pieces."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(SecureFileEncryptor.CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _shannon_entropy(data: bytes) -> float:
+    """Bits per byte of data's byte histogram (0.0 for empty data)."""
+    total = len(data)
+    return -sum(count / total * math.log2(count / total)
+                for count in Counter(data).values())
+
+# Record framing is written once, without I/O, as generators that yield
+# either the number of bytes they want next (the reply is shorter only at
+# EOF) or a finished (index, data, final) record. _iter_frames and
+# _read_frames drive them over a blocking stream, file_encryptor_async
+# over an asyncio reader.
+
+def _segment_frames(size: int) -> Generator:
+    """
+    Frames of consecutive size-byte blocks.
+    
+    One block of look-ahead is kept so the last block can be flagged even
+    when the stream length is a multiple of size. An empty stream yields a
+    single empty final block.
+    """
+    current = yield size
+    index = 0
+    while True:
+        following = (yield size) if len(current) == size else b''
+        final = not following
+        yield index, current, final
+        if final:
+            return
+        current = following
+        index += 1
+
+def _length_prefixed_frames(max_size: int) -> Generator:
+    """
+    Frames of length-prefixed records (compressed files). A record is
+    final when the stream ends right after it.
+    
+    Raises:
+        ValueError: If a record is cut short or longer than max_size
+    """
+    record = SecureFileEncryptor.RECORD
+    
+    def read_record() -> Generator:
+        prefix = yield record.size
+        if not prefix:
+            return None
+        if len(prefix) != record.size:
+            raise ValueError("Invalid encrypted file: truncated segment")
+        (length,) = record.unpack(prefix)
+        if length > max_size:
+            raise ValueError("Invalid encrypted file: bad segment length")
+        data = yield length
+        if len(data) != length:
+            raise ValueError("Invalid encrypted file: truncated segment")
+        return data
+    
+    current = yield from read_record()
+    if current is None:
+        raise ValueError("Invalid encrypted file: truncated segment")
+    index = 0
+    while True:
+        following = yield from read_record()
+        final = following is None
+        yield index, current, final
+        if final:
+            return
+        current = following
+        index += 1
+
+def _iter_frames(stream: BinaryIO, frames: Generator) -> Iterator[Tuple[int, bytes, bool]]:
+    """Run a frame parser over a blocking stream, yielding its records."""
+    try:
+        request = next(frames)
+        while True:
+            if isinstance(request, int):
+                request = frames.send(_read_full(stream, request))
+            else:
+                yield request
+                request = next(frames)
+    except StopIteration:
+        return
+
+def _read_frames(stream: BinaryIO, frames: Generator):
+    """Run a frame parser that only reads (e.g. a header's) and return its result."""
+    try:
+        request = next(frames)
+        while True:
+            request = frames.send(_read_full(stream, request))
+    except StopIteration as e:
+        return e.value
+
+def _iter_segments(stream: BinaryIO, size: int) -> Iterator[Tuple[int, bytes, bool]]:
+    """Yield (index, data, final) for consecutive size-byte blocks of a stream."""
+    return _iter_frames(stream, _segment_frames(size))
+
+def load_kdf_params() -> Optional[KDFParams]:
+    """Return the KDF parameters saved by --calibrate, or None."""
+    try:
+        with open(CONFIG_DIR / 'kdf.json', 'r') as f:
+            data = json.load(f)
+        params = KDFParams(SecureFileEncryptor.KDF_NAMES[data['kdf']], data['cost'],
+                           data['memory'], data['parallelism'])
+        SecureFileEncryptor._check_kdf(params)
+        return params
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_kdf_params(params: KDFParams) -> Path:
+    """Save KDF parameters as the default for new files; returns the path."""
+    names = {kdf_id: name for name, kdf_id in SecureFileEncryptor.KDF_NAMES.items()}
+    path = CONFIG_DIR / 'kdf.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'kdf': names[params.kdf_id], 'cost': params.cost,
+                   'memory': params.memory, 'parallelism': params.parallelism}, f, indent=4)
+    return path
+
+def _kdf_from_args(args) -> Optional[KDFParams]:
+    """KDF for new files: --kdf options, else the calibrated default, else None."""
+    if not args.kdf:
+        return load_kdf_params()
+    params = SecureFileEncryptor.KDF_DEFAULTS[SecureFileEncryptor.KDF_NAMES[args.kdf]]
+    if args.kdf_cost is not None:
+        params = params._replace(cost=args.kdf_cost)
+    if args.kdf_memory is not None:
+        params = params._replace(memory=args.kdf_memory)
+    if args.kdf_parallelism is not None:
+        params = params._replace(parallelism=args.kdf_parallelism)
+    return params
+
+def run_calibration(args) -> int:
+    """Measure the KDF on this host, print and save the chosen parameters."""
+    name = args.kdf or 'argon2id'
+    target = args.target_ms / 1000
+    try:
+        params = SecureFileEncryptor.calibrate_kdf(name, target)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    SecureFileEncryptor._make_kdf(params, secrets.token_bytes(16)).derive(b'check')
+    elapsed = time.perf_counter() - start
+    print(f"{name}: cost={params.cost} memory={params.memory} "
+          f"parallelism={params.parallelism} ({elapsed * 1000:.0f} ms here)")
+    print(f"Saved as default for new files: {save_kdf_params(params)}")
+    return 0
+
+def run_backend_report() -> int:
+    """Print every cipher backend's self-test result, speed and the choice made."""
+    from file_encryptor_backends import BACKEND_ENV, registry
+    try:
+        print(registry.describe())
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Set {BACKEND_ENV}=<name> to force a backend.")
+    return 0
+
+def _read_passphrase() -> str:
+    """
+    Prompt for the passphrase on the terminal or, without one, read it as
+    the first line of stdin. getpass would read that line through sys.stdin's
+    text buffer, swallowing data piped after it for -i - or --stdin0; the
+    binary buffer keeps it.
+    """
+    import getpass
+    if os.name != 'posix':
+        return getpass.getpass("Enter passphrase: ")
+    try:
+        with open('/dev/tty'):
+            pass
+    except OSError:
+        print("Enter passphrase: ", end='', file=sys.stderr, flush=True)
+        line = sys.stdin.buffer.readline()
+        print(file=sys.stderr)
+        return line.rstrip(b'\r\n').decode(sys.stdin.encoding or 'utf-8')
+    return getpass.getpass("Enter passphrase: ")
+
+def _progress_bar(args, total: Optional[int]):
+    """Create a tqdm bar (on stderr) and the progress callback that drives it."""
+    from tqdm import tqdm
+    bar = tqdm(total=total, unit='B', unit_scale=True, unit_divisor=1024,
+               desc='Encrypting' if args.encrypt else 'Decrypting', disable=args.quiet)
+    
+    def show_progress(info: ProgressInfo) -> None:
+        if info.total_bytes is not None:
+            bar.total = info.total_bytes
+        bar.update(info.bytes_done - bar.n)
+    return bar, show_progress
+
+def run_stream(args, encryptor: SecureFileEncryptor, passphrase: str) -> int:
+    """Encrypt or decrypt with stdin and/or stdout ('-') in place of files."""
+    in_stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    out_stream = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    total = None if args.input == '-' else os.path.getsize(args.input)
+    bar, show_progress = _progress_bar(args, total)
+    try:
+        if args.encrypt:
+            encryptor.encrypt_stream(in_stream, out_stream, passphrase, progress=show_progress)
+        else:
+            encryptor.decrypt_stream(in_stream, out_stream, passphrase, progress=show_progress)
+        out_stream.flush()
+    except Exception as e:
+        bar.close()
+        print(f"Error: {str(e)}", file=sys.stderr)
+        if args.output != '-':
+            out_stream.close()
+            os.remove(args.output)
+        return 1
+    finally:
+        bar.close()
+        for stream in (in_stream, out_stream):
+            if stream not in (sys.stdin.buffer, sys.stdout.buffer):
+                stream.close()
+    return 0
+
+def _default_output_path(input_path: str, encrypt: bool) -> str:
+    """Append .enc when encrypting, strip it when decrypting."""
+    path = Path(input_path)
+    if encrypt:
+        return str(path.with_suffix(path.suffix + '.enc'))
+    return str(path.with_suffix(''))
+
+def _walk_files(root: str, skip: Optional[str] = None) -> Iterator[str]:
+    """
+    Regular files below root in sorted order, leaving out symlinks,
+    temporary .part files and the directory skip (an output tree that may
+    lie inside root).
+    """
+    skip = os.path.abspath(skip) if skip else None
+    for directory, dirs, files in os.walk(root):
+        # Never descend into the tree being written
+        dirs[:] = sorted(name for name in dirs
+                         if os.path.abspath(os.path.join(directory, name)) != skip)
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if name.endswith(PARTIAL_SUFFIX) or os.path.islink(path):
+                continue
+            if os.path.isfile(path):
+                yield path
+
+def _iter_batch_inputs(args) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yield (input_path, base_dir) for every file selected by -r, --from-file
+    or --stdin0. base_dir is the -r root, used to mirror the tree under -o.
+    """
+    if args.recursive:
+        for path in _walk_files(args.recursive, args.output):
+            if path.endswith('.enc') == bool(args.decrypt):
+                yield path, args.recursive
+    elif args.from_file:
+        with open(args.from_file, 'r') as list_file:
+            for line in list_file:
+                path = line.rstrip('\n')
+                if path:
+                    yield path, None
+    else:
+        # NUL-separated names, e.g. from `find -print0`
+        pending = b''
+        while True:
+            chunk = sys.stdin.buffer.read(SecureFileEncryptor.CHUNK_SIZE)
+            if not chunk:
+                break
+            *names, pending = (pending + chunk).split(b'\0')
+            for name in names:
+                if name:
+                    yield os.fsdecode(name), None
+        if pending:
+            yield os.fsdecode(pending), None
+
+def _batch_jobs(args) -> Iterator[Tuple[str, str]]:
+    """Map batch inputs to output paths, mirroring the tree under -o if given."""
+    for input_path, base_dir in _iter_batch_inputs(args):
+        output_path = _default_output_path(input_path, args.encrypt)
+        if args.output:
+            relative = (os.path.relpath(output_path, base_dir) if base_dir
+                        else os.path.basename(output_path))
+            output_path = os.path.join(args.output, relative)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        yield input_path, output_path
+
+def _unique_targets(jobs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Collect (input, output) pairs, refusing any two that share an output.
+    
+    Raises:
+        ValueError: Naming the first two inputs that would collide
+    """
+    owners = {}
+    unique = []
+    for input_path, output_path in jobs:
+        key = os.path.normcase(os.path.abspath(output_path))
+        if key in owners:
+            raise ValueError(f"{owners[key]} and {input_path} would both be written to "
+                             f"{output_path}")
+        owners[key] = input_path
+        unique.append((input_path, output_path))
+    return unique
+
+def _batch_source(args) -> str:
+    """Describe the batch selection for BatchJournal.batch_key."""
+    if args.recursive:
+        return 'dir:' + os.path.abspath(args.recursive)
+    if args.from_file:
+        return 'list:' + os.path.abspath(args.from_file)
+    return 'stdin0'
+
+def run_batch(args, passphrase: str) -> int:
+    """Process a batch selection and print a per-file summary. Returns exit code."""
+    mode = 'encrypt' if args.encrypt else 'decrypt'
+    jobs = _batch_jobs(args)
+    if not args.recursive:
+        # Listed files have no tree to mirror: /a/x and /b/x both map to
+        # -o/x.enc, so every target is checked before any work starts
+        try:
+            jobs = _unique_targets(jobs)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    journal = BatchJournal()
+    resumed = journal.start(BatchJournal.batch_key(mode, _batch_source(args), args.output),
+                            mode, resume=args.resume)
+    if args.resume and not resumed:
+        print("No earlier run of this batch found; starting from the beginning",
+              file=sys.stderr)
+    # Parallelism comes from the file pool; one segment thread per file
+    # unless the user asked for more.
+    encryptor = SecureFileEncryptor(workers=args.workers or 1, batch=True,
+                                    io_mode=args.io, kdf=_kdf_from_args(args),
+                                    compression=args.compress,
+                                    compression_level=args.compress_level,
+                                    deleter=SecureDeleter(args.wipe_scheme, args.punch_holes))
+    max_jobs = args.jobs or min(8, os.cpu_count() or 1)
+    
+    # Input stats are taken before a file is queued, so one modified while
+    # it was being processed is not recorded as done
+    input_stats = {}
+    skipped = 0
+    
+    def pending_jobs() -> Iterator[Tuple[str, str]]:
+        nonlocal skipped
+        for input_path, output_path in jobs:
+            if resumed and journal.is_done(input_path, output_path):
+                skipped += 1
+                continue
+            try:
+                input_stats[input_path] = os.stat(input_path)
+            except OSError:
+                pass
+            yield input_path, output_path
+    
+    # Ctrl+C stops starting files and abandons the ones in progress (they
+    # leave no output), keeping the journal so --resume can continue; a
+    # second Ctrl+C aborts at once
+    cancel = CancellationToken()
+    
+    def interrupt(signum, frame):
+        cancel.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+    index = None
+    succeeded = failed = unchanged = 0
+    total_bytes = 0
+    start = time.perf_counter()
+    try:
+        index = ContentIndex() if args.incremental else None
+        with journal:
+            for result in encryptor.process_batch(mode, pending_jobs(), passphrase,
+                                                  args.delete, max_jobs, checksum=True,
+                                                  index=index, cancel=cancel):
+                journal.record(result, input_stats.pop(result.input_path, None))
+                if not result.ok and cancel.cancelled:
+                    continue
+                if result.skipped:
+                    unchanged += 1
+                elif result.ok:
+                    succeeded += 1
+                    total_bytes += result.size
+                    print(f"OK    {result.input_path} -> {result.output_path} "
+                          f"({result.size} bytes, {result.seconds:.2f}s)")
+                else:
+                    failed += 1
+                    print(f"FAIL  {result.input_path}: {result.error}", file=sys.stderr)
+            if not cancel.cancelled:
+                journal.finish()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if index is not None:
+            index.close()
+    elapsed = time.perf_counter() - start
+    
+    summary = f"\n{succeeded} succeeded, {failed} failed, "
+    if unchanged:
+        summary += f"{unchanged} unchanged, "
+    if skipped:
+        summary += f"{skipped} already done, "
+    print(summary + f"{total_bytes / (1024 * 1024):.1f} MB in {elapsed:.2f}s")
+    if cancel.cancelled:
+        print("Interrupted; run the same command with --resume to continue",
+              file=sys.stderr)
+        return 130
+    return 1 if failed else 0
+
+def run_archive(args, passphrase: str) -> int:
+    """Create (-e), extract (-d) or list (--list) an archive. Returns exit code."""
+    from file_encryptor_archive import EncryptedArchive, create_archive, tree_sources
+    
+    encryptor = SecureFileEncryptor(workers=args.workers, kdf=_kdf_from_args(args),
+                                    compression=args.compress,
+                                    compression_level=args.compress_level,
+                                    deleter=SecureDeleter(args.wipe_scheme, args.punch_holes))
+    try:
+        if args.encrypt and not args.list:
+            archived = []
+            
+            def sources() -> Iterator[Tuple[str, str]]:
+                # An archive takes every file of the tree, not just those
+                # -e would encrypt: *.enc files are archived too
+                listed = (tree_sources(args.recursive) if args.recursive
+                          else ((path, path) for path, _ in _iter_batch_inputs(args)))
+                for input_path, name in listed:
+                    if (os.path.abspath(input_path) == os.path.abspath(args.archive)
+                            or _is_partial(input_path, args.archive)):
+                        continue
+                    archived.append(input_path)
+                    yield input_path, name
+            
+            bar, show_progress = _progress_bar(args, None)
+            with bar:
+                members = create_archive(encryptor, args.archive, sources(), passphrase,
+                                         progress=show_progress)
+            if args.delete:
+                for input_path in archived:
+                    encryptor._secure_delete_file(input_path)
+            print(f"\nArchived {len(members)} files "
+                  f"({sum(member.size for member in members)} bytes): {args.archive}")
+            return 0
+        
+        with EncryptedArchive(args.archive, passphrase, encryptor) as archive:
+            if args.list:
+                for member in archive.members:
+                    mtime = time.strftime('%Y-%m-%d %H:%M',
+                                          time.localtime(member.mtime_ns / 1e9))
+                    print(f"{member.size:>12}  {mtime}  {member.name}")
+                return 0
+            names = args.member or [member.name for member in archive.members]
+            for name in names:
+                try:
+                    print(f"Extracted {archive.extract(name, args.output or '.')}")
+                except KeyError:
+                    print(f"Error: No such archive member: {name}", file=sys.stderr)
+                    return 1
+        return 0
+    except (ValueError, OSError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+
+def run_dedup(args, passphrase: str) -> int:
+    """Store files as chunk store manifests (-e) or rebuild them (-d). Returns exit code."""
+    from file_encryptor_dedup import ChunkStore
+    
+    store = ChunkStore(args.store, SecureFileEncryptor(kdf=_kdf_from_args(args),
+                                                       key_cache=DerivedKeyCache()))
+    deleter = SecureDeleter(args.wipe_scheme, args.punch_holes)
+    jobs = [(args.input, args.output)] if args.input else _batch_jobs(args)
+    failed = 0
+    total_bytes = new_bytes = 0
+    for input_path, output_path in jobs:
+        try:
+            if args.encrypt:
+                stats = store.store_file(input_path, output_path, passphrase)
+                total_bytes += stats.size
+                new_bytes += stats.new_bytes
+                if args.delete:
+                    deleter.delete(input_path)
+                print(f"OK    {input_path} -> {output_path} "
+                      f"({stats.chunks} chunks, {stats.new_chunks} new)")
+            else:
+                store.restore_file(input_path, output_path, passphrase)
+                print(f"OK    {input_path} -> {output_path}")
+        except (ValueError, OSError) as e:
+            failed += 1
+            print(f"FAIL  {input_path}: {e}", file=sys.stderr)
+    if args.encrypt:
+        print(f"\n{total_bytes / (1024 * 1024):.1f} MB stored, "
+              f"{new_bytes / (1024 * 1024):.1f} MB of it new")
+    return 1 if failed else 0
 
 def main():
+    import argparse
     parser = argparse.ArgumentParser(description="Secure File Encryptor")
     parser.add_argument('-e', '--encrypt', action='store_true', help="Encrypt the input file")
     parser.add_argument('-d', '--decrypt', action='store_true', help="Decrypt the input file")
-    parser.add_argument('-i', '--input', required=True, help="Input file path")
-    parser.add_argument('-o', '--output', help="Output file path (optional)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-i', '--input', help="Input file path, or - for stdin")
+    source.add_argument('-r', '--recursive', metavar='DIR',
+                        help="Process every file under DIR (only *.enc files when decrypting)")
+    source.add_argument('--from-file', metavar='LIST', help="Process the files listed in LIST, one per line")
+    source.add_argument('--stdin0', action='store_true',
+                        help="Process NUL-separated file names read from stdin (find -print0)")
+    parser.add_argument('-o', '--output', help="Output file path, - for stdout, or output directory in batch mode (optional)")
+    parser.add_argument('--archive', metavar='FILE',
+                        help="With -e, pack the batch inputs (with -r, every file of the "
+                             "tree, *.enc included) into one encrypted archive; "
+                             "with -d, extract it into -o (default: current directory)")
+    parser.add_argument('--list', action='store_true', help="List the members of --archive")
+    parser.add_argument('--member', action='append', metavar='NAME',
+                        help="With -d --archive, extract only this member (repeatable)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Store files as manifests of deduplicated chunks in a chunk store")
+    parser.add_argument('--store', metavar='DIR',
+                        help="Chunk store used by --dedup (default: ~/Encrypted/.store)")
     parser.add_argument('--delete', action='store_true', help="Securely delete the original file after encryption")
+    parser.add_argument('--wipe-scheme', choices=SecureDeleter.SCHEMES, default='default',
+                        help="Overwrite passes used by --delete (default: 3 random passes)")
+    parser.add_argument('--punch-holes', action='store_true',
+                        help="After wiping, deallocate the file's blocks (discard/TRIM where supported)")
+    parser.add_argument('-w', '--workers', type=int, help="Number of encryption threads (default: CPU count)")
+    parser.add_argument('--io', choices=SecureFileEncryptor.IO_MODES, default='stream',
+                        help="File I/O strategy: buffered streaming or memory-mapped")
+    parser.add_argument('--compress', choices=SecureFileEncryptor.COMPRESSION_NAMES,
+                        help="Compress segments before encryption (incompressible ones are stored as is)")
+    parser.add_argument('--compress-level', type=int, help="Compression level (default: the codec's own)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Do not show a progress bar")
+    parser.add_argument('-j', '--jobs', type=int, help="Files processed concurrently in batch mode")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted batch, skipping files it already finished")
+    parser.add_argument('--incremental', action='store_true',
+                        help="When encrypting a batch, skip files unchanged since their last encryption")
+    parser.add_argument('--kdf', choices=SecureFileEncryptor.KDF_NAMES,
+                        help="Key derivation for new files (default: calibrated setting or pbkdf2)")
+    parser.add_argument('--kdf-cost', type=int, help="KDF iterations (scrypt: N)")
+    parser.add_argument('--kdf-memory', type=int, help="KDF memory (Argon2id: KiB, scrypt: r)")
+    parser.add_argument('--kdf-parallelism', type=int, help="KDF lanes (scrypt: p)")
+    parser.add_argument('--calibrate', action='store_true',
+                        help="Tune the KDF (--kdf, default argon2id) to --target-ms on this host")
+    parser.add_argument('--target-ms', type=float, default=250,
+                        help="Target unlock time for --calibrate (default: 250)")
+    parser.add_argument('--backends', action='store_true',
+                        help="Self-test and time the available AES-GCM backends and show which is used")
     
     args = parser.parse_args()
     
+    if args.calibrate:
+        sys.exit(run_calibration(args))
+    if args.backends:
+        sys.exit(run_backend_report())
+    
+    if (args.list or args.member) and not args.archive:
+        parser.error("--list and --member need --archive")
+    if args.archive and (args.list or args.decrypt):
+        if args.input or args.recursive or args.from_file or args.stdin0:
+            parser.error("Extracting or listing an archive takes no other input")
+        sys.exit(run_archive(args, _read_passphrase()))
+    if args.archive and args.input:
+        parser.error("--archive packs -r, --from-file or --stdin0 inputs, not -i")
+    
+    if not (args.input or args.recursive or args.from_file or args.stdin0):
+        parser.error("One of -i/--input, -r/--recursive, --from-file or --stdin0 is required")
+    
     if not args.encrypt and not args.decrypt:
         parser.error("Must specify either -e/--encrypt or -d/--decrypt")
         
     if args.encrypt and args.decrypt:
         parser.error("Cannot specify both encrypt and decrypt")
-        
-    if not os.path.exists(args.input):
+    
+    batch = not args.input
+    if args.recursive and not os.path.isdir(args.recursive):
+        parser.error(f"Input directory does not exist: {args.recursive}")
+    if args.from_file and not os.path.isfile(args.from_file):
+        parser.error(f"File list does not exist: {args.from_file}")
+    if not batch and args.input != '-' and not os.path.exists(args.input):
         parser.error(f"Input file does not exist: {args.input}")
+    if args.input == '-' and args.delete:
+        parser.error("--delete cannot be used when reading from stdin")
+    if batch and args.output == '-':
+        parser.error("Batch mode needs an output directory, not stdout")
+    if args.resume and not batch:
+        parser.error("--resume only applies to -r, --from-file or --stdin0")
+    if args.incremental and not (batch and args.encrypt):
+        parser.error("--incremental only applies to batch encryption")
+    if args.archive and (args.resume or args.incremental):
+        parser.error("--resume and --incremental do not apply to archives")
+    if args.dedup and (args.archive or args.input == '-' or args.output == '-'):
+        parser.error("--dedup works on files, not archives or pipes")
+    if args.dedup and (args.resume or args.incremental or args.compress):
+        parser.error("--resume, --incremental and --compress do not apply to --dedup")
         
     # Generate default output path if not specified
-    if not args.output:
-        input_path = Path(args.input)
-        if args.encrypt:
-            args.output = str(input_path.with_suffix(input_path.suffix + '.enc'))
+    if not batch and not args.output:
+        if args.input == '-':
+            args.output = '-'
         else:
-            args.output = str(input_path.with_suffix(''.join(input_path.suffixes[:-1])))
+            args.output = _default_output_path(args.input, args.encrypt)
             
-    # Get passphrase
-    import getpass
-    passphrase = getpass.getpass("Enter passphrase: ")
-    
-    encryptor = SecureFileEncryptor()
     try:
-        if args.encrypt:
-            encryptor.encrypt_file(args.input, args.output, passphrase, args.delete)
-            print(f"\nFile encrypted successfully: {args.output}")
-        else:
-            encryptor.decrypt_file(args.input, args.output, passphrase)
-            print(f"\nFile decrypted successfully: {args.output}")
-    except Exception as e:
-        print(f"Error: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+        kdf = _kdf_from_args(args)
+        if kdf is not None:
+            SecureFileEncryptor._check_kdf(kdf)
+        if args.compress:
+            SecureFileEncryptor._codec(SecureFileEncryptor.COMPRESSION_NAMES[args.compress])
+    except ValueError as e:
+        parser.error(str(e))
+    
+    passphrase = _read_passphrase()
+    
+    if args.archive:
+        sys.exit(run_archive(args, passphrase))
+    if args.dedup:
+        sys.exit(run_dedup(args, passphrase))
+    if batch:
+        sys.exit(run_batch(args, passphrase))
+    
+    encryptor = SecureFileEncryptor(workers=args.workers, io_mode=args.io,
+                                    kdf=_kdf_from_args(args), compression=args.compress,
+                                    compression_level=args.compress_level,
+                                    deleter=SecureDeleter(args.wipe_scheme, args.punch_holes))
+    if args.input == '-' or args.output == '-':
+        status = run_stream(args, encryptor, passphrase)
+        if status == 0 and args.delete:
+            encryptor._secure_delete_file(args.input)
+        sys.exit(status)
+    
+    bar, show_progress = _progress_bar(args, os.path.getsize(args.input))
+    with bar:
+        try:
+            if args.encrypt:
+                encryptor.encrypt_file(args.input, args.output, passphrase, args.delete,
+                                       progress=show_progress)
+            else:
+                encryptor.decrypt_file(args.input, args.output, passphrase,
+                                       progress=show_progress)
+        except Exception as e:
+            bar.close()
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+    if args.encrypt:
+        print(f"\nFile encrypted successfully: {args.output}")
+    else:
+        print(f"\nFile decrypted successfully: {args.output}")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
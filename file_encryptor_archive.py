@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import posixpath
+import struct
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from file_encryptor import (SecureFileEncryptor, CancellationToken, ProgressCallback,
+                            _atomic_output, _walk_files)
+
+# An archive is an ordinary segmented encrypted file whose plaintext is
+#   member 0 | member 1 | ... | index (JSON) | trailer
+# so one header, one salt and one KDF run cover every member, and the
+# central index is encrypted and authenticated like the data. Random access
+# through EncryptedFileReader means listing decrypts only the tail and
+# extracting a member decrypts only the segments it spans.
+ARCHIVE_MAGIC = b'SLCARCH\x00'
+ARCHIVE_VERSION = 1
+TRAILER = struct.Struct('>8sQQ')  # magic, index offset, index length
+
+class ArchiveMember(NamedTuple):
+    """One file stored in an archive. offset is into the archive plaintext."""
+    name: str
+    offset: int
+    size: int
+    mode: int
+    mtime_ns: int
+
+class _ArchiveSource(io.RawIOBase):
+    """
+    Readable stream of an archive's plaintext: the members one after the
+    other, then the index and trailer once the last member is exhausted.
+
+    Offsets and sizes come from the bytes actually read, so a file that
+    changes size while being archived is still indexed correctly.
+    """
+
+    def __init__(self, sources: Iterable[Tuple[str, str]]):
+        super().__init__()
+        self._sources = iter(sources)
+        self._current = None
+        self._member = None
+        self._tail = None
+        self._position = 0
+        self.members = []
+        self._names = set()
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_member(self) -> bool:
+        """Open the next source; False once all have been read."""
+        for path, name in self._sources:
+            name = member_name(name)
+            if name in self._names:
+                raise ValueError(f"Duplicate archive member: {name}")
+            self._names.add(name)
+            self._current = open(path, 'rb')
+            st = os.fstat(self._current.fileno())
+            self._member = [name, self._position, 0, st.st_mode & 0o7777, st.st_mtime_ns]
+            return True
+        return False
+
+    def _finish_member(self) -> None:
+        self._current.close()
+        self._current = None
+        self.members.append(ArchiveMember(*self._member))
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        while self._tail is None:
+            if self._current is None and not self._next_member():
+                index = _encode_index(self.members)
+                self._tail = io.BytesIO(
+                    index + TRAILER.pack(ARCHIVE_MAGIC, self._position, len(index)))
+                break
+            count = self._current.readinto(view)
+            if count:
+                self._member[2] += count
+                self._position += count
+                return count
+            self._finish_member()
+        return self._tail.readinto(view)
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+def member_name(name: str) -> str:
+    """
+    Normalise a path into a member name: forward slashes, no drive, no
+    leading slash and no '..' components.
+
+    Raises:
+        ValueError: If nothing is left, or the name escapes the archive root
+    """
+    name = os.path.splitdrive(name)[1].replace(os.sep, '/')
+    name = posixpath.normpath(name).lstrip('/')
+    if name in ('', '.') or name == '..' or name.startswith('../'):
+        raise ValueError(f"Invalid archive member name: {name!r}")
+    return name
+
+def _encode_index(members: List[ArchiveMember]) -> bytes:
+    return json.dumps({'version': ARCHIVE_VERSION,
+                       'members': [list(member) for member in members]},
+                      separators=(',', ':')).encode()
+
+def create_archive(encryptor: SecureFileEncryptor, archive_path: str,
+                   sources: Iterable[Tuple[str, str]], passphrase: str,
+                   progress: Optional[ProgressCallback] = None,
+                   cancel: Optional[CancellationToken] = None) -> List[ArchiveMember]:
+    """
+    Pack files into one encrypted archive.
+
+    The archive is written under a temporary name and renamed into place
+    when complete. Segment workers and compression are those configured on
+    encryptor.
+
+    Args:
+        encryptor: Encryptor whose settings are used for the container
+        archive_path: Path of the archive to create
+        sources: (file path, member name) pairs; consumed lazily
+        passphrase: Password to use for encryption
+        progress: As for SecureFileEncryptor.encrypt_stream
+        cancel: As for SecureFileEncryptor.encrypt_file; a cancelled run
+            leaves no archive
+
+    Returns:
+        The members written, in archive order
+
+    Raises:
+        ValueError: If a member name is invalid or repeated
+    """
+    source = _ArchiveSource(sources)
+    try:
+        with _atomic_output(archive_path) as partial, open(partial, 'wb') as out_file:
+            encryptor.encrypt_stream(source, out_file, passphrase, progress, cancel)
+    finally:
+        source.close()
+    return source.members
+
+def tree_sources(root: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (path, member name) for every regular file under root, sorted,
+    whatever its name (*.enc files included).
+    """
+    for path in _walk_files(root):
+        yield path, os.path.relpath(path, root)
+
+class EncryptedArchive:
+    """
+    Read-only access to an archive created by create_archive.
+
+    Opening checks the password and decrypts only the index; each member
+    read afterwards decrypts just the segments it covers.
+    """
+
+    def __init__(self, path: str, passphrase: str,
+                 encryptor: Optional[SecureFileEncryptor] = None):
+        """
+        Raises:
+            ValueError: If the password is wrong, or the file is corrupted or
+                not an archive
+        """
+        encryptor = encryptor or SecureFileEncryptor()
+        self.path = path
+        self._reader = encryptor.open_encrypted(path, passphrase)
+        try:
+            self._members = self._read_index()
+        except BaseException:
+            self._reader.close()
+            raise
+        self._by_name = {member.name: member for member in self._members}
+
+    def _read_index(self) -> List[ArchiveMember]:
+        reader = self._reader
+        if reader.size < TRAILER.size:
+            raise ValueError("Not an encrypted archive")
+        reader.seek(reader.size - TRAILER.size)
+        magic, offset, length = TRAILER.unpack(reader.read(TRAILER.size))
+        if magic != ARCHIVE_MAGIC or offset + length > reader.size - TRAILER.size:
+            raise ValueError("Not an encrypted archive")
+        reader.seek(offset)
+        try:
+            index = json.loads(reader.read(length))
+            if index['version'] != ARCHIVE_VERSION:
+                raise ValueError(f"Unsupported archive version: {index['version']}")
+            members = [ArchiveMember(*fields) for fields in index['members']]
+        except (KeyError, TypeError, UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("Invalid encrypted archive: bad index") from None
+        for member in members:
+            if (not isinstance(member.name, str) or member_name(member.name) != member.name
+                    or member.offset < 0 or member.size < 0
+                    or member.offset + member.size > offset):
+                raise ValueError("Invalid encrypted archive: bad index")
+        return members
+
+    @property
+    def members(self) -> List[ArchiveMember]:
+        """Members in archive order."""
+        return list(self._members)
+
+    def getmember(self, name: str) -> ArchiveMember:
+        """
+        Raises:
+            KeyError: If there is no member with that name
+        """
+        return self._by_name[member_name(name)]
+
+    def iter_member(self, name: str, chunk_size: int = SecureFileEncryptor.SEGMENT_SIZE
+                    ) -> Iterator[bytes]:
+        """Yield the contents of a member in chunks of at most chunk_size."""
+        member = self.getmember(name)
+        self._reader.seek(member.offset)
+        remaining = member.size
+        while remaining > 0:
+            data = self._reader.read(min(chunk_size, remaining))
+            if not data:
+                raise ValueError("Invalid encrypted archive: truncated member")
+            remaining -= len(data)
+            yield data
+
+    def read(self, name: str) -> bytes:
+        """Return the whole contents of a member."""
+        return b''.join(self.iter_member(name))
+
+    def extract(self, name: str, dest_dir: str = '.') -> str:
+        """
+        Extract one member below dest_dir, restoring its permission bits
+        (without setuid/setgid/sticky) and mtime.
+
+        Returns:
+            Path of the extracted file
+        """
+        member = self.getmember(name)
+        target = os.path.join(dest_dir, *member.name.split('/'))
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        with _atomic_output(target) as partial:
+            with open(partial, 'wb') as out_file:
+                for data in self.iter_member(member.name):
+                    out_file.write(data)
+            os.chmod(partial, member.mode & 0o777)
+            os.utime(partial, ns=(member.mtime_ns, member.mtime_ns))
+        return target
+
+    def extractall(self, dest_dir: str = '.') -> List[str]:
+        """Extract every member below dest_dir, in archive order."""
+        return [self.extract(member.name, dest_dir) for member in self._members]
+
+    def close(self) -> None:
+        self._reader.close()
+
+    def __enter__(self) -> 'EncryptedArchive':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import os
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import AsyncIterator, Generator, Optional, Tuple
+
+from file_encryptor import (SecureFileEncryptor, DerivedKeyCache, SegmentOpener,
+                            SegmentSealer, _create_partial, _iter_frames, _read_frames)
+
+class AsyncSecureFileEncryptor:
+    """
+    asyncio front end for SecureFileEncryptor.
+
+    KDF runs, AES-GCM calls and blocking file I/O are handed to an executor
+    one segment at a time, so the event loop never blocks and a task
+    awaiting an operation can be cancelled between any two segments
+    (cancellation waits for the segment in flight, then cleans up). The
+    rename that publishes the output cannot be undone: a task cancelled
+    while it runs still raises CancelledError, but its output is complete.
+    A semaphore caps how many operations run at once; the rest wait their
+    turn without holding a thread.
+    """
+
+    def __init__(self, encryptor: Optional[SecureFileEncryptor] = None,
+                 max_concurrency: int = 16, executor: Optional[Executor] = None):
+        """
+        Args:
+            encryptor: Configured encryptor to use (default: one segment
+                thread and a derived-key cache)
+            max_concurrency: Operations allowed to run at the same time
+            executor: Executor for CPU-bound and blocking work (default: the
+                event loop's default executor)
+        """
+        self.encryptor = encryptor or SecureFileEncryptor(workers=1,
+                                                          key_cache=DerivedKeyCache())
+        self.executor = executor
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, func, *args, discard=None):
+        """
+        Run a blocking call in the executor.
+
+        The call cannot be interrupted, so if the awaiting task is cancelled
+        this still waits for it to return before CancelledError propagates:
+        the caller's cleanup never closes or removes a file the call is
+        using. A result that arrives after cancellation is passed to
+        discard (e.g. to close a file just opened).
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait([future])
+                except asyncio.CancelledError:
+                    pass  # Cancelled again: the call still has to finish
+            if discard is not None and not future.cancelled() and future.exception() is None:
+                discard(future.result())
+            raise
+
+    async def encrypt_file_async(self, input_path: str, output_path: str,
+                                 passphrase: str) -> None:
+        """
+        Encrypt a file without blocking the event loop.
+
+        The output is written under a temporary name and renamed into place
+        when complete; on cancellation or error it is removed, unless the
+        rename had already started (see the class docstring).
+        """
+        async with self._semaphore:
+            sealer = await self._run(SegmentSealer, self.encryptor, passphrase)
+            in_file = await self._run(open, input_path, 'rb', discard=_close)
+            try:
+                partial = await self._run(_create_partial, output_path,
+                                          discard=_remove_if_exists)
+                try:
+                    out_file = await self._run(open, partial, 'wb', discard=_close)
+                    try:
+                        await self._run(out_file.write, sealer.header)
+                        segments = _iter_frames(in_file, sealer.frames())
+
+                        def step() -> bool:
+                            index, data, final = next(segments)
+                            out_file.write(sealer.seal(index, data, final))
+                            return final
+
+                        while not await self._run(step):
+                            pass
+                    finally:
+                        # No executor call is using it any more (see _run)
+                        out_file.close()
+                    await self._run(os.replace, partial, output_path)
+                except BaseException:
+                    _remove_if_exists(partial)
+                    raise
+            finally:
+                in_file.close()
+
+    async def decrypt_file_async(self, input_path: str, output_path: str,
+                                 passphrase: str) -> None:
+        """
+        Decrypt a file without blocking the event loop.
+
+        As with encryption, output only appears under its final name once
+        complete.
+
+        Raises:
+            ValueError: If password is incorrect or file is corrupted
+        """
+        enc = self.encryptor
+        async with self._semaphore:
+            in_file = await self._run(open, input_path, 'rb', discard=_close)
+            try:
+                header, _ = await self._run(_read_frames, in_file,
+                                            SegmentOpener.header_frames(enc))
+                opener = (await self._run(SegmentOpener, enc, header, passphrase)
+                          if header is not None else None)
+                partial = await self._run(_create_partial, output_path,
+                                          discard=_remove_if_exists)
+                try:
+                    if header is None:
+                        # Legacy single-blob files have no segments to yield between
+                        await self._run(in_file.seek, 0)
+                        await self._run(enc._decrypt_legacy, in_file, partial, passphrase)
+                    else:
+                        out_file = await self._run(open, partial, 'wb', discard=_close)
+                        try:
+                            segments = _iter_frames(in_file, opener.frames())
+
+                            def step() -> bool:
+                                index, data, final = next(segments)
+                                out_file.write(opener.open(index, data, final))
+                                return final
+
+                            while not await self._run(step):
+                                pass
+                        finally:
+                            out_file.close()
+                    await self._run(os.replace, partial, output_path)
+                except BaseException:
+                    _remove_if_exists(partial)
+                    raise
+            finally:
+                in_file.close()
+
+    async def encrypt_stream(self, reader, writer, passphrase: str) -> None:
+        """
+        Encrypt everything read from reader into writer.
+
+        Args:
+            reader: Object with ``async read(n)``, e.g. asyncio.StreamReader
+            writer: Object with ``write(data)`` and optionally ``async drain()``,
+                e.g. asyncio.StreamWriter
+            passphrase: Password to use for encryption
+        """
+        async with self._semaphore:
+            sealer = await self._run(SegmentSealer, self.encryptor, passphrase)
+            await _write(writer, sealer.header)
+            async for index, data, final in _aiter_frames(reader, sealer.frames()):
+                await _write(writer, await self._run(sealer.seal, index, data, final))
+
+    async def decrypt_stream(self, reader, writer, passphrase: str) -> None:
+        """
+        Decrypt a segmented stream read from reader into writer.
+
+        Each segment is authenticated before it is written, but a failure
+        part-way leaves the earlier plaintext with the writer. A legacy
+        single-blob stream is read into memory and checked as a whole, as
+        SecureFileEncryptor.decrypt_stream does.
+
+        Raises:
+            ValueError: If password is incorrect or the stream is corrupted
+        """
+        enc = self.encryptor
+        async with self._semaphore:
+            header, raw = await _aread_frames(reader, SegmentOpener.header_frames(enc))
+            if header is None:
+                data = raw + await _aread_all(reader)
+                await _write(writer, await self._run(enc._decrypt_legacy_data, data,
+                                                     passphrase))
+                return
+            opener = await self._run(SegmentOpener, enc, header, passphrase)
+            async for index, data, final in _aiter_frames(reader, opener.frames()):
+                await _write(writer, await self._run(opener.open, index, data, final))
+
+def _close(file) -> None:
+    file.close()
+
+def _remove_if_exists(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+async def _write(writer, data: bytes) -> None:
+    writer.write(data)
+    drain = getattr(writer, 'drain', None)
+    if drain is not None:
+        await drain()
+
+async def _aread_full(reader, size: int) -> bytes:
+    """Read exactly size bytes unless EOF is reached first."""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        chunk = await reader.read(remaining)
+        if not chunk:
+            break
+        parts.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(parts)
+
+async def _aread_all(reader) -> bytes:
+    """Read until EOF."""
+    parts = []
+    while True:
+        chunk = await reader.read(SecureFileEncryptor.CHUNK_SIZE)
+        if not chunk:
+            return b''.join(parts)
+        parts.append(chunk)
+
+async def _aiter_frames(reader, frames: Generator) -> AsyncIterator[Tuple[int, bytes, bool]]:
+    """Async counterpart of file_encryptor._iter_frames."""
+    try:
+        request = next(frames)
+        while True:
+            if isinstance(request, int):
+                request = frames.send(await _aread_full(reader, request))
+            else:
+                yield request
+                request = next(frames)
+    except StopIteration:
+        return
+
+async def _aread_frames(reader, frames: Generator):
+    """Async counterpart of file_encryptor._read_frames."""
+    try:
+        request = next(frames)
+        while True:
+            request = frames.send(await _aread_full(reader, request))
+    except StopIteration as e:
+        return e.value
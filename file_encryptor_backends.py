@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# A cipher backend is an AES-256-GCM implementation with the AESGCM
+# interface: factory(key) returns an object with
+#   encrypt(nonce, data, aad) -> ciphertext || tag
+#   decrypt(nonce, data, aad) -> plaintext, raising InvalidTag
+# and optionally encrypt_into/decrypt_into(nonce, data, aad, out). The
+# algorithm fixes the wire format, so backends may only differ in speed:
+# before one is used it must reproduce a NIST vector and the reference
+# (cryptography's OpenSSL binding) byte for byte and reject tampering.
+#
+# A cipher may also offer segment_cipher(header, nonce_prefix, segment_size),
+# whose seal/open(first_index, data, last) handle a run of consecutive
+# segments of the container format in one call (seal_into/open_into write
+# into a caller-provided buffer); opening raises InvalidTag with the index
+# of the first segment that fails.
+OPERATIONS = ('encrypt', 'decrypt')
+REFERENCE = 'openssl'
+BACKEND_ENV = 'SOLACECRYPT_BACKEND'  # Force one backend for every operation
+# Timed as SecureFileEncryptor uses a cipher: a run of NATIVE_RUN_SIZE
+# (1 MiB) cut into segments, sealed into and opened from caller buffers
+BENCH_SIZE = 1024 * 1024
+BENCH_SEGMENT_SIZE = 64 * 1024
+BENCH_ROUNDS = 3
+
+# NIST GCM test case 16: AES-256, 60-byte plaintext, 20-byte AAD
+KAT_KEY = bytes.fromhex('feffe9928665731c6d6a8f9467308308feffe9928665731c6d6a8f9467308308')
+KAT_NONCE = bytes.fromhex('cafebabefacedbaddecaf888')
+KAT_AAD = bytes.fromhex('feedfacedeadbeeffeedfacedeadbeefabaddad2')
+KAT_PLAINTEXT = bytes.fromhex('d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d'
+                              '8a318a721c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657'
+                              'ba637b39')
+KAT_SEALED = bytes.fromhex('522dc1f099567d07f47f37a32a84427d643a8cdcbfe5c0c97598a2bd'
+                           '2555d1aa8cb08e48590dbb3da7b08b1056828838c5f61e6393ba7a0a'
+                           'bcc9f662' '76fc6ece0f4e1768cddf8853bb2d551b')
+
+CipherFactory = Callable[[bytes], object]
+
+class BackendStatus(NamedTuple):
+    """Outcome of probing one backend. Throughput is in MB/s (0 if unusable)."""
+    name: str
+    description: str
+    available: bool
+    reason: str
+    encrypt_mbps: float = 0.0
+    decrypt_mbps: float = 0.0
+
+class BackendRegistry:
+    """
+    AES-256-GCM implementations the core can seal and open segments with.
+
+    The first cipher request probes every registered backend: each is
+    loaded, self-tested and timed on a run of segments, and the fastest
+    correct one is chosen separately for encryption and decryption.
+    Setting SOLACECRYPT_BACKEND to a backend name forces that backend;
+    backends registered with automatic=False are only used that way.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Tuple[Callable[[], CipherFactory], str, bool]] = {}
+        self._factories: Dict[str, CipherFactory] = {}
+        self._status: Optional[List[BackendStatus]] = None
+        self._selected: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], CipherFactory],
+                 description: str = '', automatic: bool = True) -> None:
+        """
+        Add a backend (replacing one of the same name) and re-probe on next use.
+
+        Args:
+            name: Short name, as accepted by SOLACECRYPT_BACKEND
+            loader: Returns the cipher factory; raises ImportError, OSError or
+                AttributeError if the implementation is not installed or
+                cannot run on this machine
+            description: Shown in diagnostics
+            automatic: Whether the backend may be chosen by speed; if not,
+                it is only loaded when forced with SOLACECRYPT_BACKEND
+        """
+        with self._lock:
+            self._loaders[name] = (loader, description, automatic)
+            self._status = None
+
+    def probe(self) -> List[BackendStatus]:
+        """Probe the backends if that has not happened yet; return their status."""
+        with self._lock:
+            if self._status is None:
+                self._probe()
+            return list(self._status)
+
+    def selected(self) -> Dict[str, str]:
+        """Backend chosen for each operation."""
+        self.probe()
+        return dict(self._selected)
+
+    def cipher(self, key: bytes, operation: str):
+        """
+        Segment cipher for key from the backend chosen for operation.
+
+        Raises:
+            ValueError: If operation is unknown
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown cipher operation: {operation}")
+        self.probe()
+        return self._factories[self._selected[operation]](key)
+
+    def _probe(self) -> None:
+        forced = os.environ.get(BACKEND_ENV) or None
+        if forced is not None and forced not in self._loaders:
+            raise ValueError(f"Unknown cipher backend in {BACKEND_ENV}: {forced} "
+                             f"(known: {', '.join(self._loaders)})")
+        reference = self._loaders[REFERENCE][0]()
+        status, factories = [], {}
+        for name, (loader, description, automatic) in self._loaders.items():
+            if forced is not None and name not in (forced, REFERENCE):
+                status.append(BackendStatus(name, description, False,
+                                            f"skipped: {BACKEND_ENV}={forced}"))
+                continue
+            if forced is None and not automatic:
+                status.append(BackendStatus(name, description, False,
+                                            f"opt-in: set {BACKEND_ENV}={name}"))
+                continue
+            try:
+                factory = loader()
+            except (ImportError, OSError, AttributeError) as e:
+                status.append(BackendStatus(name, description, False, f"unavailable: {e}"))
+                continue
+            try:
+                _self_test(factory, reference)
+                encrypt_mbps, decrypt_mbps = _benchmark(factory)
+            except Exception as e:  # Native code may fail in any way; never use it then
+                status.append(BackendStatus(name, description, False, f"self-test failed: {e}"))
+                continue
+            factories[name] = factory
+            status.append(BackendStatus(name, description, True, 'ok',
+                                        encrypt_mbps, decrypt_mbps))
+        if forced is not None and forced not in factories:
+            reason = next(s.reason for s in status if s.name == forced)
+            raise ValueError(f"Cipher backend {forced} is unusable: {reason}")
+        if REFERENCE not in factories:
+            raise RuntimeError("The reference AES-GCM implementation failed its self-test")
+        usable = [s for s in status if s.available and (forced is None or s.name == forced)]
+        self._selected = {
+            'encrypt': max(usable, key=lambda s: s.encrypt_mbps).name,
+            'decrypt': max(usable, key=lambda s: s.decrypt_mbps).name,
+        }
+        self._factories = factories
+        self._status = status
+
+    def describe(self) -> str:
+        """Human-readable report of every backend and the current choice."""
+        lines = []
+        for s in self.probe():
+            if s.available:
+                detail = f"encrypt {s.encrypt_mbps:8.0f} MB/s, decrypt {s.decrypt_mbps:8.0f} MB/s"
+            else:
+                detail = s.reason
+            lines.append(f"  {s.name:<12} {detail}" + (f"  ({s.description})" if s.description else ''))
+        chosen = ', '.join(f"{op}: {name}" for op, name in self.selected().items())
+        return "Cipher backends:\n" + '\n'.join(lines) + f"\nSelected: {chosen}"
+
+def _self_test(factory: CipherFactory, reference: CipherFactory) -> None:
+    """
+    Check a backend against the NIST vector and the reference implementation.
+
+    Raises:
+        ValueError: If the backend disagrees with either or accepts a forgery
+    """
+    cipher = factory(KAT_KEY)
+    if bytes(cipher.encrypt(KAT_NONCE, KAT_PLAINTEXT, KAT_AAD)) != KAT_SEALED:
+        raise ValueError("wrong ciphertext for the NIST test vector")
+    if bytes(cipher.decrypt(KAT_NONCE, KAT_SEALED, KAT_AAD)) != KAT_PLAINTEXT:
+        raise ValueError("wrong plaintext for the NIST test vector")
+    # A full segment plus a ragged tail, so block and tail handling both run
+    key, nonce, aad = os.urandom(32), os.urandom(12), os.urandom(45)
+    data = os.urandom(BENCH_SIZE + 13)
+    expected = reference(key).encrypt(nonce, data, aad)
+    cipher = factory(key)
+    if bytes(cipher.encrypt(nonce, data, aad)) != expected:
+        raise ValueError("ciphertext differs from the reference")
+    if bytes(cipher.decrypt(nonce, expected, aad)) != data:
+        raise ValueError("plaintext differs from the reference")
+    if hasattr(cipher, 'encrypt_into'):
+        out = bytearray(len(expected))
+        cipher.encrypt_into(nonce, memoryview(data), aad, memoryview(out))
+        if out != expected:
+            raise ValueError("encrypt_into differs from the reference")
+    if hasattr(cipher, 'decrypt_into'):
+        out = bytearray(len(data))
+        cipher.decrypt_into(nonce, memoryview(expected), aad, memoryview(out))
+        if out != data:
+            raise ValueError("decrypt_into differs from the reference")
+    if hasattr(cipher, 'segment_cipher'):
+        _self_test_segments(cipher, reference(key), data)
+    forged = bytearray(expected)
+    forged[len(forged) // 2] ^= 1
+    for sealed, associated in ((bytes(forged), aad), (expected, aad + b'\x00')):
+        try:
+            cipher.decrypt(nonce, sealed, associated)
+        except InvalidTag:
+            continue
+        raise ValueError("accepted a forged segment")
+
+def _self_test_segments(cipher, reference, data: bytes) -> None:
+    """Check a native segment cipher against the container format, sealed one
+    segment at a time like SecureFileEncryptor._encrypt_segment does."""
+    header, prefix, size = os.urandom(40), os.urandom(7), 4096
+    segments = [data[start:start + size] for start in range(0, len(data), size)]
+    expected = b''.join(
+        reference.encrypt(prefix + struct.pack('>IB', index, last),
+                          segment, header + struct.pack('>QB', index, last))
+        for index, segment in enumerate(segments)
+        for last in [index == len(segments) - 1])
+    runs = cipher.segment_cipher(header, prefix, size)
+    # Two calls, so the starting index of the second run is exercised too
+    split = 7 * size
+    sealed = runs.seal(0, data[:split], False) + runs.seal(7, data[split:], True)
+    if sealed != expected:
+        raise ValueError("segment runs differ from the container format")
+    split = 7 * (size + 16)
+    if runs.open(0, expected[:split], False) + runs.open(7, expected[split:], True) != data:
+        raise ValueError("opened segment runs differ from the plaintext")
+    forged = bytearray(expected)
+    forged[split + 1] ^= 1
+    try:
+        runs.open(0, bytes(forged), True)
+    except InvalidTag as e:
+        if e.args != (7,):
+            raise ValueError(f"forged segment 7 reported as {e.args}") from None
+    else:
+        raise ValueError("accepted a forged segment run")
+
+def _segment_calls(cipher, header: bytes, prefix: bytes, segment_size: int
+                   ) -> Tuple[Callable[[memoryview, memoryview], None],
+                              Callable[[memoryview, memoryview], None]]:
+    """
+    seal(data, out) and open(sealed, out) for a whole file of segments,
+    calling cipher the way SecureFileEncryptor does: one segment run if it
+    has segment_cipher, otherwise one call per segment, into out if it can.
+    """
+    if hasattr(cipher, 'segment_cipher'):
+        runs = cipher.segment_cipher(header, prefix, segment_size)
+        return (lambda data, out: runs.seal_into(0, data, True, out),
+                lambda sealed, out: runs.open_into(0, sealed, True, out))
+
+    def pieces(length: int, piece: int, grown: int):
+        count = max(1, -(-length // piece))
+        for index in range(count):
+            last = index == count - 1
+            start = index * piece
+            size = min(piece, length - start)
+            yield (start, size, index * (piece + grown), size + grown,
+                   prefix + struct.pack('>IB', index, last),
+                   header + struct.pack('>QB', index, last))
+
+    def seal(data: memoryview, out: memoryview) -> None:
+        for start, size, out_start, out_size, nonce, aad in pieces(len(data), segment_size, 16):
+            with data[start:start + size] as src, out[out_start:out_start + out_size] as dst:
+                if hasattr(cipher, 'encrypt_into'):
+                    cipher.encrypt_into(nonce, src, aad, dst)
+                else:
+                    dst[:] = cipher.encrypt(nonce, src, aad)
+
+    def open_(sealed: memoryview, out: memoryview) -> None:
+        for start, size, out_start, out_size, nonce, aad in pieces(len(sealed),
+                                                                   segment_size + 16, -16):
+            with sealed[start:start + size] as src, out[out_start:out_start + out_size] as dst:
+                if hasattr(cipher, 'decrypt_into'):
+                    cipher.decrypt_into(nonce, src, aad, dst)
+                else:
+                    dst[:] = cipher.decrypt(nonce, src, aad)
+    return seal, open_
+
+def _benchmark(factory: CipherFactory) -> Tuple[float, float]:
+    """Best-of-BENCH_ROUNDS throughput in MB/s of sealing and opening BENCH_SIZE."""
+    cipher = factory(os.urandom(32))
+    seal, open_ = _segment_calls(cipher, os.urandom(40), os.urandom(7), BENCH_SEGMENT_SIZE)
+    count = -(-BENCH_SIZE // BENCH_SEGMENT_SIZE)
+    data, sealed, opened = (bytearray(os.urandom(BENCH_SIZE)), bytearray(BENCH_SIZE + count * 16),
+                            bytearray(BENCH_SIZE))
+    best_encrypt = best_decrypt = float('inf')
+    with memoryview(data) as plain, memoryview(sealed) as ciphertext, \
+            memoryview(opened) as out:
+        seal(plain, ciphertext)  # Also warms up lazy initialisation
+        for _ in range(BENCH_ROUNDS):
+            start = time.perf_counter()
+            seal(plain, ciphertext)
+            best_encrypt = min(best_encrypt, time.perf_counter() - start)
+            start = time.perf_counter()
+            open_(ciphertext, out)
+            best_decrypt = min(best_decrypt, time.perf_counter() - start)
+    if opened != data:
+        raise ValueError("benchmark run did not round-trip")
+    mb = BENCH_SIZE / (1024 * 1024)
+    return mb / max(best_encrypt, 1e-9), mb / max(best_decrypt, 1e-9)
+
+class _PyCryptodomeGCM:
+    """AESGCM interface over PyCryptodome's one-shot GCM objects."""
+
+    def __init__(self, aes, key: bytes):
+        self._aes = aes
+        # Our own copy, so it can be zeroed when the cipher goes away
+        self._key = bytearray(key)
+
+    def __del__(self):
+        self._key[:] = bytes(len(self._key))
+
+    def _new(self, nonce: bytes, aad: Optional[bytes]):
+        cipher = self._aes.new(self._key, self._aes.MODE_GCM, nonce=nonce, mac_len=16)
+        if aad:
+            cipher.update(aad)
+        return cipher
+
+    def encrypt(self, nonce: bytes, data: bytes, aad: Optional[bytes]) -> bytes:
+        ciphertext, tag = self._new(nonce, aad).encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def decrypt(self, nonce: bytes, data: bytes, aad: Optional[bytes]) -> bytes:
+        if len(data) < 16:
+            raise InvalidTag()
+        # Release the slices even on failure: data may be a view of a mapping
+        with memoryview(data) as view, view[:-16] as body, view[-16:] as tag:
+            try:
+                return self._new(nonce, aad).decrypt_and_verify(body, tag)
+            except ValueError:
+                raise InvalidTag() from None
+
+def _load_pycryptodome() -> CipherFactory:
+    try:
+        from Cryptodome.Cipher import AES
+    except ImportError:
+        from Crypto.Cipher import AES
+    AES.MODE_GCM  # PyCrypto, which Crypto may also be, has no GCM
+    return lambda key: _PyCryptodomeGCM(AES, key)
+
+class _NativeGCM:
+    """Maps a native extension's authentication errors to InvalidTag."""
+
+    def __init__(self, cipher, auth_error: type):
+        self._cipher = cipher
+        self._auth_error = auth_error
+        if hasattr(cipher, 'encrypt_into'):
+            self.encrypt_into = cipher.encrypt_into
+        if hasattr(cipher, 'decrypt_into'):
+            self.decrypt_into = self._decrypt_into
+        if hasattr(cipher, 'segment_cipher'):
+            self.segment_cipher = self._segment_cipher
+
+    def encrypt(self, nonce: bytes, data: bytes, aad: Optional[bytes]) -> bytes:
+        return self._cipher.encrypt(nonce, data, aad)
+
+    def decrypt(self, nonce: bytes, data: bytes, aad: Optional[bytes]) -> bytes:
+        try:
+            return self._cipher.decrypt(nonce, data, aad)
+        except self._auth_error:
+            raise InvalidTag() from None
+
+    def _decrypt_into(self, nonce: bytes, data, aad: Optional[bytes], out) -> None:
+        try:
+            self._cipher.decrypt_into(nonce, data, aad, out)
+        except self._auth_error:
+            raise InvalidTag() from None
+
+    def _segment_cipher(self, header: bytes, nonce_prefix: bytes,
+                        segment_size: int) -> '_NativeSegments':
+        return _NativeSegments(self._cipher.segment_cipher(header, nonce_prefix, segment_size),
+                               self._auth_error)
+
+class _NativeSegments:
+    """Segment runs of a native extension; failures name the segment."""
+
+    def __init__(self, runs, auth_error: type):
+        self._runs = runs
+        self._auth_error = auth_error
+        self.seal = runs.seal
+        self.seal_into = runs.seal_into
+
+    def open(self, first_index: int, data: bytes, last: bool) -> bytes:
+        try:
+            return self._runs.open(first_index, data, last)
+        except self._auth_error as e:
+            raise InvalidTag(*e.args) from None
+
+    def open_into(self, first_index: int, data, last: bool, out) -> None:
+        try:
+            self._runs.open_into(first_index, data, last, out)
+        except self._auth_error as e:
+            raise InvalidTag(*e.args) from None
+
+def _load_accel() -> CipherFactory:
+    # src/hardware/acceleration.cpp, built with `pip install ./src/hardware`
+    import solace_accel
+    if not solace_accel.hardware_aes():
+        # OpenSSL would fall back to its table-based AES, which the
+        # reference already offers
+        raise OSError("this CPU has no AES and carry-less multiply instructions")
+    aead, auth_error = solace_accel.Aes256Gcm, solace_accel.AuthenticationError
+    return lambda key: _NativeGCM(aead(key), auth_error)
+
+registry = BackendRegistry()
+registry.register(REFERENCE, lambda: AESGCM, 'cryptography / OpenSSL')
+registry.register('accel', _load_accel, 'solace_accel: OpenSSL EVP, multi-buffer')
+registry.register('pycryptodome', _load_pycryptodome, 'PyCryptodome')
+
+def register_backend(name: str, loader: Callable[[], CipherFactory],
+                     description: str = '', automatic: bool = True) -> None:
+    """Add a cipher backend to the shared registry (see BackendRegistry.register)."""
+    registry.register(name, loader, description, automatic)
+
+def segment_cipher(key: bytes, operation: str):
+    """Segment cipher for key from the backend chosen for operation."""
+    return registry.cipher(key, operation)
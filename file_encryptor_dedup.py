@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+from file_encryptor import (SecureFileEncryptor, DerivedKeyCache, KDFParams,
+                            _atomic_output, _derive_into, _read_full)
+from file_encryptor_backends import segment_cipher
+
+# Lives inside the folder FileManager keeps encrypted output in
+DEFAULT_STORE = Path.home() / 'Encrypted' / '.store'
+
+MANIFEST_MAGIC = b'SLCDEDUP'
+STORE_VERSION = 1
+NONCE_SIZE = 12
+STORE_ID_SIZE = 16
+
+class StoreKeys(NamedTuple):
+    """Keys of an unlocked store, all HKDF subkeys of the passphrase key."""
+    chunk_id: bytearray
+    chunk: bytearray
+    manifest: bytearray
+    boundary: bytearray
+
+class DedupStats(NamedTuple):
+    """Outcome of ChunkStore.store_file."""
+    size: int
+    chunks: int
+    new_chunks: int
+    new_bytes: int
+
+class ChunkStore:
+    """
+    Deduplicating store of encrypted, content-defined chunks.
+
+    Files are cut into variable-size chunks where a rolling hash of the
+    content hits a boundary pattern, so an insertion or deletion only
+    changes the chunks around it. Each chunk is identified by a keyed hash
+    (HMAC-SHA256) of its plaintext and encrypted once with AES-256-GCM,
+    bound to its ID; a file becomes an encrypted manifest listing its chunk
+    IDs. Storing a near-identical file again writes only the chunks that
+    differ.
+
+    Boundaries come from FastCDC: a gear rolling hash
+    h = (h << 1) + gear[byte] mod 2**32, cut where its top bits are zero,
+    with a stricter mask before the average size and a looser one after it
+    to keep chunk sizes close to the average. The first MIN_CHUNK bytes of
+    each chunk are skipped rather than hashed. The gear table is keyed, so
+    chunk boundaries, like chunk IDs, reveal nothing about the content to
+    someone without the passphrase. The hash runs in solace_accel
+    (src/hardware) when it is installed; the pure-Python fallback cuts the
+    same chunks but is far slower than encryption
+    (`python -m solacecrypt.bench --ops dedup` compares them).
+
+    Layout under root:
+        store.json        KDF, salt, chunking parameters and a key check
+        chunks/ab/abcd..  nonce | AES-GCM(chunk), named by hex chunk ID
+    """
+
+    MIN_CHUNK = 64 * 1024
+    AVG_CHUNK = 256 * 1024
+    MAX_CHUNK = 1024 * 1024
+    READ_SIZE = 4 * MAX_CHUNK
+
+    def __init__(self, root: Optional[Path] = None,
+                 encryptor: Optional[SecureFileEncryptor] = None):
+        """
+        Args:
+            root: Store directory (default: DEFAULT_STORE); created with its
+                configuration on first use
+            encryptor: Supplies the KDF for a new store (default: a
+                SecureFileEncryptor with a derived-key cache, so repeated
+                operations run the KDF once)
+        """
+        self.root = Path(root) if root else DEFAULT_STORE
+        self.encryptor = encryptor or SecureFileEncryptor(key_cache=DerivedKeyCache())
+        self._config_lock = threading.Lock()
+        self._config = None
+
+    def _load_config(self) -> dict:
+        """Read store.json, creating the store if it does not exist yet."""
+        with self._config_lock:
+            if self._config is not None:
+                return self._config
+            path = self.root / 'store.json'
+            if path.exists():
+                config = json.loads(path.read_text())
+                if config.get('version') != STORE_VERSION:
+                    raise ValueError(f"Unsupported chunk store version: {config.get('version')}")
+            else:
+                config = {
+                    'version': STORE_VERSION,
+                    'id': secrets.token_hex(STORE_ID_SIZE),
+                    'salt': secrets.token_hex(self.encryptor.SALT_SIZE),
+                    'kdf': list(self.encryptor.kdf),
+                    'chunking': [self.MIN_CHUNK, self.AVG_CHUNK, self.MAX_CHUNK],
+                    'check': None,
+                }
+                (self.root / 'chunks').mkdir(parents=True, exist_ok=True)
+            self._config = config
+            return config
+
+    def _keys(self, passphrase: str) -> StoreKeys:
+        """
+        Derive the store keys, recording a key check on first use. The
+        caller wipes them; _unlocked does that for a with block.
+
+        Raises:
+            ValueError: If the passphrase does not match the store
+        """
+        config = self._load_config()
+        params = KDFParams(*config['kdf'])
+        self.encryptor._check_kdf(params)
+        master = self.encryptor._derive_key(passphrase, bytes.fromhex(config['salt']), params)
+
+        def subkey(info: bytes) -> bytearray:
+            return _derive_into(HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                                     info=b'SolaceCrypt dedup ' + info), master)
+
+        try:
+            check_key = subkey(b'key check')
+            check = check_key.hex()
+            self.encryptor._secure_wipe(check_key)
+            with self._config_lock:
+                if config['check'] is None:
+                    config['check'] = check
+                    with _atomic_output(str(self.root / 'store.json')) as partial:
+                        Path(partial).write_text(json.dumps(config))
+                elif not hmac.compare_digest(config['check'], check):
+                    raise ValueError("Decryption failed: Wrong password")
+            return StoreKeys(subkey(b'chunk id'), subkey(b'chunk key'),
+                             subkey(b'manifest key'), subkey(b'boundary'))
+        finally:
+            self.encryptor._secure_wipe(master)
+
+    @contextmanager
+    def _unlocked(self, passphrase: str) -> Iterator[StoreKeys]:
+        """The store keys for the duration of a with block, zeroed afterwards."""
+        keys = self._keys(passphrase)
+        try:
+            yield keys
+        finally:
+            self.encryptor._secure_wipe(*keys)
+
+    def _chunk_path(self, chunk_id: str) -> Path:
+        return self.root / 'chunks' / chunk_id[:2] / chunk_id
+
+    def store_file(self, input_path: str, manifest_path: str,
+                   passphrase: str) -> DedupStats:
+        """
+        Chunk a file into the store and write its manifest to manifest_path.
+
+        Returns:
+            Sizes and how many chunks (and bytes) were actually new
+        """
+        with self._unlocked(passphrase) as keys:
+            aesgcm = segment_cipher(keys.chunk, 'encrypt')
+            chunks = []
+            size = new_chunks = new_bytes = 0
+            with open(input_path, 'rb') as in_file:
+                st = os.fstat(in_file.fileno())
+                for data in self._iter_chunks(in_file, keys):
+                    chunk_id = hmac.new(keys.chunk_id, data, hashlib.sha256).hexdigest()
+                    if self._put_chunk(aesgcm, chunk_id, data):
+                        new_chunks += 1
+                        new_bytes += len(data)
+                    chunks.append([chunk_id, len(data)])
+                    size += len(data)
+
+            manifest = {'version': STORE_VERSION, 'size': size, 'mode': st.st_mode & 0o7777,
+                        'mtime_ns': st.st_mtime_ns, 'chunks': chunks}
+            store_id = bytes.fromhex(self._config['id'])
+            nonce = secrets.token_bytes(NONCE_SIZE)
+            sealed = AESGCM(keys.manifest).encrypt(nonce, json.dumps(manifest).encode(),
+                                                   MANIFEST_MAGIC + store_id)
+        with _atomic_output(manifest_path) as partial, open(partial, 'wb') as out_file:
+            out_file.write(MANIFEST_MAGIC + store_id + nonce + sealed)
+        return DedupStats(size, len(chunks), new_chunks, new_bytes)
+
+    def _put_chunk(self, aesgcm: AESGCM, chunk_id: str, data: bytes) -> bool:
+        """Encrypt and write a chunk unless the store has it. True if written."""
+        path = self._chunk_path(chunk_id)
+        if path.exists():
+            return False
+        path.parent.mkdir(exist_ok=True)
+        nonce = secrets.token_bytes(NONCE_SIZE)
+        sealed = aesgcm.encrypt(nonce, data, chunk_id.encode())
+        # Concurrent writers of one chunk each get their own temporary file
+        with _atomic_output(str(path)) as partial, open(partial, 'wb') as out_file:
+            out_file.write(nonce + sealed)
+        return True
+
+    def read_manifest(self, manifest_path: str, passphrase: str) -> dict:
+        """
+        Decrypt a manifest.
+
+        Raises:
+            ValueError: If the file is not a manifest of this store, or the
+                passphrase is wrong
+        """
+        with self._unlocked(passphrase) as keys:
+            return self._open_manifest(manifest_path, keys)
+
+    def _open_manifest(self, manifest_path: str, keys: StoreKeys) -> dict:
+        with open(manifest_path, 'rb') as f:
+            raw = f.read()
+        header_size = len(MANIFEST_MAGIC) + STORE_ID_SIZE
+        if not raw.startswith(MANIFEST_MAGIC) or len(raw) < header_size + NONCE_SIZE:
+            raise ValueError("Not a chunk store manifest")
+        if raw[len(MANIFEST_MAGIC):header_size].hex() != self._config['id']:
+            raise ValueError("Manifest belongs to a different chunk store")
+        nonce = raw[header_size:header_size + NONCE_SIZE]
+        try:
+            plain = AESGCM(keys.manifest).decrypt(nonce, raw[header_size + NONCE_SIZE:],
+                                                  raw[:header_size])
+        except InvalidTag:
+            raise ValueError("Invalid manifest: authentication failed") from None
+        return json.loads(plain)
+
+    def restore_file(self, manifest_path: str, output_path: str, passphrase: str) -> int:
+        """
+        Rebuild a file from its manifest, restoring permission bits and mtime.
+
+        Returns:
+            Bytes written
+
+        Raises:
+            ValueError: If the passphrase is wrong, or a chunk is missing or
+                corrupted
+        """
+        with self._unlocked(passphrase) as keys:
+            manifest = self._open_manifest(manifest_path, keys)
+            aesgcm = segment_cipher(keys.chunk, 'decrypt')
+        with _atomic_output(output_path) as partial:
+            with open(partial, 'wb') as out_file:
+                for chunk_id, length in manifest['chunks']:
+                    data = self._get_chunk(aesgcm, chunk_id)
+                    if len(data) != length:
+                        raise ValueError(f"Chunk {chunk_id} has the wrong length")
+                    out_file.write(data)
+            os.chmod(partial, manifest['mode'] & 0o777)
+            os.utime(partial, ns=(manifest['mtime_ns'], manifest['mtime_ns']))
+        return manifest['size']
+
+    def _get_chunk(self, aesgcm: AESGCM, chunk_id: str) -> bytes:
+        try:
+            with open(self._chunk_path(chunk_id), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Chunk store is missing chunk {chunk_id}") from None
+        try:
+            return aesgcm.decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], chunk_id.encode())
+        except InvalidTag:
+            raise ValueError(f"Chunk {chunk_id} is corrupted") from None
+
+    def _iter_chunks(self, stream: BinaryIO, keys: StoreKeys) -> Iterator[bytes]:
+        """Cut a stream into content-defined chunks."""
+        min_size, avg_size, max_size = self._config['chunking']
+        gear = _gear_table(keys.boundary)
+        find_boundary = boundary_finder()
+        bits = avg_size.bit_length() - 1
+        strict, loose = _top_bits(bits + 2), _top_bits(bits - 2)
+        
+        data = b''
+        pos = 0
+        eof = False
+        while True:
+            if not eof and len(data) - pos < max_size:
+                block = _read_full(stream, self.READ_SIZE)
+                eof = len(block) < self.READ_SIZE
+                data = data[pos:] + block
+                pos = 0
+            if pos >= len(data):
+                return
+            with memoryview(data) as view:
+                cut = find_boundary(view, pos, min(len(data), pos + max_size),
+                                     min_size, avg_size, gear, strict, loose)
+            yield data[pos:cut]
+            pos = cut
+
+GEAR_WINDOW = 32  # Bytes a 32-bit gear hash depends on
+
+def _gear_table(key: bytes) -> List[int]:
+    """Keyed pseudo-random 32-bit value for every byte value."""
+    return [int.from_bytes(hmac.new(key, bytes([value]), hashlib.sha256).digest()[:4], 'big')
+            for value in range(256)]
+
+def _top_bits(count: int) -> int:
+    """Mask of the highest count bits of a 32-bit hash."""
+    return ((1 << count) - 1) << (32 - count)
+
+def _find_boundary(view: memoryview, start: int, end: int, min_size: int, avg_size: int,
+                   gear: List[int], strict: int, loose: int) -> int:
+    """Offset at which the chunk beginning at start ends (at most end)."""
+    if end - start <= min_size:
+        return end
+    h = 0
+    # Only the last GEAR_WINDOW bytes affect the hash, so warm it up just
+    # before the minimum size instead of hashing the whole prefix
+    position = start + min_size
+    for byte in view[position - GEAR_WINDOW:position]:
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+    norm = min(end, start + avg_size)
+    for byte in view[position:norm]:
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        position += 1
+        if not h & strict:
+            return position
+    for byte in view[position:end]:
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        position += 1
+        if not h & loose:
+            return position
+    return end
+
+def boundary_finder() -> Callable[..., int]:
+    """solace_accel's native find_boundary if installed, else _find_boundary."""
+    try:
+        from solace_accel import find_boundary
+    except ImportError:
+        return _find_boundary
+    return find_boundary
+
+def is_manifest(path: str) -> bool:
+    """Whether path starts like a chunk store manifest."""
+    with open(path, 'rb') as f:
+        return f.read(len(MANIFEST_MAGIC)) == MANIFEST_MAGIC
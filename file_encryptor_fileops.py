@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import errno
+import os
+import stat
+from typing import Callable, List, Optional, Tuple
+
+from file_encryptor import CancellationToken, _atomic_output
+
+# Copies are handed to the kernel. Replaces FileHandler.fastCopy
+# (src/fileops/filehandler.nim), which pushed every byte through a 64 KiB
+# user-space buffer. Methods are tried in order and each one continues from
+# wherever the previous gave up:
+#   reflink          FICLONE: btrfs and xfs share the source's extents, so
+#                    nothing is read or written until one copy changes
+#   copy_file_range  in-kernel copy; NFS and SMB copy on the server
+#   sendfile         page cache to file without a user-space buffer
+#   read/write       anywhere else
+# A move within one filesystem is a rename and copies nothing.
+FICLONE = 0x40049409  # _IOW(0x94, 9, int), linux/fs.h
+COPY_CHUNK = 64 * 1024 * 1024  # Per kernel call; cancellation is checked between them
+BUFFER_SIZE = 1024 * 1024  # For the read/write fallback
+
+# The kernel or filesystem does not offer this method for these files
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTTY, errno.EBADF, errno.EPERM}
+
+def _reflink(src: int, dst: int, offset: int, size: int,
+             cancel: Optional[CancellationToken]) -> int:
+    """Share the source's extents; all or nothing, so only tried from offset 0."""
+    if offset or not size:
+        return offset
+    import fcntl
+    try:
+        fcntl.ioctl(dst, FICLONE, src)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return offset
+        raise
+    return size
+
+def _copy_range(src: int, dst: int, offset: int, size: int,
+                cancel: Optional[CancellationToken]) -> int:
+    """Copy with copy_file_range(2) until done or the kernel refuses."""
+    if not hasattr(os, 'copy_file_range'):
+        return offset
+    while offset < size:
+        if cancel:
+            cancel.check()
+        try:
+            copied = os.copy_file_range(src, dst, min(COPY_CHUNK, size - offset),
+                                        offset, offset)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                return offset
+            raise
+        if not copied:
+            break  # Pseudo files report a size but copy nothing
+        offset += copied
+    return offset
+
+def _sendfile(src: int, dst: int, offset: int, size: int,
+              cancel: Optional[CancellationToken]) -> int:
+    """Copy with sendfile(2), which writes at the destination's file position."""
+    if not hasattr(os, 'sendfile'):
+        return offset
+    os.lseek(dst, offset, os.SEEK_SET)
+    while offset < size:
+        if cancel:
+            cancel.check()
+        try:
+            sent = os.sendfile(dst, src, offset, min(COPY_CHUNK, size - offset))
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                return offset
+            raise
+        if not sent:
+            break
+        offset += sent
+    return offset
+
+def _read_write(src: int, dst: int, offset: int, size: int,
+                cancel: Optional[CancellationToken]) -> int:
+    """Plain copy through one reused buffer, reading to EOF whatever size says."""
+    buffer = bytearray(BUFFER_SIZE)
+    os.lseek(src, offset, os.SEEK_SET)
+    os.lseek(dst, offset, os.SEEK_SET)
+    with memoryview(buffer) as view:
+        while True:
+            if cancel:
+                cancel.check()
+            count = os.readv(src, [view])
+            if not count:
+                return offset
+            with view[:count] as chunk:
+                written = 0
+                while written < count:
+                    with chunk[written:] as rest:
+                        written += os.write(dst, rest)
+            offset += count
+
+COPY_METHODS: List[Tuple[str, Callable[..., int]]] = [
+    ('reflink', _reflink),
+    ('copy_file_range', _copy_range),
+    ('sendfile', _sendfile),
+    ('read/write', _read_write),
+]
+
+def _copy_fd(src: int, dst: int, size: int,
+             cancel: Optional[CancellationToken]) -> str:
+    """Copy size bytes between descriptors; the name of the method that finished."""
+    offset = 0
+    for name, method in COPY_METHODS:
+        offset = method(src, dst, offset, size, cancel)
+        if size and offset >= size:
+            return name
+    return name  # The read/write loop always runs to EOF
+
+def copy_file(source: str, dest: str,
+              cancel: Optional[CancellationToken] = None) -> str:
+    """
+    Copy source to dest, keeping its permission bits and timestamps.
+
+    dest is written under a temporary name and only appears once complete.
+    A cancelled copy raises OperationCancelled and leaves no output.
+
+    Returns:
+        Name of the method that copied the data, e.g. 'reflink'
+    """
+    with open(source, 'rb') as src:
+        st = os.fstat(src.fileno())
+        with _atomic_output(dest) as partial:
+            with open(partial, 'wb') as dst:
+                method = _copy_fd(src.fileno(), dst.fileno(), st.st_size, cancel)
+                os.fchmod(dst.fileno(), stat.S_IMODE(st.st_mode))
+                os.fsync(dst.fileno())
+            os.utime(partial, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return method
+
+def same_filesystem(path: str, other: str) -> bool:
+    """True if both paths (or, for one not yet created, its directory) are on one device."""
+    def device(p: str) -> int:
+        p = os.path.abspath(p)
+        while not os.path.exists(p):
+            p = os.path.dirname(p)
+        return os.stat(p).st_dev
+    return device(path) == device(other)
+
+def move_file(source: str, dest: str,
+              cancel: Optional[CancellationToken] = None) -> str:
+    """
+    Move source to dest, replacing dest if it exists.
+
+    On one filesystem this is a rename: no data is copied, however large
+    the file. Otherwise the data is copied as by copy_file and the source
+    is removed once the copy is complete.
+
+    Returns:
+        'rename', or the copy method used
+    """
+    if same_filesystem(source, dest):
+        try:
+            os.replace(source, dest)
+            return 'rename'
+        except OSError as e:
+            # Two mounts of one filesystem share a device but refuse renames
+            if e.errno != errno.EXDEV:
+                raise
+    method = copy_file(source, dest, cancel)
+    os.remove(source)
+    return method
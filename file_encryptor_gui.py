@@ -2,16 +2,21 @@
 
 import sys
 import os
+import time
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator, List, Tuple
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLineEdit, QLabel, 
                             QFileDialog, QProgressBar, QMessageBox, QStyle,
                             QStatusBar, QMenuBar, QMenu, QCheckBox, QDialog,
-                            QTabWidget, QGroupBox, QDialogButtonBox, QComboBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                            QTabWidget, QGroupBox, QDialogButtonBox, QComboBox,
+                            QTableWidget, QTableWidgetItem, QHeaderView,
+                            QAbstractItemView)
+from PyQt6.QtCore import Qt, QObject, QThreadPool, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon, QPalette, QColor, QAction
-from file_encryptor import SecureFileEncryptor
+from file_encryptor import (SecureFileEncryptor, ContentIndex, CancellationToken,
+                            OperationCancelled, load_kdf_params, _default_output_path,
+                            _walk_files)
 import json
 import gettext
 import subprocess
@@ -73,43 +78,479 @@ class ThemeManager:
         'High': 0.8
     }
 
-class EncryptionThread(QThread):
-    """Background thread for encryption/decryption operations."""
+class Job(QObject):
+    """
+    One operation in the JobQueue.
+    
+    run() executes on a pool thread; the signals are delivered to the GUI
+    thread. A job is never killed: cancel() and pause() go through a
+    CancellationToken that the encryptor checks between segments, so a
+    cancelled job removes its partial output and a paused one holds its
+    place until resumed.
+    """
     progress = pyqtSignal(int)
+    status = pyqtSignal(str)
     finished = pyqtSignal(bool, str)
     
-    def __init__(self, mode: str, input_path: str, output_path: str, 
-                 passphrase: str, delete_original: bool):
+    PENDING = 'Queued'
+    RUNNING = 'Running'
+    DONE = 'Done'
+    FAILED = 'Failed'
+    CANCELLED = 'Cancelled'
+    
+    def __init__(self, description: str, target: str):
         super().__init__()
+        self.description = description
+        self.target = target  # Output path, used to refuse clashing jobs
+        self.state = self.PENDING
+        self.message = ''
+        self.token = CancellationToken()
+        self.bytes_done = 0  # Input processed so far, for aggregate throughput
+        
+    @property
+    def active(self) -> bool:
+        return self.state in (self.PENDING, self.RUNNING)
+        
+    @property
+    def paused(self) -> bool:
+        return self.token.paused
+        
+    def cancel(self):
+        """Stop the job before its next segment."""
+        self.token.cancel()
+        
+    def pause(self):
+        """Hold the job before its next segment."""
+        self.token.pause()
+        
+    def resume(self):
+        self.token.resume()
+        
+    def reset(self):
+        """Make a finished job runnable again (for retry)."""
+        self.state = self.PENDING
+        self.message = ''
+        self.token = CancellationToken()
+        self.bytes_done = 0
+        
+    def run(self):
+        try:
+            self.token.check()
+            self.state = self.RUNNING
+            self.status.emit(self.RUNNING)
+            message = self.execute()
+            self.state, self.message = self.DONE, message
+        except OperationCancelled:
+            self.state, self.message = self.CANCELLED, "Operation cancelled."
+        except Exception as e:
+            self.state, self.message = self.FAILED, str(e)
+        self.finished.emit(self.state == self.DONE, self.message)
+        
+    def execute(self) -> str:
+        """Do the work and return the success message."""
+        raise NotImplementedError
+        
+    def report_progress(self, info):
+        """Forward encryptor progress (already rate-limited) to the GUI thread."""
+        self.bytes_done = info.bytes_done
+        if info.percent is not None:
+            self.progress.emit(info.percent)
+        message = f"{info.bytes_per_second / (1024 * 1024):.1f} MB/s"
+        if info.eta_seconds is not None:
+            message += f", {int(info.eta_seconds)}s remaining"
+        self.status.emit(message)
+
+class EncryptionJob(Job):
+    """Encrypt or decrypt one file."""
+    
+    def __init__(self, mode: str, input_path: str, output_path: str, 
+                 passphrase: str, delete_original: bool,
+                 index: Optional[ContentIndex] = None):
+        super().__init__(Path(input_path).name, output_path)
         self.mode = mode
         self.input_path = input_path
         self.output_path = output_path
         self.passphrase = passphrase
         self.delete_original = delete_original
-        
-    def run(self):
-        try:
-            # Check if input file exists and is readable
-            if not os.path.exists(self.input_path):
-                raise FileNotFoundError(f"Input file not found: {self.input_path}")
-            if not os.access(self.input_path, os.R_OK):
-                raise PermissionError(f"Cannot read input file: {self.input_path}")
-                
-            # Check if output directory is writable
-            output_dir = os.path.dirname(self.output_path) or '.'
-            if not os.access(output_dir, os.W_OK):
-                raise PermissionError(f"Cannot write to output directory: {output_dir}")
+        self.index = index
+        
+    def execute(self) -> str:
+        # Check if input file exists and is readable
+        if not os.path.exists(self.input_path):
+            raise FileNotFoundError(f"Input file not found: {self.input_path}")
+        if not os.access(self.input_path, os.R_OK):
+            raise PermissionError(f"Cannot read input file: {self.input_path}")
             
-            encryptor = SecureFileEncryptor()
-            if self.mode == 'encrypt':
-                encryptor.encrypt_file(self.input_path, self.output_path, 
-                                     self.passphrase, self.delete_original)
-            else:
-                encryptor.decrypt_file(self.input_path, self.output_path, 
-                                     self.passphrase)
-            self.finished.emit(True, "Operation completed successfully!")
-        except Exception as e:
-            self.finished.emit(False, str(e))
+        # Check if output directory is writable
+        output_dir = os.path.dirname(self.output_path) or '.'
+        if not os.access(output_dir, os.W_OK):
+            raise PermissionError(f"Cannot write to output directory: {output_dir}")
+        
+        # New files use the KDF tuned by `file_encryptor.py --calibrate`
+        encryptor = SecureFileEncryptor(kdf=load_kdf_params())
+        if self.mode == 'encrypt':
+            snapshot = None
+            if self.index is not None:
+                if self.index.is_unchanged(self.input_path, self.output_path):
+                    return "File is unchanged since it was last encrypted."
+                snapshot = self.index.snapshot(self.input_path)
+            encryptor.encrypt_file(self.input_path, self.output_path, 
+                                 self.passphrase, self.delete_original,
+                                 progress=self.report_progress, cancel=self.token,
+                                 source_digest=snapshot.digest if snapshot else None)
+            if snapshot is not None:
+                self.index.update(self.input_path, self.output_path, snapshot)
+        else:
+            encryptor.decrypt_file(self.input_path, self.output_path, 
+                                 self.passphrase, progress=self.report_progress,
+                                 cancel=self.token)
+        return "Operation completed successfully!"
+
+class FolderJob(Job):
+    """
+    Encrypt or decrypt every file below a folder, several files at a time.
+    
+    The tree is walked lazily on the job's own pool thread as the batch
+    needs more files, so a huge folder neither blocks the GUI nor has to be
+    listed before the first file starts. Outputs mirror the tree under
+    output_dir, or sit next to their inputs if it is None.
+    """
+    
+    MAX_FILES = 4  # Files processed concurrently
+    STATUS_INTERVAL = 0.25  # Minimum seconds between status updates
+    
+    def __init__(self, mode: str, root: str, output_dir: Optional[str],
+                 passphrase: str, delete_original: bool,
+                 index: Optional[ContentIndex] = None):
+        root = os.path.normpath(root)
+        self.target_root = (os.path.join(output_dir, os.path.basename(root))
+                            if output_dir else None)
+        super().__init__(os.path.basename(root) + os.sep, self.target_root or root)
+        self.mode = mode
+        self.root = root
+        self.passphrase = passphrase
+        self.delete_original = delete_original
+        self.index = index
+        self.files_found = 0
+        self.scan_complete = False
+        
+    def iter_jobs(self) -> Iterator[Tuple[str, str]]:
+        """(input, output) pairs for the files below root, only *.enc when decrypting."""
+        self.files_found = 0
+        self.scan_complete = False
+        for path in _walk_files(self.root, self.target_root):
+            if path.endswith('.enc') != (self.mode == 'decrypt'):
+                continue
+            output_path = _default_output_path(path, self.mode == 'encrypt')
+            if self.target_root:
+                output_path = os.path.join(self.target_root,
+                                           os.path.relpath(output_path, self.root))
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            self.files_found += 1
+            yield path, output_path
+        self.scan_complete = True
+        
+    def execute(self) -> str:
+        if not os.path.isdir(self.root):
+            raise FileNotFoundError(f"Folder not found: {self.root}")
+        # As in CLI batch mode: parallelism comes from the files, and one
+        # master key with per-file subkeys pays for the KDF once
+        encryptor = SecureFileEncryptor(workers=1, batch=True, kdf=load_kdf_params())
+        index = self.index if self.mode == 'encrypt' else None
+        done = unchanged = 0
+        errors = []
+        start = last_status = time.monotonic()
+        for result in encryptor.process_batch(self.mode, self.iter_jobs(), self.passphrase,
+                                              self.delete_original, self.MAX_FILES,
+                                              index=index, cancel=self.token):
+            if result.skipped:
+                unchanged += 1
+            elif result.ok:
+                done += 1
+                self.bytes_done += result.size
+            elif not self.token.cancelled:
+                errors.append(f"{result.input_path}: {result.error}")
+            now = time.monotonic()
+            if now - last_status >= self.STATUS_INTERVAL:
+                last_status = now
+                finished = done + unchanged + len(errors)
+                if self.scan_complete and self.files_found:
+                    self.progress.emit(finished * 100 // self.files_found)
+                self.status.emit(f"{finished}/{self.files_found}"
+                                 f"{'' if self.scan_complete else '+'} files, "
+                                 f"{self.bytes_done / (now - start) / (1024 * 1024):.1f} MB/s")
+        self.token.check()
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {self.files_found} files failed; "
+                               f"first: {errors[0]}")
+        message = f"Processed {done} files ({self.bytes_done / (1024 * 1024):.1f} MB)"
+        if unchanged:
+            message += f", {unchanged} unchanged"
+        return message
+
+class ArchiveJob(Job):
+    """Pack a folder into an archive or unpack one."""
+    
+    def __init__(self, mode: str, archive_path: str, folder: str, passphrase: str):
+        super().__init__(Path(archive_path if mode == 'extract' else folder).name,
+                         archive_path if mode == 'create' else folder)
+        self.mode = mode
+        self.archive_path = archive_path
+        self.folder = folder
+        self.passphrase = passphrase
+        
+    def execute(self) -> str:
+        from file_encryptor_archive import EncryptedArchive, create_archive, tree_sources
+        encryptor = SecureFileEncryptor(kdf=load_kdf_params())
+        if self.mode == 'create':
+            members = create_archive(encryptor, self.archive_path,
+                                     tree_sources(self.folder), self.passphrase,
+                                     progress=self.report_progress, cancel=self.token)
+            return f"Archived {len(members)} files to {self.archive_path}"
+        with EncryptedArchive(self.archive_path, self.passphrase, encryptor) as archive:
+            members = archive.members
+            for done, member in enumerate(members, 1):
+                self.token.check()
+                archive.extract(member.name, self.folder)
+                self.progress.emit(done * 100 // len(members))
+        return f"Extracted {len(members)} files to {self.folder}"
+    
+    def report_progress(self, info):
+        """The archive size is not known up front, so only throughput is shown."""
+        self.bytes_done = info.bytes_done
+        self.status.emit(f"{info.bytes_done / (1024 * 1024):.1f} MB archived, "
+                         f"{info.bytes_per_second / (1024 * 1024):.1f} MB/s")
+
+class MoveJob(Job):
+    """
+    Move files into a folder. Within one filesystem each move is a rename;
+    across filesystems the kernel copies (a reflink where supported).
+    """
+
+    def __init__(self, paths: List[str], folder: str):
+        super().__init__(Path(paths[0]).name if len(paths) == 1 else f"{len(paths)} files",
+                         folder)
+        self.paths = paths
+        self.folder = folder
+
+    def execute(self) -> str:
+        from file_encryptor_fileops import move_file
+        copied = 0
+        for done, path in enumerate(self.paths, 1):
+            self.token.check()
+            if move_file(path, os.path.join(self.folder, os.path.basename(path)),
+                         self.token) != 'rename':
+                copied += 1
+            self.progress.emit(done * 100 // len(self.paths))
+        message = f"Moved {len(self.paths)} files to {self.folder}"
+        if copied:
+            message += f" ({copied} copied from another filesystem)"
+        return message
+
+class JobQueue(QObject):
+    """
+    Run jobs on a bounded QThreadPool. Each file operation already seals
+    segments on its own worker threads, so only a few run at once and the
+    rest wait in the pool's queue.
+    """
+    job_added = pyqtSignal(object)
+    drained = pyqtSignal()  # The last active job has finished
+    
+    MAX_JOBS = 2
+    
+    def __init__(self, max_jobs: int = MAX_JOBS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, max_jobs))
+        self.jobs = []
+        
+    def submit(self, job: Job):
+        """Queue a new job."""
+        self.jobs.append(job)
+        job.finished.connect(self._job_finished)
+        self.job_added.emit(job)
+        self.pool.start(job.run)
+        
+    def retry(self, job: Job):
+        """Queue a failed or cancelled job again."""
+        if job.active:
+            return
+        job.reset()
+        job.status.emit(job.PENDING)
+        self.pool.start(job.run)
+        
+    def remove(self, job: Job):
+        """Forget a finished job."""
+        if not job.active:
+            self.jobs.remove(job)
+        
+    def active_jobs(self):
+        return [job for job in self.jobs if job.active]
+        
+    def is_busy(self, target: str) -> bool:
+        """Whether an active job writes to target."""
+        target = os.path.abspath(target)
+        return any(os.path.abspath(job.target) == target for job in self.active_jobs())
+        
+    def cancel_all(self):
+        for job in self.active_jobs():
+            job.cancel()
+        
+    def wait(self, msecs: int = -1) -> bool:
+        """Block until every started job has returned."""
+        return self.pool.waitForDone(msecs)
+        
+    def _job_finished(self, success, message):
+        if not self.active_jobs():
+            self.drained.emit()
+
+class JobQueuePanel(QWidget):
+    """Table of queued, running and finished jobs with pause, cancel and retry."""
+    
+    COLUMNS = ('File', 'Operation', 'Progress', 'Status', '', '')
+    
+    def __init__(self, queue: JobQueue, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.rows = {}  # Job -> table row
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([_(c) for c in self.COLUMNS])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+        
+        buttons = QHBoxLayout()
+        self.summary = QLabel()
+        buttons.addWidget(self.summary)
+        buttons.addStretch()
+        self.pause_all_btn = QPushButton(_('Pause All'))
+        self.pause_all_btn.clicked.connect(lambda: self.set_all_paused(True))
+        self.resume_all_btn = QPushButton(_('Resume All'))
+        self.resume_all_btn.clicked.connect(lambda: self.set_all_paused(False))
+        self.clear_btn = QPushButton(_('Clear Finished'))
+        self.clear_btn.clicked.connect(self.clear_finished)
+        for button in (self.pause_all_btn, self.resume_all_btn, self.clear_btn):
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        
+        queue.job_added.connect(self.add_job)
+        
+        # Aggregate throughput of all jobs, sampled once a second
+        self._last_bytes = 0
+        self._last_sample = time.monotonic()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_summary)
+        self.timer.start(1000)
+        
+    def update_summary(self):
+        """Show how many jobs are running and queued and their combined MB/s."""
+        active = self.queue.active_jobs()
+        total = sum(job.bytes_done for job in self.queue.jobs)
+        now = time.monotonic()
+        # Retried or cleared jobs make the total drop; count that as idle
+        rate = max(0, total - self._last_bytes) / max(now - self._last_sample, 1e-6)
+        self._last_bytes, self._last_sample = total, now
+        if not active:
+            self.summary.clear()
+            return
+        running = sum(job.state == Job.RUNNING for job in active)
+        self.summary.setText(f"{running} running, {len(active) - running} queued, "
+                             f"{rate / (1024 * 1024):.1f} MB/s")
+        
+    def add_job(self, job: Job):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.rows[job] = row
+        
+        self.table.setItem(row, 0, QTableWidgetItem(job.description))
+        operation = getattr(job, 'mode', '')
+        self.table.setItem(row, 1, QTableWidgetItem(operation.capitalize()))
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        self.table.setCellWidget(row, 2, bar)
+        self.table.setItem(row, 3, QTableWidgetItem(job.state))
+        pause = QPushButton(_('Pause'))
+        pause.clicked.connect(lambda: self.set_paused(job, not job.paused))
+        self.table.setCellWidget(row, 4, pause)
+        button = QPushButton(_('Cancel'))
+        button.clicked.connect(lambda: self.cancel_or_retry(job))
+        self.table.setCellWidget(row, 5, button)
+        
+        job.progress.connect(bar.setValue)
+        job.status.connect(lambda text: self.set_status(job, text))
+        job.finished.connect(lambda success, message: self.job_finished(job, success, message))
+        
+    def set_status(self, job: Job, text: str):
+        row = self.rows.get(job)
+        if row is not None:
+            if job.active and job.paused:
+                text = _('Paused')  # Late progress from before the pause
+            self.table.item(row, 3).setText(text)
+            if job.active:
+                self.table.cellWidget(row, 4).setEnabled(True)
+                self.table.cellWidget(row, 5).setText(_('Cancel'))
+        
+    def job_finished(self, job: Job, success: bool, message: str):
+        row = self.rows.get(job)
+        if row is None:
+            return
+        if success:
+            self.table.cellWidget(row, 2).setValue(100)
+        self.set_status(job, f"{job.state}: {message}" if not success else job.state)
+        self.table.item(row, 3).setToolTip(message)
+        pause = self.table.cellWidget(row, 4)
+        pause.setText(_('Pause'))
+        pause.setEnabled(False)
+        button = self.table.cellWidget(row, 5)
+        button.setText(_('Retry'))
+        button.setEnabled(not success)
+        
+    def set_paused(self, job: Job, paused: bool):
+        """Pause or resume one job; a paused job keeps its partial output."""
+        if not job.active or job.token.cancelled:
+            return
+        if paused:
+            job.pause()
+        else:
+            job.resume()
+        self.table.cellWidget(self.rows[job], 4).setText(_('Resume') if paused else _('Pause'))
+        self.table.item(self.rows[job], 3).setText(
+            _('Paused') if paused else job.state)
+        
+    def set_all_paused(self, paused: bool):
+        for job in self.queue.active_jobs():
+            if job in self.rows:
+                self.set_paused(job, paused)
+        
+    def cancel_or_retry(self, job: Job):
+        if job.active:
+            job.cancel()
+            self.table.cellWidget(self.rows[job], 4).setText(_('Pause'))
+            self.set_status(job, _('Cancelling...'))
+        else:
+            self.table.cellWidget(self.rows[job], 2).setValue(0)
+            self.queue.retry(job)
+        
+    def clear_finished(self):
+        """Drop finished jobs from the table and the queue."""
+        finished = [job for job in self.rows if not job.active]
+        for job in sorted(finished, key=self.rows.get, reverse=True):
+            self.table.removeRow(self.rows.pop(job))
+            self.queue.remove(job)
+        # Rows below the removed ones moved up
+        self.rows = {job: row for row, job in enumerate(sorted(self.rows, key=self.rows.get))}
+
+def dropped_paths(mime_data) -> List[str]:
+    """Local files and folders carried by a drag-and-drop payload."""
+    return [url.toLocalFile() for url in mime_data.urls() if url.isLocalFile()]
 
 class LanguageManager:
     """Manage application languages"""
@@ -136,28 +577,28 @@ class LanguageManager:
     
     def __init__(self):
         self.current_lang = 'en_US'
-        self.translations = {}
-        self._load_translations()
+        self.translations = {}  # Catalogs are loaded when first selected
     
-    def _load_translations(self):
-        """Load all language translations"""
-        for lang_code in self.LANGUAGES.values():
+    def _load_translation(self, lang_code: str):
+        """Load one language's translation, caching it for later switches"""
+        if lang_code not in self.translations:
             try:
                 translation = gettext.translation(
                     'solacecrypt',
                     localedir='/usr/local/share/solacecrypt/locale',
                     languages=[lang_code]
                 )
-                self.translations[lang_code] = translation
             except FileNotFoundError:
                 # Fallback to default English strings
-                self.translations[lang_code] = gettext.NullTranslations()
+                translation = gettext.NullTranslations()
+            self.translations[lang_code] = translation
+        return self.translations[lang_code]
     
     def set_language(self, lang_name: str):
         """Set the current language"""
         lang_code = self.LANGUAGES.get(lang_name, 'en_US')
         self.current_lang = lang_code
-        self.translations[lang_code].install()
+        self._load_translation(lang_code).install()
 
 class Settings:
     """Manage application settings"""
@@ -323,6 +764,14 @@ class FileManager:
     def __init__(self):
         self.encrypted_folder = Path.home() / 'Encrypted'
         self.create_encrypted_folder()
+        self._index = None
+    
+    @property
+    def index(self) -> ContentIndex:
+        """What was encrypted where, so unchanged files are skipped (opened on first use)"""
+        if self._index is None:
+            self._index = ContentIndex()
+        return self._index
     
     def create_encrypted_folder(self):
         """Create the encrypted files folder if it doesn't exist"""
@@ -385,14 +834,17 @@ class FileEncryptorGUI(QMainWindow):
         self.lang_manager = LanguageManager()
         self.file_manager = FileManager()  # Add file manager
         self.lang_manager.set_language(self.settings.settings['language'])
-        self.thread = None
+        self.jobs = JobQueue(parent=self)
+        self.jobs.drained.connect(self.queue_drained)
+        self.selected_paths = []  # Files and folders chosen or dropped
+        self.setAcceptDrops(True)
         self.init_ui()
         self.apply_settings()
         
     def init_ui(self):
         """Initialize the user interface with improved layout and styling."""
         self.setMinimumWidth(700)
-        self.setMinimumHeight(400)
+        self.setMinimumHeight(600)
         
         # Create menu bar first
         self.create_menu_bar()
@@ -434,15 +886,20 @@ class FileEncryptorGUI(QMainWindow):
         file_layout = QHBoxLayout(file_group)
         
         self.file_path = QLineEdit()
-        self.file_path.setPlaceholderText('Select a file to encrypt/decrypt...')
+        self.file_path.setPlaceholderText('Select or drop files and folders to encrypt/decrypt...')
         self.file_path.setReadOnly(True)
         
         browse_btn = QPushButton('Browse')
         browse_btn.setFixedWidth(100)
         browse_btn.clicked.connect(self.browse_file)
         
+        browse_folder_btn = QPushButton('Folder')
+        browse_folder_btn.setFixedWidth(100)
+        browse_folder_btn.clicked.connect(self.browse_folder)
+        
         file_layout.addWidget(self.file_path)
         file_layout.addWidget(browse_btn)
+        file_layout.addWidget(browse_folder_btn)
         layout.addWidget(file_group)
         
         # Output path selection
@@ -506,10 +963,9 @@ class FileEncryptorGUI(QMainWindow):
         btn_layout.addWidget(self.decrypt_btn)
         layout.addWidget(btn_group)
         
-        # Progress bar
-        self.progress = QProgressBar()
-        self.progress.setVisible(False)
-        layout.addWidget(self.progress)
+        # Queued and running jobs
+        self.queue_panel = JobQueuePanel(self.jobs)
+        layout.addWidget(self.queue_panel)
         
         # Status bar
         self.status_bar = QStatusBar()
@@ -525,6 +981,19 @@ class FileEncryptorGUI(QMainWindow):
         # File menu
         file_menu = menubar.addMenu(_('File'))
         
+        create_archive_action = QAction(_('Create Archive...'), self)
+        create_archive_action.triggered.connect(lambda: self.process_archive('create'))
+        file_menu.addAction(create_archive_action)
+        
+        extract_archive_action = QAction(_('Extract Archive...'), self)
+        extract_archive_action.triggered.connect(lambda: self.process_archive('extract'))
+        file_menu.addAction(extract_archive_action)
+
+        move_action = QAction(_('Move to Encrypted Folder...'), self)
+        move_action.triggered.connect(self.move_to_encrypted)
+        file_menu.addAction(move_action)
+        file_menu.addSeparator()
+        
         # Remove folder visibility actions and just add exit
         exit_action = QAction(_('Exit'), self)
         exit_action.setShortcut('Ctrl+Q')
@@ -620,15 +1089,52 @@ class FileEncryptorGUI(QMainWindow):
         QApplication.instance().setPalette(QApplication.style().standardPalette())
         
     def browse_file(self):
-        """Open file dialog to select a file."""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Open file dialog to select one or more files."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
-            "Select File",
+            "Select Files",
             str(Path.home()),
             "All Files (*.*)"
         )
-        if file_path:
-            self.file_path.setText(file_path)
+        if file_paths:
+            self.set_selection(file_paths)
+            
+    def browse_folder(self):
+        """Open dialog to select a folder to process as a whole."""
+        folder_path = QFileDialog.getExistingDirectory(
+            self,
+            "Select Folder",
+            str(Path.home()),
+            QFileDialog.Option.ShowDirsOnly
+        )
+        if folder_path:
+            self.set_selection([folder_path])
+            
+    def set_selection(self, paths):
+        """Remember the files and folders to process and show them."""
+        self.selected_paths = list(paths)
+        if len(paths) == 1:
+            self.file_path.setText(paths[0])
+        else:
+            self.file_path.setText(f"{len(paths)} items selected")
+        self.file_path.setToolTip('\n'.join(paths))
+        
+    def clear_selection(self):
+        self.selected_paths = []
+        self.file_path.clear()
+        self.file_path.setToolTip('')
+        
+    def dragEnterEvent(self, event):
+        """Accept files and folders dragged from a file manager."""
+        if dropped_paths(event.mimeData()):
+            event.acceptProposedAction()
+            
+    def dropEvent(self, event):
+        """Select the dropped files and folders; folders are expanded when queued."""
+        paths = dropped_paths(event.mimeData())
+        if paths:
+            self.set_selection(paths)
+            event.acceptProposedAction()
             
     def browse_output(self):
         """Open dialog to select output location."""
@@ -678,110 +1184,181 @@ class FileEncryptorGUI(QMainWindow):
             self.hide_folder.setChecked(not state)
         
     def process_file(self, mode):
-        """Start the encryption/decryption process."""
-        if not self.file_path.text():
+        """Queue encryption/decryption of the selected files and folders."""
+        if not self.selected_paths:
             QMessageBox.warning(self, "Error", "Please select a file first!")
             return
             
         if not self.passphrase.text():
             QMessageBox.warning(self, "Error", "Please enter a passphrase!")
             return
-            
-        input_path = self.file_path.text()
         
         # Use custom output path if specified, otherwise use default location
-        if self.output_path.text():
-            base_path = self.output_path.text()
-            filename = Path(input_path).name
-            if mode == 'encrypt':
-                output_path = str(Path(base_path) / f"{Path(filename).stem}.enc")
+        base_path = self.output_path.text() or str(self.file_manager.encrypted_folder)
+        jobs = []
+        for input_path in self.selected_paths:
+            if os.path.isdir(input_path):
+                # Expanded lazily by the job itself, off the GUI thread
+                jobs.append(FolderJob(mode, input_path, base_path, self.passphrase.text(),
+                                      self.delete_original.isChecked(),
+                                      index=self.file_manager.index))
+                continue
+            if self.output_path.text():
+                filename = Path(input_path).name
+                if mode == 'encrypt':
+                    output_path = str(Path(base_path) / f"{Path(filename).stem}.enc")
+                else:
+                    output_path = str(Path(base_path) / Path(filename).stem)
             else:
-                output_path = str(Path(base_path) / Path(filename).stem)
-        else:
-            # Use default encrypted folder
-            output_path = str(self.file_manager.get_output_path(input_path, mode))
-        
-        # Check if output file already exists
-        if os.path.exists(output_path):
+                output_path = str(self.file_manager.get_output_path(input_path, mode))
+            jobs.append(EncryptionJob(mode, input_path, output_path,
+                                      self.passphrase.text(),
+                                      self.delete_original.isChecked(),
+                                      index=self.file_manager.index))
+        
+        # Files of one name picked from different folders share an output;
+        # only the first of them is queued
+        targets = set()
+        busy = []
+        for job in jobs:
+            target = os.path.abspath(job.target)
+            if target in targets or self.jobs.is_busy(target):
+                busy.append(job)
+            targets.add(target)
+        if busy:
+            QMessageBox.warning(self, "Error", "A queued job already writes to this output!"
+                                if len(jobs) == 1 else
+                                f"{len(busy)} outputs are already being written; "
+                                "those items are skipped.")
+            jobs = [job for job in jobs if job not in busy]
+        
+        # Check if output files already exist; re-encrypting a file over its
+        # own earlier artifact is expected and needs no confirmation
+        existing = [job for job in jobs if isinstance(job, EncryptionJob)
+                    and os.path.exists(job.target)
+                    and not (mode == 'encrypt' and
+                             self.file_manager.index.artifact_for(job.input_path)
+                             == os.path.abspath(job.target))]
+        if existing:
             reply = QMessageBox.question(
                 self,
                 'File exists',
-                f'The output file already exists.\nDo you want to overwrite it?',
+                f'The output file already exists.\nDo you want to overwrite it?'
+                if len(existing) == 1 else
+                f'{len(existing)} output files already exist.\nDo you want to overwrite them?',
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.No:
-                return
+                jobs = [job for job in jobs if job not in existing]
+        if not jobs:
+            return
         
-        # Cleanup previous thread if exists
-        if self.thread is not None and self.thread.isRunning():
-            self.thread.terminate()
-            self.thread.wait()
-            
-        # Start the encryption/decryption thread
-        self.thread = EncryptionThread(
-            mode, input_path, output_path,
-            self.passphrase.text(),
-            self.delete_original.isChecked()
-        )
-        self.thread.progress.connect(self.update_progress)
-        self.thread.finished.connect(self.process_completed)
-        
-        # Disable UI elements
-        self.encrypt_btn.setEnabled(False)
-        self.decrypt_btn.setEnabled(False)
-        self.file_path.setEnabled(False)
-        self.passphrase.setEnabled(False)
-        self.delete_original.setEnabled(False)
-        self.show_pass.setEnabled(False)
-        self.hide_folder.setEnabled(False)
-        
-        # Show progress bar
-        self.progress.setVisible(True)
-        self.progress.setRange(0, 0)  # Infinite progress bar
-        self.status_bar.showMessage(f"{'Encrypting' if mode == 'encrypt' else 'Decrypting'} file...")
-        
-        self.thread.start()
-        
-    def update_progress(self, value):
-        """Update the progress bar."""
-        self.progress.setValue(value)
-        
-    def process_completed(self, success, message):
-        """Handle process completion."""
-        self.progress.setVisible(False)
-        self.status_bar.clearMessage()
-        
-        # Re-enable UI elements
-        self.encrypt_btn.setEnabled(True)
-        self.decrypt_btn.setEnabled(True)
-        self.file_path.setEnabled(True)
-        self.passphrase.setEnabled(True)
-        self.delete_original.setEnabled(True)
-        self.show_pass.setEnabled(True)
-        self.hide_folder.setEnabled(True)
+        for job in jobs:
+            self.jobs.submit(job)
+        what = jobs[0].description if len(jobs) == 1 else f"{len(jobs)} items"
+        self.status_bar.showMessage(f"{'Encryption' if mode == 'encrypt' else 'Decryption'} "
+                                    f"of {what} queued")
         
-        if success:
-            QMessageBox.information(self, "Success", message)
-            self.file_path.clear()
-            self.passphrase.clear()
-            self.delete_original.setChecked(False)
+        # The passphrase stays so more files can be queued with it
+        self.clear_selection()
+        self.delete_original.setChecked(False)
+        
+    def process_archive(self, mode):
+        """Pack a folder into one encrypted archive, or unpack an archive."""
+        if not self.passphrase.text():
+            QMessageBox.warning(self, "Error", "Please enter a passphrase!")
+            return
+        
+        if mode == 'create':
+            folder = QFileDialog.getExistingDirectory(
+                self, "Select Folder to Archive", str(Path.home()),
+                QFileDialog.Option.ShowDirsOnly)
+            if not folder:
+                return
+            default = self.file_manager.encrypted_folder / f"{Path(folder).name}.slca"
+            archive_path, _filter = QFileDialog.getSaveFileName(
+                self, "Save Archive As", str(default), "Encrypted Archives (*.slca)")
         else:
-            QMessageBox.critical(self, "Error", message)
+            archive_path, _filter = QFileDialog.getOpenFileName(
+                self, "Select Archive", str(self.file_manager.encrypted_folder),
+                "Encrypted Archives (*.slca);;All Files (*.*)")
+            if not archive_path:
+                return
+            folder = QFileDialog.getExistingDirectory(
+                self, "Extract To", str(Path.home()), QFileDialog.Option.ShowDirsOnly)
+        if not archive_path or not folder:
+            return
+        
+        job = ArchiveJob(mode, archive_path, folder, self.passphrase.text())
+        if self.jobs.is_busy(job.target):
+            QMessageBox.warning(self, "Error", "A queued job already writes to this output!")
+            return
+        self.jobs.submit(job)
+        self.status_bar.showMessage('Archive creation queued' if mode == 'create'
+                                    else 'Archive extraction queued')
+
+    def move_to_encrypted(self):
+        """Move already encrypted files, e.g. made with the CLI, into the encrypted folder."""
+        folder = self.file_manager.encrypted_folder
+        paths, _filter = QFileDialog.getOpenFileNames(
+            self, "Move to Encrypted Folder", str(Path.home()),
+            "Encrypted Files (*.enc *.slca);;All Files (*.*)")
+        paths = [path for path in paths if Path(path).parent != folder]
+        if not paths:
+            return
+
+        existing = [path for path in paths if (folder / Path(path).name).exists()]
+        if existing:
+            reply = QMessageBox.question(
+                self,
+                'File exists',
+                f'{len(existing)} of these files already exist in the encrypted folder.\n'
+                'Do you want to overwrite them?',
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply == QMessageBox.StandardButton.No:
+                paths = [path for path in paths if path not in existing]
+        if not paths:
+            return
+
+        self.jobs.submit(MoveJob(paths, str(folder)))
+        self.status_bar.showMessage(f"Move of {len(paths)} files queued")
+        
+    def queue_drained(self):
+        """Every queued job has finished."""
+        failed = sum(job.state == Job.FAILED for job in self.jobs.jobs)
+        self.status_bar.showMessage(f"All jobs finished, {failed} failed" if failed
+                                    else "All jobs finished")
+        if self.settings.settings['auto_clear']:
+            self.passphrase.clear()
             
     def closeEvent(self, event):
         """Handle application closing."""
-        if self.thread is not None and self.thread.isRunning():
+        if self.jobs.active_jobs():
             reply = QMessageBox.question(self, 'Confirm Exit',
-                                       'An operation is in progress. Are you sure you want to quit?',
+                                       'Jobs are still queued or running. Cancel them and quit?',
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            if reply == QMessageBox.StandardButton.Yes:
-                self.thread.terminate()
-                self.thread.wait()
-            else:
+            if reply == QMessageBox.StandardButton.No:
                 event.ignore()
                 return
+            # Running jobs stop at their next CancellationToken check --
+            # after the current segment, but only once a KDF run or a
+            # kernel copy call returns -- and remove their partial output;
+            # nothing is killed mid-write. Waiting here would freeze the
+            # window meanwhile, so it is hidden and closes for good when
+            # the queue drains
+            self.jobs.cancel_all()
+            self.hide()
+            self.jobs.drained.connect(self.finish_closing)
+            event.ignore()
+            return
         event.accept()
 
+    def finish_closing(self):
+        """Close and quit once the jobs cancelled by closeEvent have returned."""
+        self.close()
+        QApplication.quit()
+
     def show_settings(self):
         """Show the settings dialog"""
         dialog = SettingsDialog(self)
@@ -849,7 +1426,7 @@ class FileEncryptorGUI(QMainWindow):
         self.delete_original.setText(_('Securely delete original file'))
         
         # Update placeholders
-        self.file_path.setPlaceholderText(_('Select a file to encrypt/decrypt...'))
+        self.file_path.setPlaceholderText(_('Select or drop files and folders to encrypt/decrypt...'))
         self.passphrase.setPlaceholderText(_('Enter passphrase'))
 
     def change_theme(self, theme_name):
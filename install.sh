@@ -64,6 +64,12 @@ print_status "Installing Python packages..."
 pip3 install --upgrade pip
 pip3 install -r requirements.txt
 
+# Optional native AES-GCM backend; used only if it passes its self-test
+if command -v c++ &> /dev/null; then
+    print_status "Building hardware cipher..."
+    pip3 install ./src/hardware || print_error "Hardware cipher not built; using the Python backend"
+fi
+
 # Copy application files
 print_status "Installing application files..."
 cp src/file_encryptor.py "$INSTALL_DIR/"
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for SecureFileEncryptor.
+
+Runs every combination of file size, KDF, segment size, worker count and
+I/O mode, each in a fresh interpreter so peak RSS and syscall counts
+belong to that case alone. Timed runs reuse one derived key (a batch
+salt and a DerivedKeyCache), so throughput and latency measure the cipher
+and file I/O; the KDF is timed once on its own and reported as kdf_ms.
+The dedup op stores the file into an empty chunk store and also reports
+how fast content-defined chunking alone runs (chunk_mb_per_s), so the
+chunker can be compared with the rest of the store's work. Results are
+written as JSON and can be compared against a stored baseline:
+
+    python -m solacecrypt.bench --sizes 1K,1M,64M -o results.json
+    python -m solacecrypt.bench --baseline results.json
+    python -m solacecrypt.bench --ops encrypt,dedup --sizes 64M --workers 1
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from file_encryptor import DerivedKeyCache, SecureFileEncryptor
+from file_encryptor_backends import registry
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+PASSPHRASE = 'solacecrypt-benchmark'
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as 512, 64K, 1M or 10G."""
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+def format_size(size: int) -> str:
+    for unit in ('G', 'M', 'K'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return str(size)
+
+def case_id(case: Dict) -> str:
+    """Stable name used to match a case against the baseline."""
+    return (f"{case['op']} size={format_size(case['size'])} kdf={case['kdf']} "
+            f"segment={format_size(case['segment_size'])} workers={case['workers']} "
+            f"io={case['io_mode']}")
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+def make_input(directory: str, size: int) -> str:
+    """Create (or reuse) a file of random data of the given size."""
+    path = os.path.join(directory, f"input-{size}.bin")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    # No block repeats, so a chunk store finds nothing to deduplicate
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            block = os.urandom(min(remaining, SecureFileEncryptor.SEGMENT_SIZE))
+            f.write(block)
+            remaining -= len(block)
+    return path
+
+def _proc_io() -> Dict[str, int]:
+    """Read/write syscall counters of this process (Linux only)."""
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                name, value = line.split(':')
+                counters[name] = int(value)
+    except OSError:
+        pass
+    return counters
+
+def run_case(case: Dict) -> Dict:
+    """Run one case in this process and return its measurements."""
+    kdf = SecureFileEncryptor.KDF_DEFAULTS[SecureFileEncryptor.KDF_NAMES[case['kdf']]]
+    # batch: every file reuses one salt, so the cached master key serves
+    # each run and only a per-file HKDF subkey is derived
+    encryptor = SecureFileEncryptor(segment_size=case['segment_size'],
+                                    workers=case['workers'],
+                                    io_mode=case['io_mode'], kdf=kdf,
+                                    batch=True, key_cache=DerivedKeyCache())
+    # Probe the cipher backends now so their self-test is not timed
+    backend = registry.selected()['decrypt' if case['op'] == 'decrypt' else 'encrypt']
+    source = case['input']
+    encrypted = source + f".{os.getpid()}.enc"
+    output = source + f".{os.getpid()}.out"
+    store = None
+    if case['op'] == 'dedup':
+        from file_encryptor_dedup import ChunkStore
+        store = ChunkStore(Path(source + f".{os.getpid()}.store"), encryptor)
+    
+    # One derivation under a fresh salt, which the cache cannot answer
+    start = time.perf_counter()
+    encryptor._secure_wipe(encryptor._derive_key(PASSPHRASE, os.urandom(encryptor.SALT_SIZE)))
+    kdf_seconds = time.perf_counter() - start
+    
+    def run_once() -> None:
+        if case['op'] == 'encrypt':
+            encryptor.encrypt_file(source, encrypted, PASSPHRASE)
+        elif case['op'] == 'decrypt':
+            encryptor.decrypt_file(encrypted, output, PASSPHRASE)
+        else:
+            store.store_file(source, output, PASSPHRASE)
+    
+    def reset() -> None:
+        # Every dedup run starts from an empty store, so each chunk is written
+        if store:
+            shutil.rmtree(store.root / 'chunks')
+            (store.root / 'chunks').mkdir()
+    
+    latencies = []
+    extra = {}
+    try:
+        # Untimed: derives and caches the key the timed runs use
+        if case['op'] == 'decrypt':
+            encryptor.encrypt_file(source, encrypted, PASSPHRASE)
+        run_once()
+        io_before = _proc_io()
+        for _ in range(case['repeat']):
+            reset()
+            start = time.perf_counter()
+            run_once()
+            latencies.append(time.perf_counter() - start)
+        io_after = _proc_io()
+        if store:
+            extra = _time_chunking(store, source, case['repeat'])
+    finally:
+        for path in (encrypted, output):
+            if os.path.exists(path):
+                os.remove(path)
+        if store:
+            shutil.rmtree(store.root, ignore_errors=True)
+    
+    median = percentile(latencies, 50)
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+    return {
+        'mb_per_s': case['size'] / median / (1024 * 1024) if median > 0 else 0.0,
+        'latency_ms': {f"p{p}": percentile(latencies, p) * 1000 for p in (50, 90, 99)},
+        'kdf_ms': kdf_seconds * 1000,
+        'cipher_backend': backend,
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'syscalls': {
+            'read': (io_after.get('syscr', 0) - io_before.get('syscr', 0)) // case['repeat'],
+            'write': (io_after.get('syscw', 0) - io_before.get('syscw', 0)) // case['repeat'],
+        },
+        **extra,
+    }
+
+def _time_chunking(store, source: str, repeat: int) -> Dict:
+    """Throughput of cutting source into chunks, without hashing or storing them."""
+    from file_encryptor_dedup import _find_boundary, boundary_finder
+    timings = []
+    with store._unlocked(PASSPHRASE) as keys:
+        for _ in range(repeat):
+            with open(source, 'rb') as f:
+                start = time.perf_counter()
+                for _chunk in store._iter_chunks(f, keys):
+                    pass
+                timings.append(time.perf_counter() - start)
+    median = percentile(timings, 50)
+    return {
+        'chunk_mb_per_s': os.path.getsize(source) / median / (1024 * 1024) if median > 0 else 0.0,
+        'chunker': 'python' if boundary_finder() is _find_boundary else 'native',
+    }
+
+def run_isolated(case: Dict) -> Dict:
+    """Run one case in a child interpreter."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [str(REPO_ROOT), os.environ.get('PYTHONPATH')])))
+    proc = subprocess.run([sys.executable, '-m', 'solacecrypt.bench', '--case', json.dumps(case)],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{case_id(case)} failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout)
+
+def host_info() -> Dict:
+    import cryptography
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'cryptography': cryptography.__version__,
+    }
+
+def compare(results: List[Dict], baseline: Dict, max_regression: float) -> int:
+    """Print throughput changes against a baseline; return the number of regressions."""
+    previous = {case_id(r): r for r in baseline.get('results', [])}
+    regressions = 0
+    print("\nAgainst baseline:")
+    for result in results:
+        old = previous.get(case_id(result))
+        if old is None or not old['mb_per_s']:
+            continue
+        change = (result['mb_per_s'] - old['mb_per_s']) / old['mb_per_s'] * 100
+        flag = ''
+        if change < -max_regression:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"  {case_id(result)}: {old['mb_per_s']:.1f} -> "
+              f"{result['mb_per_s']:.1f} MB/s ({change:+.1f}%){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="SolaceCrypt encryption benchmark")
+    parser.add_argument('--sizes', default='1K,64K,1M,16M,256M',
+                        help="Comma-separated file sizes, e.g. 1K,1M,1G,10G")
+    parser.add_argument('--kdfs', default='pbkdf2', help="Comma-separated KDF names")
+    parser.add_argument('--segment-sizes', default='1M', help="Comma-separated segment sizes")
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated worker counts")
+    parser.add_argument('--io-modes', default=','.join(SecureFileEncryptor.IO_MODES),
+                        help="Comma-separated I/O modes")
+    parser.add_argument('--ops', default='encrypt,decrypt',
+                        help="Comma-separated: encrypt, decrypt, dedup")
+    parser.add_argument('-n', '--repeat', type=int, default=5, help="Runs per case")
+    parser.add_argument('--dir', help="Directory for scratch files (default: system temp)")
+    parser.add_argument('-o', '--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare throughput against this JSON file")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="Percent throughput drop that counts as a regression")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+    
+    split = lambda text: [item for item in text.split(',') if item]
+    settings = list(itertools.product(map(parse_size, split(args.segment_sizes)),
+                                      sorted(set(map(int, split(args.workers)))),
+                                      split(args.io_modes)))
+    with tempfile.TemporaryDirectory(dir=args.dir, prefix='solacecrypt-bench-') as scratch:
+        results = []
+        for size in map(parse_size, split(args.sizes)):
+            source = make_input(scratch, size)
+            for op in split(args.ops):
+                for kdf in split(args.kdfs):
+                    # The chunk store has no segment, worker or I/O settings
+                    for segment_size, workers, io_mode in (settings[:1] if op == 'dedup'
+                                                           else settings):
+                        case = {'op': op, 'size': size, 'kdf': kdf,
+                                'segment_size': segment_size, 'workers': workers,
+                                'io_mode': io_mode, 'repeat': args.repeat,
+                                'input': source}
+                        result = run_isolated(case)
+                        result.update({k: v for k, v in case.items() if k != 'input'})
+                        results.append(result)
+                        chunking = (f", chunking {result['chunk_mb_per_s']:.1f} MB/s "
+                                    f"({result['chunker']})" if op == 'dedup' else '')
+                        print(f"{case_id(case)}: {result['mb_per_s']:.1f} MB/s{chunking}, "
+                              f"p50 {result['latency_ms']['p50']:.1f} ms "
+                              f"(kdf {result['kdf_ms']:.1f} ms), "
+                              f"rss {result['peak_rss_mb']:.0f} MB, "
+                              f"{result['syscalls']['read']}r/"
+                              f"{result['syscalls']['write']}w syscalls", flush=True)
+            os.remove(source)
+    
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'host': host_info(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            if compare(results, json.load(f), args.max_regression):
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Start-up benchmark for the CLI and GUI entry points.
+
+Each target runs in fresh interpreters under `-X importtime`. The median
+import time and wall time are reported with the modules that cost the
+most, and the run fails if a module that should load lazily (cryptography,
+tqdm, ...) is imported at start-up. Results can be compared against a
+stored baseline:
+
+    python -m solacecrypt.startup -o startup.json
+    python -m solacecrypt.startup --baseline startup.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# name -> (arguments after `python -X importtime`, module whose cumulative
+# import time is reported or None, modules that must not be imported)
+TARGETS = {
+    'cli-import': (['-c', 'import file_encryptor'], 'file_encryptor',
+                   ['cryptography', 'tqdm', 'argparse', 'ctypes', 'sqlite3', 'lzma']),
+    # argparse's help formatter imports shutil, which imports lzma
+    'cli-help': ([str(REPO_ROOT / 'file_encryptor.py'), '--help'], None,
+                 ['cryptography', 'tqdm', 'ctypes', 'sqlite3']),
+    'gui-import': (['-c', 'import file_encryptor_gui'], 'file_encryptor_gui',
+                   ['cryptography', 'tqdm', 'file_encryptor_archive', 'sqlite3', 'lzma']),
+}
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every line -X importtime printed."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The column header
+        entries.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return entries
+
+def run_once(args: List[str]) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Run one interpreter; return its wall time in seconds and import times."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [str(REPO_ROOT), os.environ.get('PYTHONPATH')])))
+    # Measure with cached bytecode, as an installed copy would run
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                          capture_output=True, text=True, env=env, cwd=str(REPO_ROOT))
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{proc.stderr.strip()[-2000:]}")
+    return elapsed, parse_importtime(proc.stderr)
+
+def measure(name: str, repeat: int, top: int) -> Dict:
+    """Median import and wall time of a target over repeat warm runs."""
+    args, module, forbidden = TARGETS[name]
+    run_once(args)  # Warm-up: writes bytecode and fills the page cache
+    walls, imports, entries = [], [], []
+    for _ in range(repeat):
+        wall, entries = run_once(args)
+        walls.append(wall)
+        if module:
+            imports.append(next((cumulative for mod, _, cumulative in entries
+                                 if mod == module), 0))
+    loaded = {mod for mod, _, _ in entries}
+    eager = sorted(name for name in forbidden
+                   if any(mod == name or mod.startswith(name + '.') for mod in loaded))
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        'target': name,
+        'wall_ms': sorted(walls)[len(walls) // 2] * 1000,
+        'import_ms': sorted(imports)[len(imports) // 2] / 1000 if imports else None,
+        'modules': len(loaded),
+        'eager': eager,
+        'slowest': [{'module': mod, 'self_ms': own / 1000} for mod, own, _ in slowest],
+    }
+
+def compare(results: List[Dict], baseline: Dict, max_regression: float) -> int:
+    """Print start-up changes against a baseline; return the number of regressions."""
+    previous = {r['target']: r for r in baseline.get('results', [])}
+    regressions = 0
+    print("\nAgainst baseline:")
+    for result in results:
+        old = previous.get(result['target'])
+        if old is None:
+            continue
+        for key in ('wall_ms', 'import_ms'):
+            if not old.get(key) or result.get(key) is None:
+                continue
+            change = (result[key] - old[key]) / old[key] * 100
+            flag = ''
+            if change > max_regression:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"  {result['target']} {key}: {old[key]:.1f} -> {result[key]:.1f} "
+                  f"({change:+.1f}%){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="SolaceCrypt start-up benchmark")
+    parser.add_argument('--targets', default=','.join(TARGETS),
+                        help=f"Comma-separated targets ({', '.join(TARGETS)})")
+    parser.add_argument('-n', '--repeat', type=int, default=7, help="Runs per target")
+    parser.add_argument('--top', type=int, default=5,
+                        help="Slowest modules (by own import time) to show")
+    parser.add_argument('-o', '--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare start-up times against this JSON file")
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help="Percent slow-down that counts as a regression")
+    args = parser.parse_args()
+    
+    results = []
+    for name in [item for item in args.targets.split(',') if item]:
+        if name not in TARGETS:
+            parser.error(f"Unknown target: {name}")
+        result = measure(name, max(1, args.repeat), args.top)
+        results.append(result)
+        line = f"{name}: {result['wall_ms']:.1f} ms wall"
+        if result['import_ms'] is not None:
+            line += f", {result['import_ms']:.1f} ms import"
+        print(line + f", {result['modules']} modules", flush=True)
+        for entry in result['slowest']:
+            print(f"    {entry['self_ms']:7.1f} ms  {entry['module']}")
+        if result['eager']:
+            print(f"  EAGER IMPORT: {', '.join(result['eager'])}")
+    
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0], 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nResults written to {args.output}")
+    failed = any(result['eager'] for result in results)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            if compare(results, json.load(f), args.max_regression):
+                failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -11,7 +11,9 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QFrame, QSpacerItem, QSizePolicy)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QIcon, QPalette, QColor, QAction, QFont
-from file_encryptor import SecureFileEncryptor
+from file_encryptor import SecureFileEncryptor, _default_output_path
+from file_encryptor_gui import (JobQueue, JobQueuePanel, EncryptionJob, FolderJob,
+                                dropped_paths)
 
 class ThemeManager:
     """Manage application themes"""
@@ -64,7 +66,9 @@ class ThemeManager:
 class SolaceCryptGUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.thread = None
+        self.jobs = JobQueue(parent=self)
+        self.selected_paths = []
+        self.setAcceptDrops(True)
         self.current_theme = 'Dark Blue'
         self.current_button_style = 'Rounded'
         self.init_ui()
@@ -139,13 +143,13 @@ class SolaceCryptGUI(QMainWindow):
         file_group = QWidget()
         file_layout = QVBoxLayout(file_group)
         
-        file_label = QLabel('Select File')
+        file_label = QLabel('Select Files')
         file_label.setStyleSheet('font-weight: bold; font-size: 14px;')
         file_layout.addWidget(file_label)
         
         file_input_layout = QHBoxLayout()
         self.file_path = QLineEdit()
-        self.file_path.setPlaceholderText('Drag and drop a file or click Browse...')
+        self.file_path.setPlaceholderText('Drag and drop files or folders, or click Browse...')
         self.file_path.setReadOnly(True)
         
         browse_btn = QPushButton('Browse')
@@ -193,11 +197,11 @@ class SolaceCryptGUI(QMainWindow):
         btn_layout = QHBoxLayout(btn_group)
         btn_layout.setSpacing(15)
         
-        self.encrypt_btn = QPushButton('Encrypt File')
+        self.encrypt_btn = QPushButton('Encrypt')
         self.encrypt_btn.setFixedWidth(200)
         self.encrypt_btn.clicked.connect(lambda: self.process_file('encrypt'))
         
-        self.decrypt_btn = QPushButton('Decrypt File')
+        self.decrypt_btn = QPushButton('Decrypt')
         self.decrypt_btn.setFixedWidth(200)
         self.decrypt_btn.clicked.connect(lambda: self.process_file('decrypt'))
         
@@ -207,16 +211,9 @@ class SolaceCryptGUI(QMainWindow):
         btn_layout.addStretch()
         layout.addWidget(btn_group)
         
-        # Progress section
-        progress_group = QWidget()
-        progress_layout = QVBoxLayout(progress_group)
-        
-        self.progress = QProgressBar()
-        self.progress.setVisible(False)
-        self.progress.setFixedHeight(8)
-        progress_layout.addWidget(self.progress)
-        
-        layout.addWidget(progress_group)
+        # Queued and running jobs; outputs are written next to their inputs
+        self.queue_panel = JobQueuePanel(self.jobs)
+        layout.addWidget(self.queue_panel)
         
         # Status bar
         self.status_bar = QStatusBar()
@@ -290,13 +287,83 @@ class SolaceCryptGUI(QMainWindow):
         self.change_theme(self.current_theme)  # Reapply theme with new button style
 
     def browse_file(self):
-        # Implement file browsing functionality
-        pass
+        """Open file dialog to select one or more files."""
+        file_paths, _filter = QFileDialog.getOpenFileNames(
+            self, "Select Files", str(Path.home()), "All Files (*.*)")
+        if file_paths:
+            self.set_selection(file_paths)
+
+    def set_selection(self, paths):
+        """Remember the files and folders to process and show them."""
+        self.selected_paths = list(paths)
+        self.file_path.setText(paths[0] if len(paths) == 1 else f"{len(paths)} items selected")
+        self.file_path.setToolTip('\n'.join(paths))
+
+    def dragEnterEvent(self, event):
+        """Accept files and folders dragged from a file manager."""
+        if dropped_paths(event.mimeData()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        """Select the dropped files and folders; folders are expanded when queued."""
+        paths = dropped_paths(event.mimeData())
+        if paths:
+            self.set_selection(paths)
+            event.acceptProposedAction()
 
-    def toggle_passphrase_visibility(self):
-        # Implement passphrase visibility toggle functionality
-        pass
+    def toggle_passphrase_visibility(self, state):
+        """Toggle passphrase visibility."""
+        self.passphrase.setEchoMode(
+            QLineEdit.EchoMode.Normal if state else QLineEdit.EchoMode.Password)
 
     def process_file(self, operation):
-        # Implement file processing functionality
-        pass 
\ No newline at end of file
+        """Queue the selected files and folders; outputs go next to the inputs."""
+        if not self.selected_paths:
+            QMessageBox.warning(self, "Error", "Please select a file first!")
+            return
+        if not self.passphrase.text():
+            QMessageBox.warning(self, "Error", "Please enter a passphrase!")
+            return
+
+        delete_original = operation == 'encrypt' and self.delete_original.isChecked()
+        for input_path in self.selected_paths:
+            if os.path.isdir(input_path):
+                job = FolderJob(operation, input_path, None, self.passphrase.text(),
+                                delete_original)
+            else:
+                job = EncryptionJob(operation, input_path,
+                                    _default_output_path(input_path, operation == 'encrypt'),
+                                    self.passphrase.text(), delete_original)
+            if self.jobs.is_busy(job.target):
+                self.status_bar.showMessage(f"Already queued: {input_path}")
+                continue
+            self.jobs.submit(job)
+
+        self.selected_paths = []
+        self.file_path.clear()
+        self.file_path.setToolTip('')
+        self.delete_original.setChecked(False)
+
+    def closeEvent(self, event):
+        """Cancel running jobs cleanly before closing."""
+        if self.jobs.active_jobs():
+            reply = QMessageBox.question(self, 'Confirm Exit',
+                                         'Jobs are still queued or running. Cancel them and quit?',
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.No:
+                event.ignore()
+                return
+            # Jobs stop at their next cancellation check and remove their
+            # partial output. Waiting for that here would freeze the window,
+            # so it is hidden and closes once the queue drains
+            self.jobs.cancel_all()
+            self.hide()
+            self.jobs.drained.connect(self.finish_closing)
+            event.ignore()
+            return
+        event.accept()
+
+    def finish_closing(self):
+        """Close and quit once the jobs cancelled by closeEvent have returned."""
+        self.close()
+        QApplication.quit()
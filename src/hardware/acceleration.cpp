@@ -1,29 +1,828 @@
+// Multi-buffer AES-256-GCM over OpenSSL EVP, built as the optional
+// `solace_accel` Python extension (`pip install ./src/hardware`).
+//
+// OpenSSL picks its AES-NI/VAES + PCLMULQDQ (or ARMv8 crypto) code at run
+// time; cpu_features() reports what this CPU offers so the backend
+// registry in file_encryptor_backends.py can skip the module on machines
+// without hardware AES. Every call:
+//   * takes Python buffers without copying and writes into caller-provided
+//     buffers (or straight into the returned bytes object),
+//   * releases the GIL while it encrypts,
+//   * reuses one EVP context per thread and direction; within a call the
+//     context keeps the key schedule, so only the nonce is set per segment
+//     and nothing is allocated per segment. Every call resets the context
+//     before it returns, so no key schedule outlives the call that used it.
+// The segment runs follow the container format of SecureFileEncryptor:
+// nonce = prefix || index (u32) || final, AAD = header || index (u64) || final.
+// find_boundary() is the gear-hash chunker of the dedup store, which is
+// too slow in pure Python to keep up with the cipher.
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <openssl/crypto.h>
 #include <openssl/evp.h>
-#include <openssl/aes.h>
+
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
+#include <cstring>
+#include <new>
+#include <stdexcept>
 #include <vector>
-#include <string>
 
+#if defined(__x86_64__) || defined(__i386__)
+#include <cpuid.h>
+#elif defined(__aarch64__) && defined(__linux__)
+#include <asm/hwcap.h>
+#include <sys/auxv.h>
+#endif
+
+namespace {
+
+constexpr size_t KEY_SIZE = 32;
+constexpr size_t NONCE_SIZE = 12;
+constexpr size_t TAG_SIZE = 16;
+constexpr size_t NONCE_PREFIX_SIZE = 7;
+constexpr uint64_t MAX_SEGMENTS = uint64_t(1) << 32;
+constexpr size_t MAX_UPDATE = size_t(1) << 30;  // EVP lengths are ints
+
+enum Feature : unsigned {
+    FEATURE_AES = 1,
+    FEATURE_CLMUL = 2,
+    FEATURE_AVX2 = 4,
+    FEATURE_VAES = 8,
+    FEATURE_VPCLMUL = 16,
+};
+
+unsigned detect_features() {
+    unsigned features = 0;
+#if defined(__x86_64__) || defined(__i386__)
+    unsigned a, b, c, d;
+    if (__get_cpuid(1, &a, &b, &c, &d)) {
+        if (c & bit_AES) features |= FEATURE_AES;
+        if (c & bit_PCLMUL) features |= FEATURE_CLMUL;
+    }
+    if (__get_cpuid_count(7, 0, &a, &b, &c, &d)) {
+        if (b & bit_AVX2) features |= FEATURE_AVX2;
+        if (c & (1u << 9)) features |= FEATURE_VAES;
+        if (c & (1u << 10)) features |= FEATURE_VPCLMUL;
+    }
+#elif defined(__aarch64__) && defined(__linux__)
+    unsigned long hwcap = getauxval(AT_HWCAP);
+    if (hwcap & HWCAP_AES) features |= FEATURE_AES;
+    if (hwcap & HWCAP_PMULL) features |= FEATURE_CLMUL;
+#endif
+    return features;
+}
+
+const EVP_CIPHER *gcm_cipher() {
+#if OPENSSL_VERSION_NUMBER >= 0x30000000L
+    // Fetched once: handing EVP_aes_256_gcm() to every init would look the
+    // implementation up in the provider again each time
+    static EVP_CIPHER *fetched = EVP_CIPHER_fetch(nullptr, "AES-256-GCM", nullptr);
+    return fetched;
+#else
+    return EVP_aes_256_gcm();
+#endif
+}
+
+struct Key {
+    uint8_t bytes[KEY_SIZE];
+    uint64_t serial;  // Identifies the key to the per-thread contexts
+};
+
+std::atomic<uint64_t> next_serial{1};
+
+enum Direction { SEAL = 0, OPEN = 1 };
+
+struct ThreadContext {
+    EVP_CIPHER_CTX *ctx[2] = {nullptr, nullptr};
+    uint64_t keyed[2] = {0, 0};  // Serial of the key each context holds
+
+    ~ThreadContext() {
+        // Also wipes the key schedules
+        EVP_CIPHER_CTX_free(ctx[SEAL]);
+        EVP_CIPHER_CTX_free(ctx[OPEN]);
+    }
+};
+
+thread_local ThreadContext thread_context;
+
+// Wipe the key schedule in the calling thread's context for dir.
+void forget_key(Direction dir) {
+    ThreadContext &tc = thread_context;
+    if (tc.ctx[dir]) {
+        EVP_CIPHER_CTX_reset(tc.ctx[dir]);
+    }
+    tc.keyed[dir] = 0;
+}
+
+// The calling thread's context for dir, keyed with key and set to nonce.
+EVP_CIPHER_CTX *prepare(Direction dir, const Key &key, const uint8_t *nonce) {
+    ThreadContext &tc = thread_context;
+    if (!tc.ctx[dir] && !(tc.ctx[dir] = EVP_CIPHER_CTX_new())) {
+        return nullptr;
+    }
+    bool rekey = tc.keyed[dir] != key.serial;
+    const EVP_CIPHER *cipher = rekey ? gcm_cipher() : nullptr;
+    const uint8_t *bytes = rekey ? key.bytes : nullptr;
+    int ok = dir == SEAL ? EVP_EncryptInit_ex(tc.ctx[dir], cipher, nullptr, bytes, nonce)
+                         : EVP_DecryptInit_ex(tc.ctx[dir], cipher, nullptr, bytes, nonce);
+    tc.keyed[dir] = ok ? key.serial : 0;
+    return ok ? tc.ctx[dir] : nullptr;
+}
+
+bool update(EVP_CIPHER_CTX *ctx, Direction dir, uint8_t *out, const uint8_t *in, size_t len) {
+    while (len > 0) {
+        int chunk = int(std::min(len, MAX_UPDATE)), written;
+        int ok = dir == SEAL ? EVP_EncryptUpdate(ctx, out, &written, in, chunk)
+                             : EVP_DecryptUpdate(ctx, out, &written, in, chunk);
+        if (!ok) {
+            return false;
+        }
+        in += chunk;
+        out += chunk;
+        len -= chunk;
+    }
+    return true;
+}
+
+// Seal len bytes of in into out (len + TAG_SIZE bytes): ciphertext || tag.
+bool seal(const Key &key, const uint8_t *nonce, const uint8_t *aad, size_t aad_len,
+          const uint8_t *in, size_t len, uint8_t *out) {
+    EVP_CIPHER_CTX *ctx = prepare(SEAL, key, nonce);
+    int written;
+    bool ok = ctx && (aad_len == 0 || EVP_EncryptUpdate(ctx, nullptr, &written, aad, int(aad_len)))
+              && update(ctx, SEAL, out, in, len)
+              && EVP_EncryptFinal_ex(ctx, out + len, &written)
+              && EVP_CIPHER_CTX_ctrl(ctx, EVP_CTRL_GCM_GET_TAG, TAG_SIZE, out + len);
+    if (!ok) {
+        thread_context.keyed[SEAL] = 0;
+    }
+    return ok;
+}
+
+enum Status { OK, AUTHENTICATION_FAILED, OPENSSL_ERROR };
+
+// Open len (>= TAG_SIZE) sealed bytes of in into out; out is wiped on failure.
+Status open(const Key &key, const uint8_t *nonce, const uint8_t *aad, size_t aad_len,
+            const uint8_t *in, size_t len, uint8_t *out) {
+    size_t body = len - TAG_SIZE;
+    EVP_CIPHER_CTX *ctx = prepare(OPEN, key, nonce);
+    int written;
+    bool ok = ctx && (aad_len == 0 || EVP_DecryptUpdate(ctx, nullptr, &written, aad, int(aad_len)))
+              && update(ctx, OPEN, out, in, body)
+              && EVP_CIPHER_CTX_ctrl(ctx, EVP_CTRL_GCM_SET_TAG, TAG_SIZE,
+                                     const_cast<uint8_t *>(in + body));
+    if (!ok) {
+        thread_context.keyed[OPEN] = 0;
+        OPENSSL_cleanse(out, body);
+        return OPENSSL_ERROR;
+    }
+    if (EVP_DecryptFinal_ex(ctx, out + body, &written) <= 0) {
+        OPENSSL_cleanse(out, body);
+        return AUTHENTICATION_FAILED;
+    }
+    return OK;
+}
+
+PyObject *AuthenticationError = nullptr;
+
+PyObject *openssl_error() {
+    PyErr_SetString(PyExc_RuntimeError, "OpenSSL AES-GCM operation failed");
+    return nullptr;
+}
+
+// Py_buffer released when it goes out of scope (with the GIL held).
+struct Buffer {
+    Py_buffer view{};
+    ~Buffer() {
+        if (view.obj) {
+            PyBuffer_Release(&view);
+        }
+    }
+    const uint8_t *data() const { return static_cast<const uint8_t *>(view.buf); }
+    uint8_t *writable() const { return static_cast<uint8_t *>(view.buf); }
+    size_t size() const { return size_t(view.len); }
+};
+
+bool check_nonce(const Buffer &nonce) {
+    if (nonce.size() != NONCE_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "nonce must be 12 bytes");
+        return false;
+    }
+    return true;
+}
+
+bool check_output(const Buffer &out, size_t expected) {
+    if (out.size() != expected) {
+        PyErr_Format(PyExc_ValueError, "output buffer is %zu bytes, expected %zu",
+                     out.size(), expected);
+        return false;
+    }
+    return true;
+}
+
+// --- Aes256Gcm ---------------------------------------------------------
+
+struct GcmObject {
+    PyObject_HEAD
+    Key key;
+};
+
+PyObject *SegmentCipherType = nullptr;
+
+PyObject *gcm_new(PyTypeObject *type, PyObject *args, PyObject *kwargs) {
+    static const char *keywords[] = {"key", nullptr};
+    Buffer key;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*", const_cast<char **>(keywords),
+                                     &key.view)) {
+        return nullptr;
+    }
+    if (key.size() != KEY_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "AES-256-GCM key must be 32 bytes");
+        return nullptr;
+    }
+    auto *self = reinterpret_cast<GcmObject *>(type->tp_alloc(type, 0));
+    if (self) {
+        std::memcpy(self->key.bytes, key.data(), KEY_SIZE);
+        self->key.serial = next_serial++;
+    }
+    return reinterpret_cast<PyObject *>(self);
+}
+
+void gcm_dealloc(PyObject *self) {
+    PyTypeObject *type = Py_TYPE(self);
+    // Calls already reset the contexts they used; this covers one that
+    // failed before it could
+    forget_key(SEAL);
+    forget_key(OPEN);
+    OPENSSL_cleanse(&reinterpret_cast<GcmObject *>(self)->key, sizeof(Key));
+    type->tp_free(self);
+    Py_DECREF(type);
+}
+
+// encrypt/decrypt(nonce, data, associated_data=None) -> bytes
+PyObject *gcm_transform(PyObject *self, PyObject *args, PyObject *kwargs, Direction dir) {
+    static const char *keywords[] = {"nonce", "data", "associated_data", nullptr};
+    Buffer nonce, data, aad;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*y*|z*", const_cast<char **>(keywords),
+                                     &nonce.view, &data.view, &aad.view) || !check_nonce(nonce)) {
+        return nullptr;
+    }
+    if (dir == OPEN && data.size() < TAG_SIZE) {
+        PyErr_SetString(AuthenticationError, "authentication failed");
+        return nullptr;
+    }
+    size_t size = dir == SEAL ? data.size() + TAG_SIZE : data.size() - TAG_SIZE;
+    PyObject *result = PyBytes_FromStringAndSize(nullptr, Py_ssize_t(size));
+    if (!result) {
+        return nullptr;
+    }
+    auto *out = reinterpret_cast<uint8_t *>(PyBytes_AS_STRING(result));
+    const Key &key = reinterpret_cast<GcmObject *>(self)->key;
+    Status status;
+    Py_BEGIN_ALLOW_THREADS
+    if (dir == SEAL) {
+        status = seal(key, nonce.data(), aad.data(), aad.size(), data.data(), data.size(), out)
+                 ? OK : OPENSSL_ERROR;
+    } else {
+        status = open(key, nonce.data(), aad.data(), aad.size(), data.data(), data.size(), out);
+    }
+    forget_key(dir);
+    Py_END_ALLOW_THREADS
+    if (status == OK) {
+        return result;
+    }
+    Py_DECREF(result);
+    if (status == AUTHENTICATION_FAILED) {
+        PyErr_SetString(AuthenticationError, "authentication failed");
+        return nullptr;
+    }
+    return openssl_error();
+}
+
+PyObject *gcm_encrypt(PyObject *self, PyObject *args, PyObject *kwargs) {
+    return gcm_transform(self, args, kwargs, SEAL);
+}
+
+PyObject *gcm_decrypt(PyObject *self, PyObject *args, PyObject *kwargs) {
+    return gcm_transform(self, args, kwargs, OPEN);
+}
+
+// encrypt_into/decrypt_into(nonce, data, associated_data, out) -> None
+PyObject *gcm_transform_into(PyObject *self, PyObject *args, Direction dir) {
+    Buffer nonce, data, aad, out;
+    if (!PyArg_ParseTuple(args, "y*y*z*w*", &nonce.view, &data.view, &aad.view, &out.view)
+        || !check_nonce(nonce)) {
+        return nullptr;
+    }
+    if (dir == OPEN && data.size() < TAG_SIZE) {
+        PyErr_SetString(AuthenticationError, "authentication failed");
+        return nullptr;
+    }
+    if (!check_output(out, dir == SEAL ? data.size() + TAG_SIZE : data.size() - TAG_SIZE)) {
+        return nullptr;
+    }
+    const Key &key = reinterpret_cast<GcmObject *>(self)->key;
+    Status status;
+    Py_BEGIN_ALLOW_THREADS
+    if (dir == SEAL) {
+        status = seal(key, nonce.data(), aad.data(), aad.size(), data.data(), data.size(),
+                      out.writable()) ? OK : OPENSSL_ERROR;
+    } else {
+        status = open(key, nonce.data(), aad.data(), aad.size(), data.data(), data.size(),
+                      out.writable());
+    }
+    forget_key(dir);
+    Py_END_ALLOW_THREADS
+    if (status == AUTHENTICATION_FAILED) {
+        PyErr_SetString(AuthenticationError, "authentication failed");
+        return nullptr;
+    }
+    if (status == OPENSSL_ERROR) {
+        return openssl_error();
+    }
+    Py_RETURN_NONE;
+}
+
+PyObject *gcm_encrypt_into(PyObject *self, PyObject *args) {
+    return gcm_transform_into(self, args, SEAL);
+}
+
+PyObject *gcm_decrypt_into(PyObject *self, PyObject *args) {
+    return gcm_transform_into(self, args, OPEN);
+}
+
+// --- SegmentCipher -----------------------------------------------------
+
+struct SegmentsObject {
+    PyObject_HEAD
+    Key key;
+    PyObject *header;  // bytes
+    uint8_t nonce_prefix[NONCE_PREFIX_SIZE];
+    size_t segment_size;
+};
+
+PyObject *gcm_segment_cipher(PyObject *self, PyObject *args) {
+    Buffer header, prefix;
+    Py_ssize_t segment_size;
+    if (!PyArg_ParseTuple(args, "y*y*n", &header.view, &prefix.view, &segment_size)) {
+        return nullptr;
+    }
+    if (prefix.size() != NONCE_PREFIX_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "nonce prefix must be 7 bytes");
+        return nullptr;
+    }
+    if (segment_size <= 0) {
+        PyErr_SetString(PyExc_ValueError, "segment size must be positive");
+        return nullptr;
+    }
+    auto *type = reinterpret_cast<PyTypeObject *>(SegmentCipherType);
+    auto *runs = reinterpret_cast<SegmentsObject *>(type->tp_alloc(type, 0));
+    if (!runs) {
+        return nullptr;
+    }
+    runs->header = PyBytes_FromStringAndSize(reinterpret_cast<const char *>(header.data()),
+                                             Py_ssize_t(header.size()));
+    if (!runs->header) {
+        Py_DECREF(runs);
+        return nullptr;
+    }
+    // Same serial: runs and single segments share the thread's key schedule
+    runs->key = reinterpret_cast<GcmObject *>(self)->key;
+    std::memcpy(runs->nonce_prefix, prefix.data(), NONCE_PREFIX_SIZE);
+    runs->segment_size = size_t(segment_size);
+    return reinterpret_cast<PyObject *>(runs);
+}
+
+void segments_dealloc(PyObject *self) {
+    PyTypeObject *type = Py_TYPE(self);
+    auto *runs = reinterpret_cast<SegmentsObject *>(self);
+    forget_key(SEAL);
+    forget_key(OPEN);
+    OPENSSL_cleanse(&runs->key, sizeof(Key));
+    Py_XDECREF(runs->header);
+    type->tp_free(self);
+    Py_DECREF(type);
+}
+
+// Number of segments in a run of len bytes made of unit-byte pieces, or -1
+// with an exception set.
+Py_ssize_t run_count(size_t len, size_t unit, bool last, uint64_t first_index) {
+    size_t count = len == 0 ? size_t(last) : (len + unit - 1) / unit;
+    if (first_index > MAX_SEGMENTS || count > MAX_SEGMENTS - first_index) {
+        PyErr_SetString(PyExc_ValueError, "File too large for the segmented format");
+        return -1;
+    }
+    return Py_ssize_t(count);
+}
+
+Py_ssize_t sealed_count(const SegmentsObject *runs, size_t len, bool last, uint64_t first) {
+    if (!last && len % runs->segment_size != 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "a run that does not end the file must hold whole segments");
+        return -1;
+    }
+    return run_count(len, runs->segment_size, last, first);
+}
+
+// Segments of a sealed run (setting *plain to their plaintext size), or -1.
+Py_ssize_t opened_count(const SegmentsObject *runs, size_t len, bool last, uint64_t first,
+                        size_t *plain) {
+    size_t sealed = runs->segment_size + TAG_SIZE;
+    Py_ssize_t count = run_count(len, sealed, last, first);
+    if (count < 0) {
+        return -1;
+    }
+    bool whole = last || len % sealed == 0;
+    // Every piece, including a short final one, must hold at least a tag
+    if (!whole || len < size_t(count) * TAG_SIZE
+        || (count > 0 && (len - 1) % sealed + 1 < TAG_SIZE)) {
+        PyErr_SetString(PyExc_ValueError, "Invalid encrypted file: truncated segment");
+        return -1;
+    }
+    *plain = len - size_t(count) * TAG_SIZE;
+    return count;
+}
+
+// Seal or open count consecutive segments without the GIL. Returns OK, or
+// the failure with *failed set to the index of the segment that failed.
+Status run_segments(const SegmentsObject *runs, Direction dir, uint64_t first,
+                    const uint8_t *in, size_t len, bool last, size_t count, uint8_t *out,
+                    uint8_t *aad, uint64_t *failed) {
+    const size_t header_len = size_t(PyBytes_GET_SIZE(runs->header));
+    const size_t piece = dir == SEAL ? runs->segment_size : runs->segment_size + TAG_SIZE;
+    std::memcpy(aad, PyBytes_AS_STRING(runs->header), header_len);
+    uint8_t nonce[NONCE_SIZE];
+    std::memcpy(nonce, runs->nonce_prefix, NONCE_PREFIX_SIZE);
+    for (size_t i = 0; i < count; i++) {
+        uint64_t index = first + i;
+        uint8_t final_flag = last && i + 1 == count;
+        for (int b = 0; b < 4; b++) {
+            nonce[NONCE_PREFIX_SIZE + b] = uint8_t(index >> (8 * (3 - b)));
+        }
+        nonce[NONCE_SIZE - 1] = final_flag;
+        for (int b = 0; b < 8; b++) {
+            aad[header_len + b] = uint8_t(index >> (8 * (7 - b)));
+        }
+        aad[header_len + 8] = final_flag;
+        size_t take = std::min(len, piece);
+        Status status;
+        if (dir == SEAL) {
+            status = seal(runs->key, nonce, aad, header_len + 9, in, take, out) ? OK : OPENSSL_ERROR;
+            out += take + TAG_SIZE;
+        } else {
+            status = open(runs->key, nonce, aad, header_len + 9, in, take, out);
+            out += take - TAG_SIZE;
+        }
+        if (status != OK) {
+            *failed = index;
+            return status;
+        }
+        in += take;
+        len -= take;
+    }
+    return OK;
+}
+
+// seal/open(first_index, data, last) -> bytes and
+// seal_into/open_into(first_index, data, last, out) -> None
+PyObject *segments_transform(PyObject *self, PyObject *args, Direction dir, bool into) {
+    auto *runs = reinterpret_cast<SegmentsObject *>(self);
+    unsigned long long first;
+    Buffer data, out;
+    int last;
+    if (into ? !PyArg_ParseTuple(args, "Ky*pw*", &first, &data.view, &last, &out.view)
+             : !PyArg_ParseTuple(args, "Ky*p", &first, &data.view, &last)) {
+        return nullptr;
+    }
+    size_t size = 0;
+    Py_ssize_t count = dir == SEAL ? sealed_count(runs, data.size(), last, first)
+                                   : opened_count(runs, data.size(), last, first, &size);
+    if (count < 0) {
+        return nullptr;
+    }
+    if (dir == SEAL) {
+        size = data.size() + size_t(count) * TAG_SIZE;
+    }
+    PyObject *result = nullptr;
+    uint8_t *target;
+    if (into) {
+        if (!check_output(out, size)) {
+            return nullptr;
+        }
+        target = out.writable();
+    } else {
+        if (!(result = PyBytes_FromStringAndSize(nullptr, Py_ssize_t(size)))) {
+            return nullptr;
+        }
+        target = reinterpret_cast<uint8_t *>(PyBytes_AS_STRING(result));
+    }
+    std::vector<uint8_t> aad;
+    try {
+        aad.resize(size_t(PyBytes_GET_SIZE(runs->header)) + 9);
+    } catch (const std::bad_alloc &) {
+        Py_XDECREF(result);
+        return PyErr_NoMemory();
+    }
+    uint64_t failed = 0;
+    Status status;
+    Py_BEGIN_ALLOW_THREADS
+    status = run_segments(runs, dir, first, data.data(), data.size(), last, size_t(count),
+                          target, aad.data(), &failed);
+    forget_key(dir);
+    Py_END_ALLOW_THREADS
+    if (status == OK) {
+        if (result) {
+            return result;
+        }
+        Py_RETURN_NONE;
+    }
+    Py_XDECREF(result);
+    if (status == AUTHENTICATION_FAILED) {
+        PyObject *index = PyLong_FromUnsignedLongLong(failed);
+        if (index) {
+            PyErr_SetObject(AuthenticationError, index);
+            Py_DECREF(index);
+        }
+        return nullptr;
+    }
+    return openssl_error();
+}
+
+PyObject *segments_seal(PyObject *self, PyObject *args) {
+    return segments_transform(self, args, SEAL, false);
+}
+
+PyObject *segments_open(PyObject *self, PyObject *args) {
+    return segments_transform(self, args, OPEN, false);
+}
+
+PyObject *segments_seal_into(PyObject *self, PyObject *args) {
+    return segments_transform(self, args, SEAL, true);
+}
+
+PyObject *segments_open_into(PyObject *self, PyObject *args) {
+    return segments_transform(self, args, OPEN, true);
+}
+
+PyObject *segments_get_segment_size(PyObject *self, void *) {
+    return PyLong_FromSize_t(reinterpret_cast<SegmentsObject *>(self)->segment_size);
+}
+
+}  // namespace
+
+// C++ entry point for callers outside Python.
 class HardwareAccelerator {
 public:
+    static unsigned cpuFeatures() {
+        static const unsigned features = detect_features();
+        return features;
+    }
+
+    static bool hasHardwareAes() {
+        return (cpuFeatures() & (FEATURE_AES | FEATURE_CLMUL)) == (FEATURE_AES | FEATURE_CLMUL);
+    }
+
+    // Seal data under a 32-byte key and 12-byte iv: ciphertext || tag.
     static std::vector<uint8_t> aesniEncrypt(
         const std::vector<uint8_t>& data,
         const std::vector<uint8_t>& key,
         const std::vector<uint8_t>& iv
     ) {
-        EVP_CIPHER_CTX *ctx = EVP_CIPHER_CTX_new();
-        std::vector<uint8_t> encrypted;
-        
-        if (!ctx) {
-            throw std::runtime_error("Failed to create cipher context");
-        }
-        
-        if (!EVP_EncryptInit_ex(ctx, EVP_aes_256_gcm(), nullptr, key.data(), iv.data())) {
-            EVP_CIPHER_CTX_free(ctx);
-            throw std::runtime_error("Failed to initialize encryption");
-        }
-        
-        // Implementation details...
-        
+        if (key.size() != KEY_SIZE || iv.size() != NONCE_SIZE) {
+            throw std::invalid_argument("AES-256-GCM needs a 32-byte key and a 12-byte IV");
+        }
+        Key k;
+        std::memcpy(k.bytes, key.data(), KEY_SIZE);
+        k.serial = next_serial++;
+        std::vector<uint8_t> encrypted(data.size() + TAG_SIZE);
+        bool ok = seal(k, iv.data(), nullptr, 0, data.data(), data.size(), encrypted.data());
+        forget_key(SEAL);
+        OPENSSL_cleanse(k.bytes, KEY_SIZE);
+        if (!ok) {
+            throw std::runtime_error("AES-GCM encryption failed");
+        }
         return encrypted;
     }
-}; 
\ No newline at end of file
+};
+
+namespace {
+
+PyObject *cpu_features(PyObject *, PyObject *) {
+    static const struct { unsigned bit; const char *name; } names[] = {
+        {FEATURE_AES, "aes"}, {FEATURE_CLMUL, "pclmul"}, {FEATURE_AVX2, "avx2"},
+        {FEATURE_VAES, "vaes"}, {FEATURE_VPCLMUL, "vpclmulqdq"},
+    };
+    PyObject *result = PyList_New(0);
+    unsigned features = HardwareAccelerator::cpuFeatures();
+    for (const auto &entry : names) {
+        if (!(features & entry.bit)) {
+            continue;
+        }
+        PyObject *name = PyUnicode_FromString(entry.name);
+        if (!name || PyList_Append(result, name) < 0) {
+            Py_XDECREF(name);
+            Py_DECREF(result);
+            return nullptr;
+        }
+        Py_DECREF(name);
+    }
+    return result;
+}
+
+PyObject *hardware_aes(PyObject *, PyObject *) {
+    return PyBool_FromLong(HardwareAccelerator::hasHardwareAes());
+}
+
+PyObject *openssl_version(PyObject *, PyObject *) {
+    return PyUnicode_FromString(OpenSSL_version(OPENSSL_VERSION));
+}
+
+constexpr Py_ssize_t GEAR_WINDOW = 32;  // Bytes a 32-bit gear hash depends on
+
+// FastCDC boundary search of file_encryptor_dedup.ChunkStore; a line-by-line
+// port of _find_boundary there, which stays the reference.
+Py_ssize_t gear_boundary(const uint8_t *data, Py_ssize_t start, Py_ssize_t end,
+                         Py_ssize_t min_size, Py_ssize_t avg_size, const uint32_t *gear,
+                         uint32_t strict, uint32_t loose) {
+    if (end - start <= min_size) {
+        return end;
+    }
+    uint32_t h = 0;
+    Py_ssize_t position = start + min_size;
+    for (Py_ssize_t i = position - GEAR_WINDOW; i < position; ++i) {
+        h = (h << 1) + gear[data[i]];
+    }
+    Py_ssize_t norm = std::min(end, start + avg_size);
+    while (position < norm) {
+        h = (h << 1) + gear[data[position++]];
+        if (!(h & strict)) {
+            return position;
+        }
+    }
+    while (position < end) {
+        h = (h << 1) + gear[data[position++]];
+        if (!(h & loose)) {
+            return position;
+        }
+    }
+    return end;
+}
+
+PyObject *find_boundary(PyObject *, PyObject *args) {
+    Buffer data;
+    Py_ssize_t start, end, min_size, avg_size;
+    PyObject *gear_seq;
+    unsigned int strict, loose;
+    if (!PyArg_ParseTuple(args, "y*nnnnOII", &data.view, &start, &end, &min_size, &avg_size,
+                          &gear_seq, &strict, &loose)) {
+        return nullptr;
+    }
+    if (start < 0 || end < start || end > data.view.len || min_size < GEAR_WINDOW
+        || avg_size < min_size) {
+        PyErr_SetString(PyExc_ValueError, "chunk bounds out of range");
+        return nullptr;
+    }
+    uint32_t gear[256];
+    PyObject *items = PySequence_Fast(gear_seq, "gear must be a sequence of 256 integers");
+    if (!items) {
+        return nullptr;
+    }
+    if (PySequence_Fast_GET_SIZE(items) != 256) {
+        Py_DECREF(items);
+        PyErr_SetString(PyExc_ValueError, "gear must be a sequence of 256 integers");
+        return nullptr;
+    }
+    for (Py_ssize_t i = 0; i < 256; ++i) {
+        unsigned long value = PyLong_AsUnsignedLong(PySequence_Fast_GET_ITEM(items, i));
+        if (value == static_cast<unsigned long>(-1) && PyErr_Occurred()) {
+            Py_DECREF(items);
+            return nullptr;
+        }
+        gear[i] = uint32_t(value);
+    }
+    Py_DECREF(items);
+    Py_ssize_t cut;
+    Py_BEGIN_ALLOW_THREADS
+    cut = gear_boundary(data.data(), start, end, min_size, avg_size, gear, strict, loose);
+    Py_END_ALLOW_THREADS
+    return PyLong_FromSsize_t(cut);
+}
+
+PyMethodDef gcm_methods[] = {
+    {"encrypt", reinterpret_cast<PyCFunction>(reinterpret_cast<void (*)(void)>(gcm_encrypt)),
+     METH_VARARGS | METH_KEYWORDS, "encrypt(nonce, data, associated_data=None) -> ciphertext || tag"},
+    {"decrypt", reinterpret_cast<PyCFunction>(reinterpret_cast<void (*)(void)>(gcm_decrypt)),
+     METH_VARARGS | METH_KEYWORDS,
+     "decrypt(nonce, data, associated_data=None) -> plaintext; AuthenticationError if forged"},
+    {"encrypt_into", gcm_encrypt_into, METH_VARARGS,
+     "encrypt_into(nonce, data, associated_data, out): out is len(data) + 16 bytes"},
+    {"decrypt_into", gcm_decrypt_into, METH_VARARGS,
+     "decrypt_into(nonce, data, associated_data, out): out is len(data) - 16 bytes"},
+    {"segment_cipher", gcm_segment_cipher, METH_VARARGS,
+     "segment_cipher(header, nonce_prefix, segment_size) -> SegmentCipher"},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyType_Slot gcm_slots[] = {
+    {Py_tp_doc, const_cast<char *>("Aes256Gcm(key): AES-256-GCM with the interface of "
+                                   "cryptography's AESGCM")},
+    {Py_tp_new, reinterpret_cast<void *>(gcm_new)},
+    {Py_tp_dealloc, reinterpret_cast<void *>(gcm_dealloc)},
+    {Py_tp_methods, gcm_methods},
+    {0, nullptr},
+};
+
+PyType_Spec gcm_spec = {
+    "solace_accel.Aes256Gcm", sizeof(GcmObject), 0, Py_TPFLAGS_DEFAULT, gcm_slots,
+};
+
+PyMethodDef segments_methods[] = {
+    {"seal", segments_seal, METH_VARARGS,
+     "seal(first_index, data, last) -> the segments of data, sealed and concatenated"},
+    {"open", segments_open, METH_VARARGS,
+     "open(first_index, data, last) -> plaintext; AuthenticationError(index) if one fails"},
+    {"seal_into", segments_seal_into, METH_VARARGS, "seal_into(first_index, data, last, out)"},
+    {"open_into", segments_open_into, METH_VARARGS, "open_into(first_index, data, last, out)"},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyGetSetDef segments_getset[] = {
+    {"segment_size", segments_get_segment_size, nullptr, nullptr, nullptr},
+    {nullptr, nullptr, nullptr, nullptr, nullptr},
+};
+
+PyObject *segments_new(PyTypeObject *, PyObject *, PyObject *) {
+    PyErr_SetString(PyExc_TypeError, "use Aes256Gcm.segment_cipher()");
+    return nullptr;
+}
+
+PyType_Slot segments_slots[] = {
+    {Py_tp_doc, const_cast<char *>("Seals and opens runs of consecutive segments of one file")},
+    {Py_tp_new, reinterpret_cast<void *>(segments_new)},
+    {Py_tp_dealloc, reinterpret_cast<void *>(segments_dealloc)},
+    {Py_tp_methods, segments_methods},
+    {Py_tp_getset, segments_getset},
+    {0, nullptr},
+};
+
+#ifndef Py_TPFLAGS_DISALLOW_INSTANTIATION
+#define Py_TPFLAGS_DISALLOW_INSTANTIATION 0  // Before 3.10; see segments_new
+#endif
+
+PyType_Spec segments_spec = {
+    "solace_accel.SegmentCipher", sizeof(SegmentsObject), 0,
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_DISALLOW_INSTANTIATION, segments_slots,
+};
+
+PyMethodDef module_methods[] = {
+    {"cpu_features", cpu_features, METH_NOARGS, "Names of the AES-related CPU features present"},
+    {"hardware_aes", hardware_aes, METH_NOARGS,
+     "Whether the CPU has AES and carry-less multiply instructions"},
+    {"openssl_version", openssl_version, METH_NOARGS, "Version of the linked OpenSSL"},
+    {"find_boundary", find_boundary, METH_VARARGS,
+     "find_boundary(data, start, end, min_size, avg_size, gear, strict, loose) -> "
+     "end of the content-defined chunk starting at start"},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyModuleDef module_def = {
+    PyModuleDef_HEAD_INIT, "solace_accel",
+    "Multi-buffer AES-256-GCM over OpenSSL EVP for SolaceCrypt", -1, module_methods,
+};
+
+}  // namespace
+
+PyMODINIT_FUNC PyInit_solace_accel(void) {
+    if (!gcm_cipher()) {
+        PyErr_SetString(PyExc_ImportError, "OpenSSL has no AES-256-GCM");
+        return nullptr;
+    }
+    PyObject *module = PyModule_Create(&module_def);
+    if (!module) {
+        return nullptr;
+    }
+    PyObject *gcm_type = PyType_FromSpec(&gcm_spec);
+    SegmentCipherType = PyType_FromSpec(&segments_spec);
+    AuthenticationError = PyErr_NewExceptionWithDoc(
+        "solace_accel.AuthenticationError",
+        "A tag did not verify; SegmentCipher.open passes the failing segment index",
+        PyExc_ValueError, nullptr);
+    if (!gcm_type || !SegmentCipherType || !AuthenticationError
+        || PyModule_AddObject(module, "Aes256Gcm", gcm_type) < 0) {
+        Py_XDECREF(gcm_type);
+        Py_DECREF(module);
+        return nullptr;
+    }
+    Py_INCREF(SegmentCipherType);
+    Py_INCREF(AuthenticationError);
+    if (PyModule_AddObject(module, "SegmentCipher", SegmentCipherType) < 0
+        || PyModule_AddObject(module, "AuthenticationError", AuthenticationError) < 0) {
+        Py_DECREF(module);
+        return nullptr;
+    }
+    return module;
+}
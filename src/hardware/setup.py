@@ -0,0 +1,15 @@
+from setuptools import Extension, setup
+
+# Optional native AES-GCM backend; see acceleration.cpp.
+# Needs a C++17 compiler and the OpenSSL headers (libssl-dev / openssl-devel).
+setup(
+    name='solace_accel',
+    version='0.1.0',
+    description='Multi-buffer AES-256-GCM over OpenSSL EVP for SolaceCrypt',
+    ext_modules=[
+        Extension('solace_accel', ['acceleration.cpp'],
+                  libraries=['crypto'],
+                  language='c++',
+                  extra_compile_args=['-std=c++17', '-O3']),
+    ],
+)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from file_encryptor import KDFParams, SecureFileEncryptor
+from file_encryptor_backends import BACKEND_ENV, registry
+
+# The cheapest KDF _check_kdf accepts; the tests are about the container
+FAST_KDF = KDFParams(SecureFileEncryptor.KDF_PBKDF2, 1000)
+PASSPHRASE = 'correct horse battery staple'
+
+@pytest.fixture
+def encryptor_factory():
+    """SecureFileEncryptor with small segments and a fast KDF unless overridden."""
+    def make(**kwargs):
+        kwargs.setdefault('segment_size', 4096)
+        kwargs.setdefault('kdf', FAST_KDF)
+        return SecureFileEncryptor(**kwargs)
+    return make
+
+@pytest.fixture(params=['openssl', 'accel', 'pycryptodome'])
+def backend(request, monkeypatch):
+    """Force each cipher backend in turn; skipped where it is not installed."""
+    monkeypatch.setenv(BACKEND_ENV, request.param)
+    registry._status = None
+    try:
+        registry.probe()
+    except ValueError as e:
+        registry._status = None
+        pytest.skip(str(e))
+    yield request.param
+    registry._status = None
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import PASSPHRASE, REPO_ROOT
+from file_encryptor_archive import (EncryptedArchive, create_archive, member_name,
+                                    tree_sources)
+
+@pytest.fixture
+def tree(tmp_path):
+    """A small directory tree; maps member names to contents."""
+    root = tmp_path / 'tree'
+    contents = {
+        'empty': b'',
+        'small.txt': b'hello',
+        'sub/large.bin': os.urandom(5 * 4096 + 7),
+        'sub/deeper/zeros': bytes(3 * 4096),
+    }
+    for name, data in contents.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    os.chmod(root / 'small.txt', 0o640)
+    os.utime(root / 'small.txt', ns=(1_000_000_000, 1_500_000_000))
+    return root, contents
+
+@pytest.fixture
+def archive(tmp_path, tree, encryptor_factory):
+    root, contents = tree
+    path = str(tmp_path / 'tree.enc')
+    members = create_archive(encryptor_factory(), path, tree_sources(str(root)), PASSPHRASE)
+    assert sorted(member.name for member in members) == sorted(contents)
+    return path, contents
+
+def test_members_and_reads(backend, archive, encryptor_factory):
+    path, contents = archive
+    with EncryptedArchive(path, PASSPHRASE, encryptor_factory()) as opened:
+        assert sorted(member.name for member in opened.members) == sorted(contents)
+        for name, data in contents.items():
+            assert opened.getmember(name).size == len(data)
+            assert opened.read(name) == data
+        # Chunks that straddle segment boundaries
+        assert b''.join(opened.iter_member('sub/large.bin', 1000)) == contents['sub/large.bin']
+
+def test_extractall(archive, tmp_path, encryptor_factory):
+    path, contents = archive
+    dest = tmp_path / 'dest'
+    with EncryptedArchive(path, PASSPHRASE, encryptor_factory()) as opened:
+        opened.extractall(str(dest))
+    for name, data in contents.items():
+        assert (dest / name).read_bytes() == data
+    st = os.stat(dest / 'small.txt')
+    assert st.st_mode & 0o777 == 0o640
+    assert st.st_mtime_ns == 1_500_000_000
+    assert [name for _, _, files in os.walk(dest) for name in files
+            if name.endswith('.part')] == []
+
+def test_missing_member(archive, encryptor_factory):
+    path, _ = archive
+    with EncryptedArchive(path, PASSPHRASE, encryptor_factory()) as opened:
+        with pytest.raises(KeyError):
+            opened.getmember('nope')
+
+def test_wrong_password(archive, encryptor_factory):
+    path, _ = archive
+    with pytest.raises(ValueError, match='Wrong password'):
+        EncryptedArchive(path, 'not the passphrase', encryptor_factory())
+
+def test_modified_archive(backend, archive, encryptor_factory):
+    path, _ = archive
+    raw = bytearray(open(path, 'rb').read())
+    raw[-30] ^= 0x01  # Inside the sealed index
+    with open(path, 'wb') as f:
+        f.write(raw)
+    with pytest.raises(ValueError):
+        EncryptedArchive(path, PASSPHRASE, encryptor_factory())
+
+def test_duplicate_member_leaves_no_archive(tmp_path, tree, encryptor_factory):
+    root, _ = tree
+    path = tmp_path / 'dup.enc'
+    sources = [(str(root / 'small.txt'), 'a'), (str(root / 'empty'), './a')]
+    with pytest.raises(ValueError, match='Duplicate archive member'):
+        create_archive(encryptor_factory(), str(path), sources, PASSPHRASE)
+    assert not path.exists()
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.part')] == []
+
+@pytest.mark.parametrize('name, expected', [
+    ('a/b', 'a/b'), ('/abs/path', 'abs/path'), ('a//./b', 'a/b'), ('a/../b', 'b'),
+])
+def test_member_name(name, expected):
+    assert member_name(name) == expected
+
+@pytest.mark.parametrize('name', ['', '.', '..', '../x', 'a/../../x', '/'])
+def test_member_name_rejected(name):
+    with pytest.raises(ValueError):
+        member_name(name)
+
+def test_cli_skips_archive_written_into_its_source(tree, tmp_path):
+    root, contents = tree
+    archive = root / 'backup.enc'
+    cli = [sys.executable, os.path.join(REPO_ROOT, 'file_encryptor.py'), '-q']
+    env = dict(os.environ, HOME=str(tmp_path))
+    for _ in range(2):  # The second run finds the first run's archive
+        subprocess.run(cli + ['-e', '-r', str(root), '--archive', str(archive)],
+                       input=PASSPHRASE + '\n', capture_output=True, text=True,
+                       env=env, check=True)
+    listing = subprocess.run(cli + ['--list', '--archive', str(archive)],
+                             input=PASSPHRASE + '\n', capture_output=True, text=True,
+                             env=env, check=True).stdout
+    names = [line.split()[-1] for line in listing.splitlines() if line.strip()]
+    assert sorted(names) == sorted(contents)
+
+def test_cli_archives_encrypted_files_in_the_tree(tree, tmp_path):
+    root, contents = tree
+    (root / 'sub' / 'old.enc').write_bytes(b'already encrypted')
+    archive = tmp_path / 'backup.enc'
+    cli = [sys.executable, os.path.join(REPO_ROOT, 'file_encryptor.py'), '-q']
+    env = dict(os.environ, HOME=str(tmp_path))
+    subprocess.run(cli + ['-e', '-r', str(root), '--archive', str(archive)],
+                   input=PASSPHRASE + '\n', capture_output=True, text=True, env=env, check=True)
+    listing = subprocess.run(cli + ['--list', '--archive', str(archive)],
+                             input=PASSPHRASE + '\n', capture_output=True, text=True,
+                             env=env, check=True).stdout
+    names = [line.split()[-1] for line in listing.splitlines() if line.strip()]
+    assert sorted(names) == sorted([*contents, 'sub/old.enc'])
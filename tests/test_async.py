@@ -0,0 +1,141 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import SecureFileEncryptor
+from file_encryptor_async import AsyncSecureFileEncryptor
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+@pytest.fixture
+def plain(tmp_path):
+    data = os.urandom(1024 * 4096 + 5)
+    (tmp_path / 'plain').write_bytes(data)
+    return data
+
+def test_round_trip(tmp_path, plain, encryptor_factory):
+    async_encryptor = AsyncSecureFileEncryptor(encryptor_factory())
+
+    async def main():
+        await async_encryptor.encrypt_file_async(str(tmp_path / 'plain'),
+                                                 str(tmp_path / 'plain.enc'), PASSPHRASE)
+        await async_encryptor.decrypt_file_async(str(tmp_path / 'plain.enc'),
+                                                 str(tmp_path / 'out'), PASSPHRASE)
+    asyncio.run(main())
+    assert (tmp_path / 'out').read_bytes() == plain
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc')
+@pytest.mark.parametrize('operation', ['encrypt', 'decrypt'])
+def test_cancellation_leaves_nothing_behind(tmp_path, plain, encryptor_factory, operation):
+    encryptor = encryptor_factory()
+    encryptor.encrypt_file(str(tmp_path / 'plain'), str(tmp_path / 'plain.enc'), PASSPHRASE)
+    async_encryptor = AsyncSecureFileEncryptor(encryptor)
+    if operation == 'encrypt':
+        call = async_encryptor.encrypt_file_async
+        source, target = tmp_path / 'plain', tmp_path / 'again.enc'
+    else:
+        call = async_encryptor.decrypt_file_async
+        source, target = tmp_path / 'plain.enc', tmp_path / 'out'
+
+    async def cancel_after(delay: float, twice: bool) -> bool:
+        task = asyncio.ensure_future(call(str(source), str(target), PASSPHRASE))
+        await asyncio.sleep(delay)
+        task.cancel()
+        if twice:
+            await asyncio.sleep(0)
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    before = open_fds()
+    # From before the file is opened to after the last segment
+    for delay in (0, 0.001, 0.003, 0.01, 0.03, 0.1, 1):
+        for twice in (False, True):
+            cancelled = asyncio.run(cancel_after(delay, twice))
+            leftovers = [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+            assert leftovers == []
+            if target.exists():
+                # Finished first, or cancelled during the final rename
+                if operation == 'encrypt':
+                    encryptor.decrypt_file(str(target), str(tmp_path / 'check'), PASSPHRASE)
+                    assert (tmp_path / 'check').read_bytes() == plain
+                else:
+                    assert target.read_bytes() == plain
+                target.unlink()
+            else:
+                assert cancelled
+    assert open_fds() == before
+
+class BytesReader:
+    """Minimal async reader returning data in small, uneven pieces."""
+
+    def __init__(self, data):
+        self.data, self.pos = data, 0
+
+    async def read(self, n):
+        n = min(n, 1000)
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        return chunk
+
+class BytesWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+@pytest.mark.parametrize('options', [{}, {'compression': 'zlib'}])
+@pytest.mark.parametrize('size', [0, 4096, 3 * 4096 + 5])
+def test_streams_match_the_blocking_format(encryptor_factory, options, size):
+    encryptor = encryptor_factory(**options)
+    async_encryptor = AsyncSecureFileEncryptor(encryptor)
+    data = os.urandom(size // 2) + bytes(size - size // 2)
+    sealed = BytesWriter()
+    asyncio.run(async_encryptor.encrypt_stream(BytesReader(data), sealed, PASSPHRASE))
+    opened = io.BytesIO()
+    encryptor.decrypt_stream(io.BytesIO(bytes(sealed.data)), opened, PASSPHRASE)
+    assert opened.getvalue() == data
+
+    resealed = io.BytesIO()
+    encryptor.encrypt_stream(io.BytesIO(data), resealed, PASSPHRASE)
+    reopened = BytesWriter()
+    asyncio.run(async_encryptor.decrypt_stream(BytesReader(resealed.getvalue()), reopened,
+                                               PASSPHRASE))
+    assert reopened.data == data
+
+def test_truncated_compressed_stream(encryptor_factory):
+    encryptor = encryptor_factory(compression='zlib')
+    sealed = io.BytesIO()
+    encryptor.encrypt_stream(io.BytesIO(os.urandom(3 * 4096)), sealed, PASSPHRASE)
+    with pytest.raises(ValueError, match='truncated'):
+        asyncio.run(AsyncSecureFileEncryptor(encryptor).decrypt_stream(
+            BytesReader(sealed.getvalue()[:-100]), BytesWriter(), PASSPHRASE))
+
+def legacy_file(encryptor, data):
+    # salt | nonce | AES-GCM(data) under the fixed PBKDF2 parameters
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    salt, nonce = os.urandom(16), os.urandom(12)
+    key = encryptor._derive_key(PASSPHRASE, salt, SecureFileEncryptor.LEGACY_KDF)
+    return salt + nonce + AESGCM(bytes(key)).encrypt(nonce, data, None)
+
+def test_legacy_stream(encryptor_factory):
+    encryptor, data = encryptor_factory(), os.urandom(5000)
+    out = BytesWriter()
+    asyncio.run(AsyncSecureFileEncryptor(encryptor).decrypt_stream(
+        BytesReader(legacy_file(encryptor, data)), out, PASSPHRASE))
+    assert out.data == data
+
+def test_legacy_file(tmp_path, encryptor_factory):
+    encryptor, data = encryptor_factory(), os.urandom(5000)
+    (tmp_path / 'legacy.enc').write_bytes(legacy_file(encryptor, data))
+    asyncio.run(AsyncSecureFileEncryptor(encryptor).decrypt_file_async(
+        str(tmp_path / 'legacy.enc'), str(tmp_path / 'out'), PASSPHRASE))
+    assert (tmp_path / 'out').read_bytes() == data
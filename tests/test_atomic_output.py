@@ -0,0 +1,83 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import (CancellationToken, OperationCancelled, _atomic_output,
+                            _create_partial, _is_partial)
+
+def test_replaces_target_on_success(tmp_path):
+    target = tmp_path / 'out'
+    target.write_bytes(b'old')
+    with _atomic_output(str(target)) as partial:
+        assert _is_partial(partial, str(target))
+        assert stat.S_IMODE(os.stat(partial).st_mode) == 0o600
+        assert target.read_bytes() == b'old'
+        with open(partial, 'wb') as f:
+            f.write(b'new')
+    assert target.read_bytes() == b'new'
+    assert os.listdir(tmp_path) == ['out']
+
+@pytest.mark.parametrize('error', [ValueError, KeyboardInterrupt])
+def test_failure_keeps_target_and_removes_partial(tmp_path, error):
+    target = tmp_path / 'out'
+    target.write_bytes(b'old')
+    with pytest.raises(error):
+        with _atomic_output(str(target)) as partial:
+            with open(partial, 'wb') as f:
+                f.write(b'half')
+            raise error()
+    assert target.read_bytes() == b'old'
+    assert os.listdir(tmp_path) == ['out']
+
+def test_concurrent_writers_get_their_own_partial(tmp_path):
+    target = str(tmp_path / 'out')
+    with _atomic_output(target) as first, _atomic_output(target) as second:
+        assert first != second
+        for partial, data in ((first, b'first'), (second, b'second')):
+            with open(partial, 'wb') as f:
+                f.write(data)
+    # The last to finish wins, whole
+    assert (tmp_path / 'out').read_bytes() == b'first'
+    assert os.listdir(tmp_path) == ['out']
+
+def test_concurrent_encryptions_of_one_target(tmp_path, encryptor_factory):
+    sources = []
+    for n in range(8):
+        source = tmp_path / f'plain{n}'
+        source.write_bytes(os.urandom(5 * 4096 + n))
+        sources.append(source)
+    target = str(tmp_path / 'out.enc')
+    encryptor = encryptor_factory(workers=2)
+    threads = [threading.Thread(target=encryptor.encrypt_file,
+                                args=(str(source), target, PASSPHRASE))
+               for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    encryptor.decrypt_file(target, str(tmp_path / 'out'), PASSPHRASE)
+    assert (tmp_path / 'out').read_bytes() in [source.read_bytes() for source in sources]
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.part')] == []
+
+def test_cancelled_encryption_leaves_nothing(tmp_path, encryptor_factory):
+    source = tmp_path / 'plain'
+    source.write_bytes(os.urandom(10 * 4096))
+    target = tmp_path / 'plain.enc'
+    target.write_bytes(b'previous')
+    cancel = CancellationToken()
+    cancel.cancel()
+    with pytest.raises(OperationCancelled):
+        encryptor_factory().encrypt_file(str(source), str(target), PASSPHRASE, cancel=cancel)
+    assert target.read_bytes() == b'previous'
+    assert sorted(os.listdir(tmp_path)) == ['plain', 'plain.enc']
+
+def test_is_partial(tmp_path):
+    target = str(tmp_path / 'archive.enc')
+    partial = _create_partial(target)
+    assert _is_partial(partial, target)
+    assert not _is_partial(target, target)
+    assert not _is_partial(str(tmp_path / 'archive.enc.part'), str(tmp_path / 'other'))
+    assert not _is_partial(str(tmp_path / 'sub' / os.path.basename(partial)), target)
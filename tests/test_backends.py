@@ -0,0 +1,39 @@
+import os
+import struct
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from file_encryptor_backends import BACKEND_ENV, _segment_calls, register_backend, registry
+
+def test_benchmark_calls_produce_the_container_format(backend):
+    key, header, prefix, size = os.urandom(32), os.urandom(40), os.urandom(7), 4096
+    data = os.urandom(5 * size + 9)
+    reference = AESGCM(key)
+    expected = b''.join(
+        reference.encrypt(prefix + struct.pack('>IB', index, last), data[start:start + size],
+                          header + struct.pack('>QB', index, last))
+        for index, start in enumerate(range(0, len(data), size))
+        for last in [start + size >= len(data)])
+    cipher = registry._factories[backend](key)
+    seal, open_ = _segment_calls(cipher, header, prefix, size)
+    sealed, opened = bytearray(len(expected)), bytearray(len(data))
+    with memoryview(sealed) as out:
+        seal(memoryview(data), out)
+    assert sealed == expected
+    with memoryview(opened) as out:
+        open_(memoryview(expected), out)
+    assert opened == data
+
+def test_register_backend_passes_automatic_through(monkeypatch):
+    monkeypatch.setattr(registry, '_loaders', dict(registry._loaders))
+    monkeypatch.delenv(BACKEND_ENV, raising=False)
+    register_backend('opt-in', lambda: AESGCM, 'test backend', automatic=False)
+    try:
+        status = {s.name: s for s in registry.probe()}
+        assert not status['opt-in'].available and 'opt-in' in status['opt-in'].reason
+        assert 'opt-in' not in registry.selected().values()
+        monkeypatch.setenv(BACKEND_ENV, 'opt-in')
+        registry._status = None
+        assert set(registry.selected().values()) == {'opt-in'}
+    finally:
+        registry._status = None
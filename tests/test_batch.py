@@ -0,0 +1,71 @@
+import argparse
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import PASSPHRASE, REPO_ROOT
+from file_encryptor import _batch_jobs, _unique_targets
+
+def batch_args(**kwargs):
+    defaults = dict(encrypt=True, decrypt=False, recursive=None, from_file=None,
+                    stdin0=False, output=None)
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+@pytest.fixture
+def same_names(tmp_path):
+    """Two inputs called data.txt in different directories, listed in a file."""
+    paths = []
+    for directory in ('a', 'b'):
+        (tmp_path / directory).mkdir()
+        path = tmp_path / directory / 'data.txt'
+        path.write_bytes(os.urandom(100))
+        paths.append(str(path))
+    listing = tmp_path / 'list.txt'
+    listing.write_text(''.join(path + '\n' for path in paths))
+    return paths, str(listing)
+
+def test_listed_files_colliding_in_output_dir(tmp_path, same_names):
+    paths, listing = same_names
+    jobs = _batch_jobs(batch_args(from_file=listing, output=str(tmp_path / 'out')))
+    with pytest.raises(ValueError, match='would both be written to') as info:
+        _unique_targets(jobs)
+    assert paths[0] in str(info.value) and paths[1] in str(info.value)
+
+def test_listed_files_without_output_dir_do_not_collide(same_names):
+    paths, listing = same_names
+    jobs = _unique_targets(_batch_jobs(batch_args(from_file=listing)))
+    assert jobs == [(path, path + '.enc') for path in paths]
+
+def test_same_target_spelled_differently(tmp_path):
+    target = str(tmp_path / 'x.enc')
+    spelled = os.path.join(str(tmp_path), '.', 'sub', '..', 'x.enc')
+    with pytest.raises(ValueError):
+        _unique_targets([('one', target), ('two', spelled)])
+
+def test_same_input_listed_twice(tmp_path):
+    with pytest.raises(ValueError):
+        _unique_targets([('in', str(tmp_path / 'x.enc')), ('in', str(tmp_path / 'x.enc'))])
+
+def test_cli_refuses_colliding_batch_before_writing(tmp_path, same_names):
+    _, listing = same_names
+    out = tmp_path / 'out'
+    proc = subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'file_encryptor.py'),
+                           '-e', '--from-file', listing, '-o', str(out), '-q'],
+                          input=PASSPHRASE + '\n', capture_output=True, text=True,
+                          cwd=str(tmp_path), env=dict(os.environ, HOME=str(tmp_path)))
+    assert proc.returncode == 1
+    assert 'would both be written to' in proc.stderr
+    assert not out.exists() or os.listdir(out) == []
+
+def test_recursive_skips_output_tree_and_partial_files(tmp_path):
+    tree = tmp_path / 'tree'
+    (tree / 'sub').mkdir(parents=True)
+    (tree / 'out').mkdir()
+    for name in ('a', 'sub/b', 'a.enc.x1y2.part', 'out/a', 'out/c.enc.x1y2.part'):
+        (tree / name).write_bytes(b'data')
+    jobs = list(_batch_jobs(batch_args(recursive=str(tree), output=str(tree / 'out'))))
+    assert jobs == [(str(tree / 'a'), str(tree / 'out' / 'a.enc')),
+                    (str(tree / 'sub' / 'b'), str(tree / 'out' / 'sub' / 'b.enc'))]
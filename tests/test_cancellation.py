@@ -0,0 +1,118 @@
+import os
+import threading
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import CancellationToken, OperationCancelled
+
+class ActAt(CancellationToken):
+    """Token that runs action(self) at its at-th check, from inside the operation."""
+
+    def __init__(self, at, action):
+        super().__init__()
+        self.at, self.action, self.checks = at, action, 0
+        self.reached = threading.Event()
+
+    def check(self):
+        self.checks += 1
+        if self.checks == self.at:
+            self.action(self)
+            self.reached.set()
+        super().check()
+
+def leftovers(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.part'))
+
+@pytest.fixture
+def files(tmp_path, encryptor_factory):
+    # Several calls even for a backend that seals 1 MiB runs per check
+    data = os.urandom(3 * 1024 * 1024 + 100)
+    (tmp_path / 'plain').write_bytes(data)
+    encryptor_factory().encrypt_file(str(tmp_path / 'plain'), str(tmp_path / 'plain.enc'),
+                                     PASSPHRASE)
+    return tmp_path, data
+
+def run(encryptor, operation, tmp_path, token, **kwargs):
+    if operation == 'encrypt':
+        encryptor.encrypt_file(str(tmp_path / 'plain'), str(tmp_path / 'out'), PASSPHRASE,
+                               cancel=token, **kwargs)
+    else:
+        encryptor.decrypt_file(str(tmp_path / 'plain.enc'), str(tmp_path / 'out'),
+                               PASSPHRASE, cancel=token)
+
+def checks_made(encryptor, operation, tmp_path):
+    """How often an uninterrupted run checks its token."""
+    token = ActAt(0, None)
+    run(encryptor, operation, tmp_path, token)
+    os.remove(tmp_path / 'out')
+    return token.checks
+
+@pytest.mark.parametrize('operation', ['encrypt', 'decrypt'])
+@pytest.mark.parametrize('options', [{}, {'workers': 3}, {'io_mode': 'mmap'}])
+@pytest.mark.parametrize('when', ['first', 'middle', 'last'])
+def test_cancel_between_segments(files, encryptor_factory, operation, options, when):
+    tmp_path, data = files
+    encryptor = encryptor_factory(**options)
+    checks = checks_made(encryptor, operation, tmp_path)
+    assert checks > 2
+    at = {'first': 1, 'middle': checks // 2, 'last': checks}[when]
+    token = ActAt(at, CancellationToken.cancel)
+    with pytest.raises(OperationCancelled):
+        run(encryptor, operation, tmp_path, token, delete_original=True)
+    # Nothing more was started once cancelled, and nothing was left behind
+    assert token.checks == at
+    assert not (tmp_path / 'out').exists() and leftovers(tmp_path) == []
+    assert (tmp_path / 'plain').read_bytes() == data
+
+@pytest.mark.parametrize('operation', ['encrypt', 'decrypt'])
+@pytest.mark.parametrize('then', ['resume', 'cancel'])
+def test_pause_holds_the_operation(files, encryptor_factory, operation, then):
+    tmp_path, data = files
+    token = ActAt(2, CancellationToken.pause)
+    errors = []
+
+    def target():
+        try:
+            run(encryptor_factory(), operation, tmp_path, token)
+        except OperationCancelled as e:
+            errors.append(e)
+    worker = threading.Thread(target=target)
+    worker.start()
+    assert token.reached.wait(10)
+    worker.join(0.2)
+    # Held at the check with its partial output open
+    assert worker.is_alive() and token.paused and token.checks == 2
+    assert len(leftovers(tmp_path)) == 1
+    getattr(token, then)()
+    worker.join(10)
+    assert not worker.is_alive()
+    if then == 'resume':
+        assert not errors and leftovers(tmp_path) == []
+        if operation == 'decrypt':
+            assert (tmp_path / 'out').read_bytes() == data
+        else:
+            encryptor_factory().decrypt_file(str(tmp_path / 'out'), str(tmp_path / 'check'),
+                                             PASSPHRASE)
+            assert (tmp_path / 'check').read_bytes() == data
+    else:
+        assert len(errors) == 1
+        assert not (tmp_path / 'out').exists() and leftovers(tmp_path) == []
+
+def test_cancelled_batch_starts_no_more_files(tmp_path, encryptor_factory):
+    sources = []
+    for n in range(6):
+        (tmp_path / f'f{n}').write_bytes(os.urandom(4096))
+        sources.append(str(tmp_path / f'f{n}'))
+    token = CancellationToken()
+    encryptor = encryptor_factory()
+    results = []
+    for result in encryptor.process_batch('encrypt', ((s, s + '.enc') for s in sources),
+                                          PASSPHRASE, max_jobs=1, cancel=token):
+        results.append(result)
+        token.cancel()
+    # Only the files already queued (2 * max_jobs) may still complete
+    assert results[0].ok and len(results) <= 2
+    assert ({r.input_path for r in results if r.ok}
+            == {s for s in sources if os.path.exists(s + '.enc')})
+    assert leftovers(tmp_path) == []
@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+import pytest
+
+import file_encryptor
+from conftest import PASSPHRASE
+from file_encryptor import ContentIndex, SecureFileEncryptor
+
+@pytest.fixture
+def index(tmp_path):
+    with ContentIndex(tmp_path / 'index.sqlite') as index:
+        yield index
+
+def encrypt(encryptor, index, source, target):
+    [result] = encryptor.process_batch('encrypt', [(str(source), str(target))], PASSPHRASE,
+                                       max_jobs=1, index=index)
+    assert result.ok, result.error
+    return result
+
+@pytest.mark.parametrize('io_mode', ['stream', 'mmap'])
+def test_unchanged_file_is_skipped(tmp_path, index, encryptor_factory, monkeypatch, io_mode):
+    data = os.urandom(5 * 4096 + 3)
+    source, target = tmp_path / 'plain', tmp_path / 'plain.enc'
+    source.write_bytes(data)
+    encryptor = encryptor_factory(io_mode=io_mode)
+    # A changed file is hashed while it is encrypted, not read beforehand
+    monkeypatch.setattr(file_encryptor, '_file_sha256', None)
+    assert not encrypt(encryptor, index, source, target).skipped
+    assert index.is_unchanged(str(source), str(target))
+    assert encrypt(encryptor, index, source, target).skipped
+    encryptor.decrypt_file(str(target), str(tmp_path / 'out'), PASSPHRASE)
+    assert (tmp_path / 'out').read_bytes() == data
+
+def test_touched_file_is_hashed_and_skipped(tmp_path, index, encryptor_factory):
+    source, target = tmp_path / 'plain', tmp_path / 'plain.enc'
+    source.write_bytes(os.urandom(3 * 4096))
+    encryptor = encryptor_factory()
+    encrypt(encryptor, index, source, target)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert encrypt(encryptor, index, source, target).skipped
+
+def test_changed_file_is_encrypted_again(tmp_path, index, encryptor_factory):
+    source, target = tmp_path / 'plain', tmp_path / 'plain.enc'
+    source.write_bytes(os.urandom(3 * 4096))
+    encryptor = encryptor_factory()
+    encrypt(encryptor, index, source, target)
+    st = os.stat(source)
+    source.write_bytes(os.urandom(3 * 4096))  # Same size, so the hashes are compared
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not index.is_unchanged(str(source), str(target))
+    assert not encrypt(encryptor, index, source, target).skipped
+
+def test_recorded_hash_is_of_the_encrypted_content(tmp_path, index, encryptor_factory):
+    data = os.urandom(3 * 4096 + 7)
+    source, target = tmp_path / 'plain', tmp_path / 'plain.enc'
+    source.write_bytes(data)
+    snapshot = index.snapshot(str(source))
+    encryptor_factory().encrypt_file(str(source), str(target), PASSPHRASE,
+                                     source_digest=snapshot.digest)
+    assert snapshot.digest.hexdigest() == hashlib.sha256(data).hexdigest()
+
+def test_file_modified_during_encryption_is_not_recorded(tmp_path, index, encryptor_factory,
+                                                         monkeypatch):
+    source, target = tmp_path / 'plain', tmp_path / 'plain.enc'
+    source.write_bytes(os.urandom(3 * 4096))
+    original = SecureFileEncryptor.encrypt_file
+
+    def modifying(self, input_path, *args, **kwargs):
+        original(self, input_path, *args, **kwargs)
+        with open(input_path, 'ab') as f:
+            f.write(b'appended while encrypting')
+    monkeypatch.setattr(SecureFileEncryptor, 'encrypt_file', modifying)
+    encrypt(encryptor_factory(), index, source, target)
+    assert index.artifact_for(str(source)) is None
+    assert not index.is_unchanged(str(source), str(target))
@@ -0,0 +1,170 @@
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import DerivedKeyCache
+from file_encryptor_dedup import (ChunkStore, _find_boundary, _gear_table, _top_bits,
+                                  boundary_finder, is_manifest)
+
+class SmallChunkStore(ChunkStore):
+    """Chunks small enough that a few hundred KiB make dozens of them."""
+    MIN_CHUNK = 1024
+    AVG_CHUNK = 4096
+    MAX_CHUNK = 16 * 1024
+    READ_SIZE = 4 * MAX_CHUNK
+
+@pytest.fixture
+def store(tmp_path, encryptor_factory):
+    return SmallChunkStore(tmp_path / 'store', encryptor_factory(key_cache=DerivedKeyCache()))
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+def test_round_trip(store, tmp_path):
+    data = os.urandom(200 * 1024)
+    source = write(tmp_path / 'plain', data)
+    os.chmod(source, 0o640)
+    stats = store.store_file(source, str(tmp_path / 'plain.dedup'), PASSPHRASE)
+    assert stats.size == len(data) and stats.new_chunks == stats.chunks > 1
+    assert is_manifest(str(tmp_path / 'plain.dedup'))
+    store.restore_file(str(tmp_path / 'plain.dedup'), str(tmp_path / 'out'), PASSPHRASE)
+    assert (tmp_path / 'out').read_bytes() == data
+    assert os.stat(tmp_path / 'out').st_mode & 0o777 == 0o640
+
+def test_empty_file(store, tmp_path):
+    source = write(tmp_path / 'empty', b'')
+    assert store.store_file(source, str(tmp_path / 'm'), PASSPHRASE).chunks == 0
+    store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+    assert (tmp_path / 'out').read_bytes() == b''
+
+def test_unchanged_file_writes_nothing(store, tmp_path):
+    source = write(tmp_path / 'plain', os.urandom(100 * 1024))
+    store.store_file(source, str(tmp_path / 'first'), PASSPHRASE)
+    stats = store.store_file(source, str(tmp_path / 'second'), PASSPHRASE)
+    assert stats.new_chunks == 0 and stats.new_bytes == 0
+
+def test_insertion_rewrites_only_nearby_chunks(store, tmp_path):
+    data = os.urandom(400 * 1024)
+    first = store.store_file(write(tmp_path / 'a', data), str(tmp_path / 'a.dedup'),
+                             PASSPHRASE)
+    edited = data[:200 * 1024] + b'inserted' + data[200 * 1024:]
+    second = store.store_file(write(tmp_path / 'b', edited), str(tmp_path / 'b.dedup'),
+                              PASSPHRASE)
+    assert second.new_chunks <= 3 < first.chunks
+    store.restore_file(str(tmp_path / 'b.dedup'), str(tmp_path / 'out'), PASSPHRASE)
+    assert (tmp_path / 'out').read_bytes() == edited
+
+def test_chunk_sizes(store):
+    data = os.urandom(300 * 1024)
+    with store._unlocked(PASSPHRASE) as keys:
+        chunks = list(store._iter_chunks(io.BytesIO(data), keys))
+    assert b''.join(chunks) == data
+    for chunk in chunks[:-1]:
+        assert store.MIN_CHUNK < len(chunk) <= store.MAX_CHUNK
+
+def test_keys_are_zeroed(store, tmp_path, monkeypatch):
+    issued = []
+    original = store._keys
+
+    def recording(passphrase):
+        keys = original(passphrase)
+        issued.append(keys)
+        return keys
+    monkeypatch.setattr(store, '_keys', recording)
+    source = write(tmp_path / 'plain', os.urandom(50 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    store.read_manifest(str(tmp_path / 'm'), PASSPHRASE)
+    store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+    assert len(issued) == 3
+    for key in (key for keys in issued for key in keys):
+        assert isinstance(key, bytearray) and key == bytes(len(key))
+
+def test_wrong_password(store, tmp_path):
+    source = write(tmp_path / 'plain', os.urandom(10 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    with pytest.raises(ValueError, match='Wrong password'):
+        store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), 'not the passphrase')
+
+def chunk_files(store):
+    return sorted(p for p in (store.root / 'chunks').rglob('*') if p.is_file())
+
+def test_modified_chunk(store, tmp_path):
+    source = write(tmp_path / 'plain', os.urandom(50 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    victim = chunk_files(store)[0]
+    raw = bytearray(victim.read_bytes())
+    raw[-1] ^= 0x01
+    victim.write_bytes(raw)
+    with pytest.raises(ValueError, match='corrupted'):
+        store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+    assert not (tmp_path / 'out').exists()
+
+def test_swapped_chunks(store, tmp_path):
+    # Each chunk is bound to its ID, so renaming one over another fails
+    source = write(tmp_path / 'plain', os.urandom(50 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    first, second = chunk_files(store)[:2]
+    first.write_bytes(second.read_bytes())
+    with pytest.raises(ValueError, match='corrupted'):
+        store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+
+def test_missing_chunk(store, tmp_path):
+    source = write(tmp_path / 'plain', os.urandom(50 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    chunk_files(store)[0].unlink()
+    with pytest.raises(ValueError, match='missing chunk'):
+        store.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+
+def test_manifest_of_another_store(store, tmp_path, encryptor_factory):
+    source = write(tmp_path / 'plain', os.urandom(10 * 1024))
+    store.store_file(source, str(tmp_path / 'm'), PASSPHRASE)
+    other = SmallChunkStore(tmp_path / 'other', encryptor_factory())
+    with pytest.raises(ValueError, match='different chunk store'):
+        other.restore_file(str(tmp_path / 'm'), str(tmp_path / 'out'), PASSPHRASE)
+
+def test_concurrent_writers_of_shared_chunks(store, tmp_path):
+    data = os.urandom(200 * 1024)
+    sources = [write(tmp_path / f'copy{n}', data) for n in range(4)]
+    with store._unlocked(PASSPHRASE):
+        pass  # Create the store before the threads race
+    threads = [threading.Thread(target=store.store_file,
+                                args=(source, source + '.dedup', PASSPHRASE))
+               for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not [p for p in (store.root / 'chunks').rglob('*.part')]
+    for source in sources:
+        store.restore_file(source + '.dedup', source + '.out', PASSPHRASE)
+        assert open(source + '.out', 'rb').read() == data
+
+@pytest.mark.parametrize('sizes', [(64 * 1024, 256 * 1024, 1024 * 1024), (32, 64, 256),
+                                   (40, 128, 1000)])
+@pytest.mark.parametrize('content', ['random', 'zeros'])
+def test_native_boundaries_match_python(sizes, content):
+    accel = pytest.importorskip('solace_accel')
+    if not hasattr(accel, 'find_boundary'):
+        pytest.skip('solace_accel was built without find_boundary')
+    min_size, avg_size, max_size = sizes
+    gear = _gear_table(os.urandom(32))
+    bits = avg_size.bit_length() - 1
+    strict, loose = _top_bits(bits + 2), _top_bits(bits - 2)
+    data = os.urandom(3 * max_size + 17) if content == 'random' else bytes(3 * max_size + 17)
+    with memoryview(data) as view:
+        position = 0
+        while position < len(data):
+            end = min(len(data), position + max_size)
+            cut = _find_boundary(view, position, end, min_size, avg_size, gear, strict, loose)
+            assert accel.find_boundary(view, position, end, min_size, avg_size, gear,
+                                       strict, loose) == cut
+            position = cut
+
+def test_python_fallback(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'solace_accel', None)
+    assert boundary_finder() is _find_boundary
@@ -0,0 +1,140 @@
+import errno
+import os
+
+import pytest
+
+import file_encryptor_fileops as fileops
+from file_encryptor import CancellationToken, OperationCancelled
+
+SIZE = 3 * fileops.BUFFER_SIZE + 123
+
+@pytest.fixture
+def source(tmp_path):
+    data = os.urandom(SIZE)
+    path = tmp_path / 'source'
+    path.write_bytes(data)
+    os.chmod(path, 0o640)
+    os.utime(path, ns=(1_000_000_000, 1_500_000_000))
+    return path, data
+
+def refuse_rename_of(path):
+    """os.replace that fails with EXDEV for path, as between two mounts."""
+    real = os.replace
+
+    def replace(src, dst):
+        if os.fspath(src) == str(path):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        return real(src, dst)
+    return replace
+
+def refuse(code):
+    def method(*args, **kwargs):
+        raise OSError(code, os.strerror(code))
+    return method
+
+def partly(real, count_arg, limit, code):
+    """A kernel call that copies up to limit bytes in total, then fails with code."""
+    done = [0]
+
+    def method(*args):
+        if done[0] >= limit:
+            raise OSError(code, os.strerror(code))
+        args = list(args)
+        args[count_arg] = min(args[count_arg], limit - done[0])
+        copied = real(*args)
+        done[0] += copied
+        return copied
+    return method
+
+@pytest.fixture
+def no_reflink(monkeypatch):
+    import fcntl
+    monkeypatch.setattr(fcntl, 'ioctl', refuse(errno.EOPNOTSUPP))
+
+def check_copy(path, data):
+    assert path.read_bytes() == data
+    st = os.stat(path)
+    assert st.st_mode & 0o777 == 0o640 and st.st_mtime_ns == 1_500_000_000
+    assert [name for name in os.listdir(path.parent) if name.endswith('.part')] == []
+
+def test_copy_file(source, tmp_path):
+    path, data = source
+    method = fileops.copy_file(str(path), str(tmp_path / 'copy'))
+    assert method in dict(fileops.COPY_METHODS)
+    check_copy(tmp_path / 'copy', data)
+
+def test_copy_empty_file(tmp_path):
+    (tmp_path / 'empty').write_bytes(b'')
+    fileops.copy_file(str(tmp_path / 'empty'), str(tmp_path / 'copy'))
+    assert (tmp_path / 'copy').read_bytes() == b''
+
+@pytest.mark.parametrize('refused, expected', [
+    (['copy_file_range'], 'sendfile'),
+    (['copy_file_range', 'sendfile'], 'read/write'),
+])
+@pytest.mark.parametrize('code', [errno.EXDEV, errno.ENOSYS, errno.EINVAL])
+def test_unsupported_methods_fall_through(source, tmp_path, monkeypatch, no_reflink,
+                                          refused, expected, code):
+    path, data = source
+    for name in refused:
+        monkeypatch.setattr(os, name, refuse(code), raising=False)
+    assert fileops.copy_file(str(path), str(tmp_path / 'copy')) == expected
+    check_copy(tmp_path / 'copy', data)
+
+def test_next_method_continues_where_the_last_stopped(source, tmp_path, monkeypatch,
+                                                      no_reflink):
+    if not hasattr(os, 'copy_file_range') or not hasattr(os, 'sendfile'):
+        pytest.skip('needs copy_file_range and sendfile')
+    path, data = source
+    # e.g. copy_file_range refusing a cross-device copy part-way
+    monkeypatch.setattr(os, 'copy_file_range',
+                        partly(os.copy_file_range, 2, SIZE // 3, errno.EXDEV))
+    monkeypatch.setattr(os, 'sendfile', partly(os.sendfile, 3, SIZE // 3, errno.EINVAL))
+    assert fileops.copy_file(str(path), str(tmp_path / 'copy')) == 'read/write'
+    check_copy(tmp_path / 'copy', data)
+
+def test_other_errors_are_raised(source, tmp_path, monkeypatch, no_reflink):
+    path, _ = source
+    monkeypatch.setattr(os, 'copy_file_range', refuse(errno.EIO), raising=False)
+    monkeypatch.setattr(os, 'sendfile', refuse(errno.EIO), raising=False)
+    monkeypatch.setattr(os, 'readv', refuse(errno.EIO))
+    with pytest.raises(OSError) as info:
+        fileops.copy_file(str(path), str(tmp_path / 'copy'))
+    assert info.value.errno == errno.EIO
+    assert os.listdir(tmp_path) == ['source']
+
+def test_cancelled_copy_leaves_nothing(source, tmp_path):
+    path, _ = source
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(OperationCancelled):
+        fileops.copy_file(str(path), str(tmp_path / 'copy'), token)
+    assert os.listdir(tmp_path) == ['source']
+
+def test_move_within_a_filesystem_renames(source, tmp_path):
+    path, data = source
+    assert fileops.move_file(str(path), str(tmp_path / 'moved')) == 'rename'
+    assert not path.exists() and (tmp_path / 'moved').read_bytes() == data
+
+@pytest.mark.parametrize('how', ['exdev', 'other device'])
+def test_move_across_filesystems_copies(source, tmp_path, monkeypatch, how):
+    path, data = source
+    if how == 'exdev':
+        # Two mounts of one filesystem: same device, but rename is refused
+        monkeypatch.setattr(os, 'replace', refuse_rename_of(path))
+    else:
+        monkeypatch.setattr(fileops, 'same_filesystem', lambda a, b: False)
+    (tmp_path / 'dest').mkdir()
+    method = fileops.move_file(str(path), str(tmp_path / 'dest' / 'moved'))
+    assert method in dict(fileops.COPY_METHODS)
+    assert not path.exists()
+    check_copy(tmp_path / 'dest' / 'moved', data)
+
+def test_failed_move_keeps_the_source(source, tmp_path, monkeypatch):
+    path, data = source
+    monkeypatch.setattr(os, 'replace', refuse_rename_of(path))
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(OperationCancelled):
+        fileops.move_file(str(path), str(tmp_path / 'moved'), token)
+    assert path.read_bytes() == data and not (tmp_path / 'moved').exists()
@@ -0,0 +1,165 @@
+import os
+import struct
+import time
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import SecureFileEncryptor
+
+SEGMENT = 4096
+SEALED = SEGMENT + SecureFileEncryptor.TAG_SIZE
+HEADER_SIZE = SecureFileEncryptor.HEADER.size
+KDF_COST_OFFSET = struct.calcsize('>8sBBB')
+SEGMENT_SIZE_OFFSET = struct.calcsize('>8sBBBIII16s7s')
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.part')]
+
+@pytest.fixture
+def encrypted(tmp_path, encryptor_factory):
+    """A plain file of three full segments and a partial one, and its encryption."""
+    data = os.urandom(3 * SEGMENT + 100)
+    source = write(tmp_path / 'plain', data)
+    target = str(tmp_path / 'plain.enc')
+    encryptor_factory().encrypt_file(source, target, PASSPHRASE)
+    return data, target
+
+def assert_rejected(encryptor, path, tmp_path, match='Decryption failed|Invalid encrypted'):
+    output = tmp_path / 'out'
+    with pytest.raises(ValueError, match=match):
+        encryptor.decrypt_file(path, str(output), PASSPHRASE)
+    assert not output.exists()
+    assert leftovers(tmp_path) == []
+
+@pytest.mark.parametrize('io_mode', SecureFileEncryptor.IO_MODES)
+@pytest.mark.parametrize('size', [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT + 123])
+def test_round_trip(backend, tmp_path, encryptor_factory, size, io_mode):
+    data = os.urandom(size)
+    encryptor = encryptor_factory(workers=3, io_mode=io_mode)
+    source = write(tmp_path / 'plain', data)
+    encryptor.encrypt_file(source, str(tmp_path / 'plain.enc'), PASSPHRASE)
+    segments = max(1, -(-size // SEGMENT))
+    assert os.path.getsize(tmp_path / 'plain.enc') == (
+        HEADER_SIZE + size + segments * SecureFileEncryptor.TAG_SIZE)
+    encryptor.decrypt_file(str(tmp_path / 'plain.enc'), str(tmp_path / 'out'), PASSPHRASE)
+    assert read(tmp_path / 'out') == data
+
+@pytest.mark.parametrize('options', [{'batch': True}, {'compression': 'zlib'},
+                                     {'compression': 'lzma', 'workers': 2}])
+def test_round_trip_options(backend, tmp_path, encryptor_factory, options):
+    # Compressible and incompressible segments, so both record kinds occur
+    data = os.urandom(2 * SEGMENT) + bytes(3 * SEGMENT) + os.urandom(17)
+    encryptor = encryptor_factory(**options)
+    source = write(tmp_path / 'plain', data)
+    encryptor.encrypt_file(source, str(tmp_path / 'plain.enc'), PASSPHRASE)
+    encryptor_factory().decrypt_file(str(tmp_path / 'plain.enc'), str(tmp_path / 'out'),
+                                     PASSPHRASE)
+    assert read(tmp_path / 'out') == data
+
+def test_wrong_password(backend, tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    with pytest.raises(ValueError, match='Wrong password'):
+        encryptor_factory().decrypt_file(path, str(tmp_path / 'out'), 'not the passphrase')
+    assert not (tmp_path / 'out').exists()
+
+@pytest.mark.parametrize('offset', [
+    HEADER_SIZE,                        # first segment
+    HEADER_SIZE + SEALED + 5,           # a middle segment
+    HEADER_SIZE + 2 * SEALED - 1,       # a tag
+    -1,                                 # the final segment's tag
+])
+def test_modified_segment(backend, tmp_path, encrypted, encryptor_factory, offset):
+    _, path = encrypted
+    raw = bytearray(read(path))
+    raw[offset] ^= 0x01
+    write(path, raw)
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+@pytest.mark.parametrize('offset', [
+    struct.calcsize('>8sBBBIII'),       # salt
+    struct.calcsize('>8sBBBIII16s'),    # nonce prefix
+    SEGMENT_SIZE_OFFSET + 3,            # segment size
+])
+def test_modified_header(backend, tmp_path, encrypted, encryptor_factory, offset):
+    _, path = encrypted
+    raw = bytearray(read(path))
+    raw[offset] ^= 0x01
+    write(path, raw)
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+def test_truncated_at_segment_boundary(backend, tmp_path, encrypted, encryptor_factory):
+    # Every remaining segment is intact; only the final flag is missing
+    _, path = encrypted
+    write(path, read(path)[:HEADER_SIZE + 3 * SEALED])
+    assert_rejected(encryptor_factory(), path, tmp_path, match='truncated')
+
+def test_truncated_inside_segment(backend, tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    write(path, read(path)[:-5])
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+def test_reordered_segments(backend, tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    raw = read(path)
+    first = HEADER_SIZE
+    swapped = (raw[:first] + raw[first + SEALED:first + 2 * SEALED]
+               + raw[first:first + SEALED] + raw[first + 2 * SEALED:])
+    write(path, swapped)
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+def test_appended_data(backend, tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    write(path, read(path) + os.urandom(SEALED))
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+def test_segment_from_another_file(backend, tmp_path, encrypted, encryptor_factory):
+    # Same passphrase and length: only the per-file nonce prefix and AAD differ
+    data, path = encrypted
+    other = write(tmp_path / 'other', data)
+    encryptor_factory().encrypt_file(other, other + '.enc', PASSPHRASE)
+    raw, foreign = read(path), read(other + '.enc')
+    start = HEADER_SIZE + SEALED
+    write(path, raw[:start] + foreign[start:start + SEALED] + raw[start + SEALED:])
+    assert_rejected(encryptor_factory(), path, tmp_path)
+
+def test_oversized_segment_header_rejected(tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    raw = bytearray(read(path))
+    struct.pack_into('>I', raw, SEGMENT_SIZE_OFFSET, SecureFileEncryptor.MAX_SEGMENT_SIZE + 1)
+    write(path, raw)
+    assert_rejected(encryptor_factory(), path, tmp_path, match='bad segment size')
+
+def test_segment_size_limits(encryptor_factory):
+    encryptor_factory(segment_size=SecureFileEncryptor.MAX_SEGMENT_SIZE)
+    for size in (0, SecureFileEncryptor.MAX_SEGMENT_SIZE + 1):
+        with pytest.raises(ValueError, match='Segment size'):
+            encryptor_factory(segment_size=size)
+
+def test_excessive_kdf_cost_rejected_before_deriving(tmp_path, encrypted, encryptor_factory):
+    _, path = encrypted
+    raw = bytearray(read(path))
+    struct.pack_into('>I', raw, KDF_COST_OFFSET, 2 ** 32 - 1)
+    write(path, raw)
+    start = time.perf_counter()
+    assert_rejected(encryptor_factory(), path, tmp_path, match='too many iterations')
+    assert time.perf_counter() - start < 5
+
+def test_legacy_format(tmp_path, encryptor_factory):
+    # salt | nonce | AES-GCM(data) under the fixed PBKDF2 parameters
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    encryptor = encryptor_factory()
+    salt, nonce, data = os.urandom(16), os.urandom(12), os.urandom(1000)
+    key = encryptor._derive_key(PASSPHRASE, salt, SecureFileEncryptor.LEGACY_KDF)
+    path = write(tmp_path / 'legacy.enc', salt + nonce + AESGCM(bytes(key)).encrypt(nonce, data, None))
+    encryptor.decrypt_file(path, str(tmp_path / 'out'), PASSPHRASE)
+    assert read(tmp_path / 'out') == data
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import PASSPHRASE
+from file_encryptor import DerivedKeyCache, SecureFileEncryptor
+
+@pytest.fixture
+def issued_keys(monkeypatch):
+    """Every key _derive_key and _file_key hand out during the test."""
+    keys = []
+    for name in ('_derive_key', '_file_key'):
+        original = getattr(SecureFileEncryptor, name)
+
+        def recording(self, *args, _original=original, **kwargs):
+            key = _original(self, *args, **kwargs)
+            keys.append(key)
+            return key
+        monkeypatch.setattr(SecureFileEncryptor, name, recording)
+    return keys
+
+@pytest.mark.parametrize('options', [{}, {'batch': True}, {'key_cache': DerivedKeyCache()},
+                                     {'io_mode': 'mmap'}, {'compression': 'zlib'}])
+def test_keys_are_zeroed(tmp_path, encryptor_factory, issued_keys, options):
+    (tmp_path / 'plain').write_bytes(os.urandom(3 * 4096 + 1))
+    encryptor = encryptor_factory(**options)
+    for _ in range(2):  # The second pass is served by a cache, if any
+        encryptor.encrypt_file(str(tmp_path / 'plain'), str(tmp_path / 'plain.enc'), PASSPHRASE)
+        encryptor.decrypt_file(str(tmp_path / 'plain.enc'), str(tmp_path / 'out'), PASSPHRASE)
+    assert issued_keys
+    for key in issued_keys:
+        assert isinstance(key, bytearray)
+        assert key == bytes(len(key))
+
+def test_key_is_zeroed_when_decryption_fails(tmp_path, encryptor_factory, issued_keys):
+    (tmp_path / 'plain').write_bytes(os.urandom(4096))
+    encryptor = encryptor_factory()
+    encryptor.encrypt_file(str(tmp_path / 'plain'), str(tmp_path / 'plain.enc'), PASSPHRASE)
+    with pytest.raises(ValueError):
+        encryptor.decrypt_file(str(tmp_path / 'plain.enc'), str(tmp_path / 'out'), 'wrong')
+    assert all(key == bytes(len(key)) for key in issued_keys)
+
+def test_concurrent_misses_derive_once():
+    cache, calls, results = DerivedKeyCache(), [], []
+
+    def derive():
+        calls.append(None)
+        time.sleep(0.1)
+        return bytearray(b'k' * 32)
+
+    def worker():
+        results.append(cache.get_or_derive(PASSPHRASE, b'salt', (1, 2), derive))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [b'k' * 32] * 8
+    assert len({id(key) for key in results}) == 8  # Each caller zeroes its own copy
+
+def test_failed_derivation_lets_waiters_retry():
+    cache, started = DerivedKeyCache(), threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('KDF failed')
+
+    def failing_worker():
+        with pytest.raises(RuntimeError):
+            cache.get_or_derive(PASSPHRASE, b'salt', (1, 2), failing)
+    thread = threading.Thread(target=failing_worker)
+    thread.start()
+    started.wait()
+    key = cache.get_or_derive(PASSPHRASE, b'salt', (1, 2), lambda: bytearray(b'k' * 32))
+    thread.join()
+    assert key == b'k' * 32
@@ -0,0 +1,105 @@
+import io
+import os
+import random
+
+import pytest
+
+from conftest import PASSPHRASE
+
+SEGMENT = 4096
+
+@pytest.fixture(params=[None, 'zlib'], ids=['plain', 'compressed'])
+def make_file(request, tmp_path, encryptor_factory):
+    """Encrypt data (half random, half zeros, so compression has work) to a file."""
+    encryptor = encryptor_factory(compression=request.param)
+
+    def make(size):
+        data = os.urandom(size // 2) + bytes(size - size // 2)
+        (tmp_path / 'plain').write_bytes(data)
+        path = str(tmp_path / 'plain.enc')
+        encryptor.encrypt_file(str(tmp_path / 'plain'), path, PASSPHRASE)
+        return encryptor, path, data
+    return make
+
+@pytest.mark.parametrize('size', [0, 1, SEGMENT, 5 * SEGMENT, 5 * SEGMENT + 17])
+def test_sequential_read(make_file, size):
+    encryptor, path, data = make_file(size)
+    with encryptor.open_encrypted(path, PASSPHRASE) as reader:
+        assert reader.size == size
+        assert reader.read() == data
+        assert reader.read() == b'' and reader.tell() == size
+
+def test_random_seeks_and_reads(make_file):
+    encryptor, path, data = make_file(7 * SEGMENT + 123)
+    rng = random.Random(1)
+    with encryptor.open_encrypted(path, PASSPHRASE, cache_segments=2) as reader:
+        for _ in range(300):
+            whence = rng.choice([io.SEEK_SET, io.SEEK_CUR, io.SEEK_END])
+            base = {io.SEEK_SET: 0, io.SEEK_CUR: reader.tell(), io.SEEK_END: len(data)}[whence]
+            target = rng.randrange(0, len(data) + 10)
+            assert reader.seek(target - base, whence) == target
+            length = rng.choice([0, 1, SEGMENT - 1, SEGMENT, 3 * SEGMENT + 5])
+            assert reader.read(length) == data[target:target + length]
+            assert reader.tell() == min(target + length, max(target, len(data)))
+            assert len(reader._cache) <= 2
+
+def test_partial_reads(make_file):
+    encryptor, path, data = make_file(3 * SEGMENT)
+    with encryptor.open_encrypted(path, PASSPHRASE) as reader:
+        reader.seek(SEGMENT - 10)
+        assert reader.peek() == data[SEGMENT - 10:SEGMENT]
+        assert reader.tell() == SEGMENT - 10
+        assert reader.read1(100) == data[SEGMENT - 10:SEGMENT]  # Stops at the segment end
+        buffer = bytearray(SEGMENT + 20)
+        assert reader.readinto(buffer) == SEGMENT + 20
+        assert buffer == data[SEGMENT:2 * SEGMENT + 20]
+        reader.seek(-5, io.SEEK_END)
+        assert reader.readinto(buffer) == 5 and buffer[:5] == data[-5:]
+
+def test_invalid_seeks_and_closed_reader(make_file):
+    encryptor, path, _ = make_file(SEGMENT)
+    reader = encryptor.open_encrypted(path, PASSPHRASE)
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+    with pytest.raises(ValueError):
+        reader.seek(0, 3)
+    reader.close()
+    assert reader.closed
+    with pytest.raises(ValueError):
+        reader.read()
+
+def test_wrong_password(make_file):
+    encryptor, path, _ = make_file(3 * SEGMENT)
+    with pytest.raises(ValueError, match='Wrong password'):
+        encryptor.open_encrypted(path, 'wrong')
+
+def test_truncated_file_is_rejected_on_open(make_file):
+    encryptor, path, _ = make_file(3 * SEGMENT + 100)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 200)
+    with pytest.raises(ValueError):
+        encryptor.open_encrypted(path, PASSPHRASE)
+
+def test_corrupted_segment_fails_when_read(tmp_path, encryptor_factory):
+    encryptor = encryptor_factory()
+    data = os.urandom(4 * SEGMENT)
+    (tmp_path / 'plain').write_bytes(data)
+    path = str(tmp_path / 'plain.enc')
+    encryptor.encrypt_file(str(tmp_path / 'plain'), path, PASSPHRASE)
+    header_size = os.path.getsize(path) - 4 * (SEGMENT + encryptor.TAG_SIZE)
+    with open(path, 'r+b') as f:  # Flip a byte of segment 2
+        f.seek(header_size + 2 * (SEGMENT + encryptor.TAG_SIZE) + 7)
+        byte = f.read(1)
+        f.seek(-1, io.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with encryptor.open_encrypted(path, PASSPHRASE) as reader:
+        assert reader.read(2 * SEGMENT) == data[:2 * SEGMENT]
+        with pytest.raises(ValueError, match='segment 2'):
+            reader.read(1)
+        reader.seek(3 * SEGMENT)
+        assert reader.read() == data[3 * SEGMENT:]
+
+def test_legacy_file_is_rejected(tmp_path, encryptor_factory):
+    (tmp_path / 'legacy.enc').write_bytes(os.urandom(100))
+    with pytest.raises(ValueError, match='segmented file format'):
+        encryptor_factory().open_encrypted(str(tmp_path / 'legacy.enc'), PASSPHRASE)
@@ -0,0 +1,92 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from conftest import PASSPHRASE, REPO_ROOT
+from file_encryptor import SecureFileEncryptor
+
+def through_pipe(data, consume):
+    """Run consume(reader) on the read end of a pipe fed data by a thread."""
+    read_fd, write_fd = os.pipe()
+
+    def feed():
+        with open(write_fd, 'wb') as writer:
+            writer.write(data)
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    try:
+        with open(read_fd, 'rb') as reader:
+            return consume(reader)
+    finally:
+        feeder.join()
+
+def legacy_file(encryptor, data, passphrase=PASSPHRASE):
+    # salt | nonce | AES-GCM(data) under the fixed PBKDF2 parameters
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    salt, nonce = os.urandom(16), os.urandom(12)
+    key = encryptor._derive_key(passphrase, salt, SecureFileEncryptor.LEGACY_KDF)
+    return salt + nonce + AESGCM(bytes(key)).encrypt(nonce, data, None)
+
+@pytest.mark.parametrize('size', [0, 1, 4096, 5 * 4096 + 11])
+def test_round_trip_through_pipes(encryptor_factory, size):
+    encryptor, data = encryptor_factory(), os.urandom(size)
+
+    def run(method):
+        def consume(reader):
+            out = io.BytesIO()
+            method(reader, out, PASSPHRASE)
+            return out.getvalue()
+        return consume
+    sealed = through_pipe(data, run(encryptor.encrypt_stream))
+    assert through_pipe(sealed, run(encryptor.decrypt_stream)) == data
+
+def test_legacy_input_from_pipe(encryptor_factory):
+    encryptor, data = encryptor_factory(), os.urandom(100 * 1024)
+    out = io.BytesIO()
+    through_pipe(legacy_file(encryptor, data),
+                 lambda reader: encryptor.decrypt_stream(reader, out, PASSPHRASE))
+    assert out.getvalue() == data
+
+def test_legacy_input_with_wrong_password_writes_nothing(encryptor_factory):
+    encryptor = encryptor_factory()
+    out = io.BytesIO()
+    with pytest.raises(ValueError, match='Wrong password'):
+        through_pipe(legacy_file(encryptor, os.urandom(1000)),
+                     lambda reader: encryptor.decrypt_stream(reader, out, 'wrong'))
+    assert out.getvalue() == b''
+
+def cli(tmp_path, *args, data=b''):
+    # A new session has no controlling terminal, so the passphrase is read
+    # as the first line of stdin, ahead of the data
+    return subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'file_encryptor.py'),
+                           '-q', *args], input=PASSPHRASE.encode() + b'\n' + data,
+                          capture_output=True, env=dict(os.environ, HOME=str(tmp_path)),
+                          start_new_session=True)
+
+def test_cli_stdin_to_stdout(tmp_path):
+    data = os.urandom(300 * 1024)
+    sealed = cli(tmp_path, '-e', '-i', '-', '-o', '-', data=data)
+    assert sealed.returncode == 0, sealed.stderr
+    opened = cli(tmp_path, '-d', '-i', '-', '-o', '-', data=sealed.stdout)
+    assert opened.returncode == 0, opened.stderr
+    assert opened.stdout == data
+
+def test_cli_file_to_stdout_and_stdin_to_file(tmp_path):
+    data = os.urandom(50 * 1024)
+    (tmp_path / 'plain').write_bytes(data)
+    sealed = cli(tmp_path, '-e', '-i', str(tmp_path / 'plain'), '-o', '-')
+    assert sealed.returncode == 0, sealed.stderr
+    opened = cli(tmp_path, '-d', '-i', '-', '-o', str(tmp_path / 'out'), data=sealed.stdout)
+    assert opened.returncode == 0, opened.stderr
+    assert (tmp_path / 'out').read_bytes() == data
+
+def test_cli_legacy_stdin_to_stdout(tmp_path):
+    data = os.urandom(20 * 1024)
+    opened = cli(tmp_path, '-d', '-i', '-', '-o', '-',
+                 data=legacy_file(SecureFileEncryptor(), data))
+    assert opened.returncode == 0, opened.stderr
+    assert opened.stdout == data